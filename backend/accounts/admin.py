@@ -1,4 +1,5 @@
 from django.contrib import admin
-from .models import Profile
+from .models import Profile, Follow
 
 admin.site.register(Profile)
+admin.site.register(Follow)
@@ -0,0 +1,44 @@
+from functools import wraps
+from django.core.handlers.asgi import ASGIRequest
+from django.http import JsonResponse
+from rest_framework.authtoken.models import Token
+
+
+async def authenticate_token(request):
+    """The active user for an `Authorization: Token <key>` header, as TokenAuthentication does"""
+    keyword, _, key = request.headers.get('Authorization', '').partition(' ')
+    if keyword != 'Token' or not key.strip():
+        return None
+    try:
+        token = await Token.objects.select_related('user').aget(key=key.strip())
+    except Token.DoesNotExist:
+        return None
+    return token.user if token.user.is_active else None
+
+
+def async_token_required(view):
+    """IsAuthenticated for async views, which DRF's decorators do not support"""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        user = await authenticate_token(request)
+        if user is None:
+            response = JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+            response['WWW-Authenticate'] = 'Token'
+            return response
+        request.user = user
+        return await view(request, *args, **kwargs)
+    return wrapper
+
+
+def asgi_only(view):
+    """
+    404 for async views reached through the WSGI handler. There each request
+    gets a fresh event loop, so the loop-bound Motor and Elasticsearch
+    clients could not be reused; the sync endpoints serve the same data.
+    """
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if not isinstance(request, ASGIRequest):
+            return JsonResponse({'detail': 'Only served by the ASGI application.'}, status=404)
+        return await view(request, *args, **kwargs)
+    return wrapper
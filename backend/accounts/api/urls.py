@@ -7,5 +7,10 @@ urlpatterns = [
     path('accounts/user-id/', views.get_user_id, name='get-user-id'),
     path('accounts/profile/put/', views.update_profile_picture, name='update-profile-picture'),
     path('accounts/profile/', views.get_profile_picture, name='get-profile-picture'),
+    path('accounts/avatars/', views.get_avatar_urls, name='avatar-urls'),
+    path('accounts/avatars/<str:object_name>', views.serve_avatar, name='serve-avatar'),
     path('user/<str:username>/', views.UserPanelView.as_view(), name='get_profile'),
+    path('user/<str:username>/follow/', views.follow_user, name='follow-user'),
+    path('user/<str:username>/followers/', views.get_followers, name='user-followers'),
+    path('user/<str:username>/following/', views.get_following, name='user-following'),
 ]
\ No newline at end of file
@@ -9,8 +9,19 @@ from django.shortcuts import get_object_or_404
 from django.contrib.auth.models import User
 from rest_framework.authtoken.views import ObtainAuthToken
 from rest_framework.permissions import AllowAny
-from minio_api import MinioClient
+from storage import get_storage
 from django.http import HttpResponse
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from accounts.models import Follow, Profile, RetiredAvatar
+from accounts.avatars import AVATAR_BUCKET, avatar_object_name, avatar_url, parse_avatar_name
+from accounts.directory import user_directory
+from posts.api.utils import clamp_page_size
+from posts.feed import on_follow, on_unfollow
+from posts.streaming import serve_object
+from posts.variants import AVATAR_VARIANTS, VARIANT_FORMATS, schedule_variants, variant_candidates, variant_name
+
+MAX_AVATAR_BATCH = 100
 
 @api_view(['POST'])
 @permission_classes([AllowAny])
@@ -56,12 +67,18 @@ class UserPanelView(APIView):
         return Response(serializer.data, status=status.HTTP_200_OK)
     
 
+def _bump_avatar_version(user):
+    """Claim the next avatar version; concurrent uploads each get their own"""
+    if not Profile.objects.filter(user=user).update(avatar_version=F('avatar_version') + 1):
+        return None
+    return Profile.objects.filter(user=user).values_list('avatar_version', flat=True).first()
+
+
 @api_view(["DELETE", "POST"])
 @permission_classes([IsAuthenticated])
 def update_profile_picture(request):
-    minio_client = MinioClient().get_client()
-    bucket_name = "profile-pictures"
-    object_name = f"{request.user.id}_profile.jpg"
+    storage = get_storage()
+    bucket_name = AVATAR_BUCKET
 
     if request.method == "POST":
         
@@ -69,24 +86,60 @@ def update_profile_picture(request):
             return Response({"error": "No file provided"}, status=status.HTTP_400_BAD_REQUEST)
         
         file = request.FILES['file']
-        file_path = f"/dynamic/{object_name}"
+        version = _bump_avatar_version(request.user)
+        if version is None:
+            return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
+        object_name = avatar_object_name(request.user.id, version)
+        content_type = file.content_type or 'image/jpeg'
 
-        with open(file_path, 'wb') as f:
-            for chunk in file.chunks():
-                f.write(chunk)
-        
-        
-        if minio_client.put_object(bucket_name, object_name, file_path):
-            return Response(status=status.HTTP_200_OK)
+        if storage.put_stream(bucket_name, object_name, file, file.size, content_type):
+            user_directory.invalidate(request.user.id)
+            # Other workers' directories keep handing out the previous URL
+            # until their entries expire; gc_avatars deletes it after that
+            RetiredAvatar.objects.create(user=request.user, version=version - 1)
+            file.seek(0)
+            schedule_variants(bucket_name, object_name, file.read(), AVATAR_VARIANTS)
+            return Response({"avatar_url": avatar_url(request.user.id, version)}, status=status.HTTP_200_OK)
         else:
+            # Step back unless a later upload has already moved past this version
+            Profile.objects.filter(user=request.user, avatar_version=version).update(avatar_version=version - 1)
             return Response({"error": "Error while putting"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
     
     if request.method == "DELETE":
- 
-            if minio_client.delete_object(bucket_name, object_name):
-                return Response({"message": "Profile picture deleted successfully"}, status=status.HTTP_200_OK)
+        # The deletion takes a version of its own, with no object behind it:
+        # going back to 0 would let the next upload reuse a key clients
+        # have cached as immutable
+        version = _bump_avatar_version(request.user)
+        if version is None:
+            return Response({"error": "Profile not found"}, status=status.HTTP_404_NOT_FOUND)
+        user_directory.invalidate(request.user.id)
 
-            return Response({"error": "Profile picture deletion failed"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        object_name = avatar_object_name(request.user.id, version - 1)
+        names = [object_name] + [
+            variant_name(object_name, variant, ext) for variant in AVATAR_VARIANTS for ext in VARIANT_FORMATS
+        ]
+        if all(storage.delete_object(bucket_name, name) for name in names):
+            return Response({"message": "Profile picture deleted successfully"}, status=status.HTTP_200_OK)
+
+        # No URL references the objects any more; gc_avatars retries them
+        RetiredAvatar.objects.create(user=request.user, version=version - 1)
+        return Response({"error": "Profile picture deletion failed"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
+def _serve_avatar_object(request, object_name, immutable):
+    candidates = variant_candidates(
+        object_name, request.query_params.get('size'), request.META.get('HTTP_ACCEPT'), AVATAR_VARIANTS
+    )
+    for position, candidate in enumerate(candidates):
+        # Only the requested variant itself may be cached forever; a fallback
+        # is replaced once the variant has been rendered
+        response = serve_object(
+            request, AVATAR_BUCKET, candidate, immutable=immutable and position == 0, default_content_type='image/jpeg'
+        )
+        if response:
+            response['Vary'] = 'Accept'
+            return response
+    return None
 
 
 @api_view(["GET"])
@@ -99,25 +152,64 @@ def get_profile_picture(request):
     except (ValueError, TypeError):
         return Response({"error": "Invalid user ID"}, status=status.HTTP_400_BAD_REQUEST)
 
-    try:
-        User.objects.get(id=target_id)
-    except User.DoesNotExist:
+    entry = user_directory.get_entries([target_id]).get(target_id)
+    if entry is None:
         return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
 
-    minio_client = MinioClient().get_client()
-    bucket_name = "profile-pictures"
-    object_name = f"{target_id}_profile.jpg"
-    file_path = f"/dynamic/{object_name}"
+    object_name = avatar_object_name(target_id, entry['avatar_version'])
+    response = _serve_avatar_object(request, object_name, immutable=False)
+    if response is None:
+        # Another worker may have bumped the version since we cached it
+        user_directory.invalidate(target_id, broadcast=False)
+        fresh = user_directory.get_entries([target_id]).get(target_id)
+        if fresh and fresh['avatar_version'] != entry['avatar_version']:
+            response = _serve_avatar_object(
+                request, avatar_object_name(target_id, fresh['avatar_version']), immutable=False
+            )
+    if response:
+        return response
 
-    object = minio_client.get_object(bucket_name, object_name, file_path)
-    if object:
-        with open(file_path, 'rb') as f:
-            image_data = f.read()
+    return Response({"error": f"Failed to retrieve profile picture"}, status=status.HTTP_404_NOT_FOUND)
 
-        return HttpResponse(image_data, content_type='image/jpeg')
 
-    return Response({"error": f"Failed to retrieve profile picture"}, status=status.HTTP_404_NOT_FOUND)
+@api_view(["GET"])
+@permission_classes([])
+def serve_avatar(request, object_name):
+    """
+    Serve a versioned avatar by object key. Versioned keys are never
+    rewritten, so they are cacheable forever; the legacy key is revalidated.
+    """
+    parsed = parse_avatar_name(object_name)
+    if parsed is None:
+        return Response({"error": "File not found"}, status=status.HTTP_404_NOT_FOUND)
+
+    response = _serve_avatar_object(request, object_name, immutable=parsed[1] > 0)
+    if response:
+        return response
+    return Response({"error": "File not found"}, status=status.HTTP_404_NOT_FOUND)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def get_avatar_urls(request):
+    """
+    Resolve avatar URLs for many users in one call: ?ids=1,2,3
+    """
+    try:
+        ids = [int(user_id) for user_id in request.query_params.get('ids', '').split(',') if user_id]
+    except ValueError:
+        return Response({"error": "ids must be a comma separated list of user IDs"}, status=status.HTTP_400_BAD_REQUEST)
+    if len(ids) > MAX_AVATAR_BATCH:
+        return Response({"error": f"At most {MAX_AVATAR_BATCH} ids per request"}, status=status.HTTP_400_BAD_REQUEST)
 
+    entries = user_directory.get_entries(ids)
+    return Response({
+        str(user_id): {
+            'version': entry['avatar_version'],
+            'url': avatar_url(user_id, entry['avatar_version']),
+        }
+        for user_id, entry in entries.items()
+    }, status=status.HTTP_200_OK)
 
 
 @api_view(["GET"])
@@ -132,3 +224,66 @@ def get_user_id(request):
         return Response({"user_id": user.id}, status=status.HTTP_200_OK)
     except User.DoesNotExist:
        return Response({"error": "User not found"}, status=status.HTTP_404_NOT_FOUND)
+
+
+@api_view(["POST", "DELETE"])
+@permission_classes([IsAuthenticated])
+def follow_user(request, username):
+    """
+    Follow (POST) or unfollow (DELETE) a user
+    """
+    target = get_object_or_404(User, username=username)
+    if target.id == request.user.id:
+        return Response({"error": "You cannot follow yourself"}, status=status.HTTP_400_BAD_REQUEST)
+
+    if request.method == "POST":
+        try:
+            with transaction.atomic():
+                Follow.objects.create(follower=request.user, following=target)
+        except IntegrityError:
+            return Response({"message": "Already following"}, status=status.HTTP_200_OK)
+
+        on_follow(request.user.id, target.id)
+        return Response({"message": f"Following {target.username}"}, status=status.HTTP_201_CREATED)
+
+    deleted, _ = Follow.objects.filter(follower=request.user, following=target).delete()
+    if not deleted:
+        return Response({"error": "Not following this user"}, status=status.HTTP_404_NOT_FOUND)
+
+    on_unfollow(request.user.id, target.id)
+    return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+def _follow_list(request, queryset, user_field):
+    page = max(1, int(request.query_params.get('page', 1)))
+    page_size = clamp_page_size(request.query_params.get('page_size'), 20)
+    skip = (page - 1) * page_size
+    rows = list(
+        queryset.order_by('-created_at', '-id')
+        .values_list(f'{user_field}__id', f'{user_field}__username')[skip:skip + page_size + 1]
+    )
+    return Response({
+        'next': f"?page={page+1}&page_size={page_size}" if len(rows) > page_size else None,
+        'previous': f"?page={page-1}&page_size={page_size}" if page > 1 else None,
+        'results': [{'user_id': user_id, 'username': name} for user_id, name in rows[:page_size]]
+    }, status=status.HTTP_200_OK)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def get_followers(request, username):
+    user = get_object_or_404(User, username=username)
+    try:
+        return _follow_list(request, Follow.objects.filter(following=user), 'follower')
+    except ValueError:
+        return Response({"error": "Invalid page"}, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def get_following(request, username):
+    user = get_object_or_404(User, username=username)
+    try:
+        return _follow_list(request, Follow.objects.filter(follower=user), 'following')
+    except ValueError:
+        return Response({"error": "Invalid page"}, status=status.HTTP_400_BAD_REQUEST)
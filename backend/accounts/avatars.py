@@ -0,0 +1,29 @@
+import re
+from typing import Optional, Tuple
+
+AVATAR_BUCKET = "profile-pictures"
+AVATAR_URL_PREFIX = '/api/accounts/avatars/'
+
+_avatar_name_re = re.compile(r'^(\d+)_profile(?:_v(\d+))?\.')
+
+
+def avatar_object_name(user_id: int, version: int) -> str:
+    """
+    Version 0 is the legacy, overwritten-in-place `{id}_profile.jpg`; every
+    upload after that gets a fresh key so its URL can be cached forever.
+    """
+    if not version:
+        return f"{user_id}_profile.jpg"
+    return f"{user_id}_profile_v{version}.jpg"
+
+
+def avatar_url(user_id: int, version: int) -> str:
+    return f"{AVATAR_URL_PREFIX}{avatar_object_name(user_id, version)}"
+
+
+def parse_avatar_name(object_name: str) -> Optional[Tuple[int, int]]:
+    """(user_id, version) encoded in an avatar object or variant name"""
+    match = _avatar_name_re.match(object_name)
+    if not match:
+        return None
+    return int(match.group(1)), int(match.group(2) or 0)
@@ -0,0 +1,179 @@
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Iterable, Optional
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import User
+from posts.models import CounterDocument
+
+logger = logging.getLogger(__name__)
+
+
+class LRUTTLCache:
+    """Thread-safe in-process cache with LRU eviction and per-entry TTL"""
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 300.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, keys: Iterable) -> Dict:
+        found = {}
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                item = self._data.get(key)
+                if item is None:
+                    continue
+                expires_at, value = item
+                if expires_at < now:
+                    del self._data[key]
+                    continue
+                self._data.move_to_end(key)
+                found[key] = value
+        return found
+
+    def set_many(self, values: Dict):
+        expires_at = time.monotonic() + self.ttl
+        with self._lock:
+            for key, value in values.items():
+                self._data[key] = (expires_at, value)
+                self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class UserDirectory:
+    """
+    Resolves user ids to the public fields the feed renders (username and
+    avatar version) with a single bulk query per page.
+
+    Each worker caches its own entries. `invalidate` drops the entry here
+    and bumps a generation in the counters collection; every worker re-reads
+    it at most every `generation_check_interval` seconds and clears its
+    cache when it moved, so a rename or new avatar shows everywhere within
+    that interval rather than only after the TTL.
+    """
+
+    def __init__(self, max_entries: int = 10000, ttl: float = 300.0, generation_check_interval: float = 5.0):
+        self._cache = LRUTTLCache(max_entries=max_entries, ttl=ttl)
+        self.generation_check_interval = generation_check_interval
+        self._generation = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def generation_due(self) -> bool:
+        """Whether the next check_generation() call reads Mongo"""
+        return self._checked_at is None or time.monotonic() - self._checked_at >= self.generation_check_interval
+
+    def check_generation(self):
+        """Clear the cache if another process invalidated an entry since the last check"""
+        if not self.generation_due():
+            return
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is not None and now - self._checked_at < self.generation_check_interval:
+                return
+            try:
+                generation = CounterDocument().get(CounterDocument.USER_DIRECTORY_GENERATION_KEY) or 0
+            except Exception as e:
+                logger.warning(f"Could not read the user directory generation: {e}")
+                generation = self._generation
+            if self._generation is not None and generation != self._generation:
+                self._cache.clear()
+            self._generation = generation
+            self._checked_at = now
+
+    def _load(self, user_ids) -> Dict[int, Dict]:
+        rows = User.objects.filter(id__in=user_ids).values_list('id', 'username', 'profile__avatar_version')
+        return {
+            user_id: {'username': username, 'avatar_version': avatar_version or 0}
+            for user_id, username, avatar_version in rows
+        }
+
+    def get_entries(self, user_ids: Iterable) -> Dict[int, Dict]:
+        ids = {int(user_id) for user_id in user_ids if user_id is not None}
+        if not ids:
+            return {}
+
+        self.check_generation()
+        entries = self._cache.get_many(ids)
+        missing = ids - entries.keys()
+        if missing:
+            loaded = self._load(missing)
+            self._cache.set_many(loaded)
+            entries.update(loaded)
+        return entries
+
+    async def aget_entries(self, user_ids: Iterable) -> Dict[int, Dict]:
+        """get_entries for async views; misses are loaded with the async ORM"""
+        ids = {int(user_id) for user_id in user_ids if user_id is not None}
+        if not ids:
+            return {}
+
+        if self.generation_due():
+            await sync_to_async(self.check_generation, thread_sensitive=False)()
+        entries = self._cache.get_many(ids)
+        missing = ids - entries.keys()
+        if missing:
+            rows = User.objects.filter(id__in=missing).values_list('id', 'username', 'profile__avatar_version')
+            loaded = {
+                user_id: {'username': username, 'avatar_version': avatar_version or 0}
+                async for user_id, username, avatar_version in rows
+            }
+            self._cache.set_many(loaded)
+            entries.update(loaded)
+        return entries
+
+    async def aget_usernames(self, user_ids: Iterable) -> Dict[int, str]:
+        return {
+            user_id: entry['username']
+            for user_id, entry in (await self.aget_entries(user_ids)).items()
+        }
+
+    def get_usernames(self, user_ids: Iterable) -> Dict[int, str]:
+        return {
+            user_id: entry['username']
+            for user_id, entry in self.get_entries(user_ids).items()
+        }
+
+    def get_username(self, user_id: int) -> Optional[str]:
+        return self.get_usernames([user_id]).get(user_id)
+
+    def invalidate(self, user_id: int, broadcast: bool = True):
+        """
+        Drop a user's entry after their username or avatar changed. With
+        `broadcast` the other workers drop theirs too, see check_generation;
+        if that write fails they serve the old entry until its TTL.
+        """
+        self._cache.delete(int(user_id))
+        if not broadcast:
+            return
+        try:
+            CounterDocument().increment(CounterDocument.USER_DIRECTORY_GENERATION_KEY)
+        except Exception as e:
+            logger.warning(f"Could not broadcast user directory invalidation for {user_id}: {e}")
+
+    def clear(self):
+        self._cache.clear()
+
+
+_directory_settings = getattr(settings, 'USER_DIRECTORY_SETTINGS', {})
+
+user_directory = UserDirectory(
+    max_entries=_directory_settings.get('max_entries', 10000),
+    ttl=_directory_settings.get('ttl', 300),
+    generation_check_interval=_directory_settings.get('generation_check_interval', 5),
+)
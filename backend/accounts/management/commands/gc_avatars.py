@@ -0,0 +1,42 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from storage import get_storage
+from accounts.avatars import AVATAR_BUCKET, avatar_object_name
+from accounts.models import RetiredAvatar
+from posts.variants import AVATAR_VARIANTS, VARIANT_FORMATS, variant_name
+
+
+class Command(BaseCommand):
+    help = "Delete avatar versions (and their variants) replaced by a newer upload more than a grace period ago"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-seconds',
+            type=int,
+            # Twice the user directory TTL: no worker still serves the old URL
+            default=int(2 * settings.USER_DIRECTORY_SETTINGS.get('ttl', 300)),
+            help="How long a version must have been replaced before it is deleted",
+        )
+        parser.add_argument('--limit', type=int, default=1000, help="Maximum versions deleted in one run")
+
+    def handle(self, *args, **options):
+        storage = get_storage()
+        cutoff = timezone.now() - timedelta(seconds=options['grace_seconds'])
+
+        deleted = 0
+        for retired in RetiredAvatar.objects.filter(retired_at__lt=cutoff).order_by('retired_at')[:options['limit']]:
+            object_name = avatar_object_name(retired.user_id, retired.version)
+            names = [object_name] + [
+                variant_name(object_name, variant, ext)
+                for variant in AVATAR_VARIANTS
+                for ext in VARIANT_FORMATS
+            ]
+            if all(storage.delete_object(AVATAR_BUCKET, name) for name in names):
+                retired.delete()
+                deleted += 1
+            else:
+                self.stderr.write(f"Could not delete {object_name}, it will be retried on a later run")
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} replaced avatar version(s)"))
@@ -11,7 +11,45 @@ class Profile(models.Model):
         user = models.OneToOneField(User, on_delete=models.CASCADE)
         sex = models.CharField(max_length=10, choices=SEX_CHOICES)
         created_at = models.DateTimeField(auto_now_add=True)
+        # Bumped on every profile picture upload; part of the avatar object key
+        avatar_version = models.PositiveIntegerField(default=0)
         def __str__(self):
             return f"{self.user.username} (Password hidden)"
 
 
+
+
+class Follow(models.Model):
+    follower = models.ForeignKey(User, related_name='following_set', on_delete=models.CASCADE)
+    following = models.ForeignKey(User, related_name='follower_set', on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['follower', 'following'], name='unique_follow'),
+        ]
+        indexes = [
+            models.Index(fields=['following', 'follower'], name='follow_following_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.follower_id} -> {self.following_id}"
+
+
+class RetiredAvatar(models.Model):
+    """
+    An avatar version replaced by a newer upload. Its objects are deleted by
+    `manage.py gc_avatars` once no worker's user directory can still hand
+    out its URL.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE)
+    version = models.PositiveIntegerField()
+    retired_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['retired_at'], name='retired_avatar_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user_id} v{self.version}"
@@ -1,6 +1,7 @@
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, pre_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
+from .directory import user_directory
 from .models import Profile
 from settings.models import UserPreferences
 
@@ -13,3 +14,28 @@ def create_user_profile_and_preferences(sender, instance, created, **kwargs):
         Profile.objects.create(user=instance)
         UserPreferences.objects.create(user=instance)
 
+
+@receiver(pre_save, sender=User)
+def remember_previous_username(sender, instance, update_fields=None, **kwargs):
+    instance._previous_username = None
+    # Saves that cannot touch the username (e.g. last_login on login) skip the lookup
+    if instance.pk is None or (update_fields is not None and 'username' not in update_fields):
+        return
+    instance._previous_username = (
+        User.objects.filter(pk=instance.pk).values_list('username', flat=True).first()
+    )
+
+
+@receiver(post_save, sender=User)
+def propagate_username_change(sender, instance, created, **kwargs):
+    """
+    Posts store their author's username for the search index; rewrite it
+    when a user is renamed. The search sync picks the change up from there.
+    """
+    previous = getattr(instance, '_previous_username', None)
+    if created or previous is None or previous == instance.username:
+        return
+    from posts.models import PostDocument
+
+    PostDocument().set_username(instance.pk, instance.username)
+    user_directory.invalidate(instance.pk)
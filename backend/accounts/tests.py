@@ -1,3 +1,34 @@
-from django.test import TestCase
+from django.test import SimpleTestCase
+from accounts.directory import LRUTTLCache
 
-# Create your tests here.
+
+class LRUTTLCacheTests(SimpleTestCase):
+    def test_get_many_returns_only_cached_keys(self):
+        cache = LRUTTLCache(max_entries=10, ttl=60)
+        cache.set_many({1: 'a', 2: 'b'})
+
+        self.assertEqual(cache.get_many([1, 2, 3]), {1: 'a', 2: 'b'})
+
+    def test_least_recently_used_entry_is_evicted(self):
+        cache = LRUTTLCache(max_entries=2, ttl=60)
+        cache.set_many({1: 'a', 2: 'b'})
+        cache.get_many([1])
+        cache.set_many({3: 'c'})
+
+        self.assertEqual(cache.get_many([1, 2, 3]), {1: 'a', 3: 'c'})
+
+    def test_expired_entries_are_misses(self):
+        cache = LRUTTLCache(max_entries=10, ttl=-1)
+        cache.set_many({1: 'a'})
+
+        self.assertEqual(cache.get_many([1]), {})
+
+    def test_delete_and_clear(self):
+        cache = LRUTTLCache(max_entries=10, ttl=60)
+        cache.set_many({1: 'a', 2: 'b', 3: 'c'})
+        cache.delete(1)
+        cache.delete(4)
+
+        self.assertEqual(cache.get_many([1, 2, 3]), {2: 'b', 3: 'c'})
+        cache.clear()
+        self.assertEqual(cache.get_many([1, 2, 3]), {})
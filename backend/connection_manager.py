@@ -0,0 +1,344 @@
+import asyncio
+import logging
+import os
+import threading
+from collections import defaultdict
+from typing import Dict, Optional
+from pymongo import MongoClient as PyMongoClient
+from pymongo import monitoring
+
+import service_settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    from django.conf import settings
+    MONGODB_SETTINGS = getattr(settings, 'MONGODB_SETTINGS', service_settings.MONGODB_SETTINGS)
+    CONNECTION_SETTINGS = getattr(settings, 'CONNECTION_SETTINGS', service_settings.CONNECTION_SETTINGS)
+except Exception:
+    # Standalone scripts such as cron/es_sync.py run without Django settings
+    MONGODB_SETTINGS = service_settings.MONGODB_SETTINGS
+    CONNECTION_SETTINGS = service_settings.CONNECTION_SETTINGS
+
+
+class MongoPoolListener(monitoring.ConnectionPoolListener):
+    """Per-server connection counts fed by pymongo's pool events"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.servers = defaultdict(lambda: {
+            'open': 0, 'checked_out': 0, 'max_checked_out': 0,
+            'created': 0, 'closed': 0, 'checkout_failures': 0,
+        })
+
+    def _update(self, address, **deltas):
+        with self._lock:
+            server = self.servers[f"{address[0]}:{address[1]}"]
+            for name, delta in deltas.items():
+                server[name] += delta
+            server['max_checked_out'] = max(server['max_checked_out'], server['checked_out'])
+
+    def snapshot(self) -> Dict:
+        with self._lock:
+            return {address: dict(server) for address, server in self.servers.items()}
+
+    def connection_created(self, event):
+        self._update(event.address, open=1, created=1)
+
+    def connection_closed(self, event):
+        self._update(event.address, open=-1, closed=1)
+
+    def connection_checked_out(self, event):
+        self._update(event.address, checked_out=1)
+
+    def connection_checked_in(self, event):
+        self._update(event.address, checked_out=-1)
+
+    def connection_check_out_failed(self, event):
+        self._update(event.address, checkout_failures=1)
+
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        pass
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_check_out_started(self, event):
+        pass
+
+
+def _urllib3_pool_stats(pool) -> Dict:
+    idle = getattr(pool, 'pool', None)
+    return {
+        'maxsize': idle.maxsize if idle is not None else None,
+        'idle': idle.qsize() if idle is not None else 0,
+        'connections_opened': getattr(pool, 'num_connections', 0),
+        'requests': getattr(pool, 'num_requests', 0),
+    }
+
+
+def _close_async_elasticsearch(loop, client):
+    """
+    AsyncElasticsearch.close() is a coroutine that has to run on the loop the
+    client's aiohttp session belongs to
+    """
+    try:
+        if loop.is_running():
+            asyncio.run_coroutine_threadsafe(client.close(), loop)
+        elif not loop.is_closed() and not _has_running_loop():
+            loop.run_until_complete(client.close())
+        else:
+            # Sockets of a closed loop were torn down with it
+            logger.debug("Dropped an AsyncElasticsearch client whose event loop is gone")
+    except Exception as e:
+        logger.warning(f"Could not close an AsyncElasticsearch client: {e}")
+
+
+def _has_running_loop() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+class ConnectionManager:
+    """
+    Owns the process's clients for Mongo, Elasticsearch and object storage,
+    and reports on Django's Postgres connections. Clients are created on
+    first use with the pool sizes and timeouts from CONNECTION_SETTINGS and
+    rebuilt in a forked child, since pooled sockets cannot be shared with
+    the parent. Async views get Motor and AsyncElasticsearch clients bound
+    to the worker's event loop.
+    """
+
+    def __init__(self, mongo_settings: Dict, options: Dict):
+        self.mongo_settings = mongo_settings
+        self.options = options
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._mongo = None
+        self._mongo_listener = None
+        self._elasticsearch = None
+        # (event loop, client) pairs; async clients are bound to one loop
+        self._mongo_async = None
+        self._elasticsearch_async = None
+
+    def _check_pid(self):
+        if self._pid != os.getpid():
+            self.reset()
+
+    def reset(self):
+        """Forget clients inherited from a parent process without closing their sockets"""
+        self._lock = threading.Lock()
+        self._pid = os.getpid()
+        self._mongo = None
+        self._mongo_listener = None
+        self._elasticsearch = None
+        self._mongo_async = None
+        self._elasticsearch_async = None
+
+    def mongo(self) -> PyMongoClient:
+        self._check_pid()
+        if self._mongo is None:
+            with self._lock:
+                if self._mongo is None:
+                    self._mongo = self._build_mongo()
+        return self._mongo
+
+    def mongo_db(self):
+        return self.mongo()[self.mongo_settings['db']]
+
+    def _mongo_uri(self) -> str:
+        config = self.mongo_settings
+        if config['username'] and config['password']:
+            return f"mongodb://{config['username']}:{config['password']}@{config['host']}:{config['port']}/"
+        return f"mongodb://{config['host']}:{config['port']}/"
+
+    def _mongo_options(self) -> Dict:
+        pool = self.options.get('mongo', {})
+        if self._mongo_listener is None:
+            self._mongo_listener = MongoPoolListener()
+        return {
+            'maxPoolSize': pool.get('max_pool_size', 100),
+            'minPoolSize': pool.get('min_pool_size', 0),
+            'maxIdleTimeMS': pool.get('max_idle_time_ms'),
+            'connectTimeoutMS': pool.get('connect_timeout_ms', 5000),
+            'serverSelectionTimeoutMS': pool.get('server_selection_timeout_ms', 5000),
+            'waitQueueTimeoutMS': pool.get('wait_queue_timeout_ms'),
+            'event_listeners': [self._mongo_listener],
+        }
+
+    def _build_mongo(self) -> PyMongoClient:
+        try:
+            client = PyMongoClient(self._mongo_uri(), **self._mongo_options())
+            logger.info("MongoDB connection established")
+            return client
+        except Exception as e:
+            logger.error(f"MongoDB connection failed: {e}")
+            raise
+
+    def mongo_async(self):
+        """Motor client for the running event loop, sharing the sync client's pool settings"""
+        self._check_pid()
+        loop = asyncio.get_running_loop()
+        if self._mongo_async is None or self._mongo_async[0] is not loop:
+            from motor.motor_asyncio import AsyncIOMotorClient
+
+            with self._lock:
+                if self._mongo_async is None or self._mongo_async[0] is not loop:
+                    previous = self._mongo_async
+                    client = AsyncIOMotorClient(self._mongo_uri(), io_loop=loop, **self._mongo_options())
+                    self._mongo_async = (loop, client)
+                    if previous is not None:
+                        previous[1].close()
+        return self._mongo_async[1]
+
+    def mongo_async_db(self):
+        return self.mongo_async()[self.mongo_settings['db']]
+
+    def elasticsearch(self):
+        self._check_pid()
+        if self._elasticsearch is None:
+            with self._lock:
+                if self._elasticsearch is None:
+                    from elasticsearch import Elasticsearch
+
+                    config = dict(self.options.get('elasticsearch', {}))
+                    self._elasticsearch = Elasticsearch(config.pop('hosts'), **config)
+        return self._elasticsearch
+
+    def elasticsearch_async(self):
+        """AsyncElasticsearch client for the running event loop"""
+        self._check_pid()
+        loop = asyncio.get_running_loop()
+        if self._elasticsearch_async is None or self._elasticsearch_async[0] is not loop:
+            from elasticsearch import AsyncElasticsearch
+
+            with self._lock:
+                if self._elasticsearch_async is None or self._elasticsearch_async[0] is not loop:
+                    previous = self._elasticsearch_async
+                    config = dict(self.options.get('elasticsearch', {}))
+                    self._elasticsearch_async = (loop, AsyncElasticsearch(config.pop('hosts'), **config))
+                    if previous is not None:
+                        _close_async_elasticsearch(*previous)
+        return self._elasticsearch_async[1]
+
+    def storage(self):
+        # The storage module keeps its own per-process driver
+        from storage import get_storage
+        return get_storage()
+
+    def close(self):
+        with self._lock:
+            if self._mongo is not None:
+                self._mongo.close()
+            if self._elasticsearch is not None:
+                self._elasticsearch.close()
+            if self._mongo_async is not None:
+                self._mongo_async[1].close()
+            if self._elasticsearch_async is not None:
+                _close_async_elasticsearch(*self._elasticsearch_async)
+            self._mongo = None
+            self._elasticsearch = None
+            self._mongo_async = None
+            self._elasticsearch_async = None
+
+    def _mongo_stats(self) -> Optional[Dict]:
+        if self._mongo is None:
+            return None
+        pool = self.options.get('mongo', {})
+        return {
+            'max_pool_size': pool.get('max_pool_size', 100),
+            'wait_queue_timeout_ms': pool.get('wait_queue_timeout_ms'),
+            'servers': self._mongo_listener.snapshot() if self._mongo_listener else {},
+        }
+
+    def _elasticsearch_stats(self) -> Optional[Dict]:
+        if self._elasticsearch is None:
+            return None
+        nodes = {}
+        for node in self._elasticsearch.transport.node_pool.all():
+            pool = getattr(node, 'pool', None)
+            nodes[str(node.base_url)] = _urllib3_pool_stats(pool) if pool is not None else {}
+        return {
+            'connections_per_node': self.options.get('elasticsearch', {}).get('connections_per_node'),
+            'nodes': nodes,
+        }
+
+    def _storage_stats(self) -> Optional[Dict]:
+        from storage import STORAGE_SETTINGS, get_storage
+
+        storage = get_storage()
+        http_client = getattr(storage, 'http_client', None)
+        if http_client is None:
+            return {'backend': STORAGE_SETTINGS.get('backend', 'minio')}
+        pools = {}
+        for key in http_client.pools.keys():
+            pool = http_client.pools.get(key)
+            if pool is not None:
+                pools[f"{key.key_host}:{key.key_port}"] = _urllib3_pool_stats(pool)
+        return {
+            'backend': STORAGE_SETTINGS.get('backend', 'minio'),
+            'pool_maxsize': STORAGE_SETTINGS.get('pool_maxsize', 32),
+            'hosts': pools,
+        }
+
+    def _postgres_stats(self) -> Optional[Dict]:
+        try:
+            from django.db import connections
+        except Exception:
+            return None
+        return {
+            alias: {
+                'conn_max_age': connections.settings[alias].get('CONN_MAX_AGE', 0),
+                'health_checks': connections.settings[alias].get('CONN_HEALTH_CHECKS', False),
+                # Django keeps one connection per thread, so this reflects the calling thread only
+                'connected': connections[alias].connection is not None,
+            }
+            for alias in connections
+        }
+
+    def stats(self) -> Dict:
+        """Pool configuration and utilization of every client this process has opened"""
+        self._check_pid()
+        return {
+            'pid': os.getpid(),
+            'mongo': self._mongo_stats(),
+            'elasticsearch': self._elasticsearch_stats(),
+            'storage': self._storage_stats(),
+            'postgres': self._postgres_stats(),
+        }
+
+
+def close_django_connections():
+    """
+    Close this thread's Postgres connections before a server worker is
+    forked: a socket inherited through fork would be shared by parent and
+    child, and closing it first makes both sides reconnect lazily. Called
+    from gunicorn's pre_fork hook rather than on every fork, since forks
+    made from request threads (the image variant pool) must not drop the
+    request's connection.
+    """
+    try:
+        from django.db import connections
+        for connection in connections.all(initialized_only=True):
+            if not connection.in_atomic_block:
+                connection.close()
+    except Exception:
+        pass
+
+
+connection_manager = ConnectionManager(MONGODB_SETTINGS, CONNECTION_SETTINGS)
+
+# Any forked child, server worker or pool process, rebuilds its own clients
+os.register_at_fork(after_in_child=connection_manager.reset)
@@ -8,14 +8,16 @@ import sys
 import json
 import logging
 from datetime import datetime, timedelta
-from elasticsearch import Elasticsearch
 from elasticsearch.helpers import bulk
 from elasticsearch.helpers import BulkIndexError
-from bson import ObjectId
 
 sys.path.append('/app')
 
+from connection_manager import connection_manager
 from mongo_api import get_mongo_client
+from posts.models import CounterDocument
+from search.documents import index_action, update_action
+from search.index import POSTS_ALIAS, ensure_posts_index
 
 logging.basicConfig(
     level=logging.INFO,
@@ -29,13 +31,6 @@ logger = logging.getLogger(__name__)
 
 STATE_FILE = '/app/cron/es_sync_state.json'
 
-def json_serializer(obj):
-    if isinstance(obj, ObjectId):
-        return str(obj)
-    if isinstance(obj, datetime):
-        return obj.isoformat()
-    raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
-
 def get_last_sync_time():
     try:
         with open(STATE_FILE, 'r') as f:
@@ -54,18 +49,12 @@ def save_last_sync_time(timestamp):
 
 def sync_mongo_to_elasticsearch():
     try:
-        es_host = os.getenv('ELASTIC_URL', 'elasticsearch')
-        es_port = os.getenv('ELASTIC_PORT', '9200')
-        es_url = f"http://{es_host}:{es_port}"
-        
-        es_client = Elasticsearch(
-            [es_url],
-            retry_on_timeout=True,
-            max_retries=3
-        )
+        es_client = connection_manager.elasticsearch()
+        # Writing to a missing alias would create a dynamically mapped index
+        ensure_posts_index(es_client)
         
         try:
-            es_count = es_client.count(index="posts")['count']
+            es_count = es_client.count(index=POSTS_ALIAS)['count']
         except Exception as e:
             logger.warning(f"Could not get document count from Elasticsearch: {e}. Assuming zero documents.")
             es_count = 0
@@ -73,44 +62,51 @@ def sync_mongo_to_elasticsearch():
         mongo_client = get_mongo_client()
         db = mongo_client.db
         collection = db['posts']
+        # Taken before reading so writes made during the sync are picked up next run
+        sync_started = datetime.utcnow()
         
         if es_count == 0:
             logger.info("Elasticsearch index is empty. Fetching all documents from MongoDB.")
+            last_sync = None
             query = {'deleted': {'$ne': True}}
         else:
             last_sync = get_last_sync_time()
-            logger.info(f"Syncing documents newer than {last_sync}")
-            query = {
-                'created_at': {'$gte': last_sync},
-                'deleted': {'$ne': True}  
-            }
+            logger.info(f"Syncing documents created or changed since {last_sync}")
+            # New posts, changed counts and author names, and deletions are
+            # all marked with updated_at
+            query = {'updated_at': {'$gte': last_sync}}
         
         documents = list(collection.find(query))
         logger.info(f"Found {len(documents)} documents to sync")
         
         if documents:
             actions = []
+            # Only new and deleted posts change which posts a search matches;
+            # count and username updates are read fresh for cached pages
+            changes_results = False
             for doc in documents:
-                doc_source = doc.copy()
-                doc_id = str(doc_source.pop('_id', None))
-                doc_source.pop('like_count', None)
-                actions.append({
-                    "_index": "posts",
-                    "_id": doc_id,
-                    "_source": json.loads(json.dumps(doc_source, default=json_serializer))
-                })
+                if last_sync is None or doc['created_at'] >= last_sync:
+                    if doc.get('deleted'):
+                        continue
+                    actions.append(index_action(doc, POSTS_ALIAS))
+                    changes_results = True
+                else:
+                    actions.append(update_action(doc, POSTS_ALIAS))
+                    changes_results = changes_results or bool(doc.get('deleted'))
             
             try:
                 success_count, failed_count = bulk(es_client, actions, max_retries=3)
                 logger.info(f"Successfully synced {success_count} documents, {failed_count} failed")
+                if success_count and changes_results:
+                    # Retires the search result pages cached by the web workers
+                    CounterDocument().increment(CounterDocument.SEARCH_GENERATION_KEY)
             except BulkIndexError as e:
                 logger.error(f"Bulk indexing failed with {len(e.errors)} errors:")
                 for error in e.errors:
                     logger.error(f"  {error}")
                 raise
             
-        current_time = datetime.utcnow()
-        save_last_sync_time(current_time)
+        save_last_sync_time(sync_started)
         logger.info("Sync completed successfully")
             
     except Exception as e:
@@ -79,6 +79,7 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'devthoughts.wsgi.application'
+ASGI_APPLICATION = 'devthoughts.asgi.application'
 
 
 # Database
@@ -91,7 +92,14 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD'),
         'HOST': os.getenv('POSTGRES_HOST'),
-        'PORT': os.getenv('POSTGRES_PORT')
+        'PORT': os.getenv('POSTGRES_PORT'),
+        # Keep each worker thread's connection open between requests and
+        # check it is still alive before reuse
+        'CONN_MAX_AGE': int(os.getenv('POSTGRES_CONN_MAX_AGE', 60)),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            'connect_timeout': int(os.getenv('POSTGRES_CONNECT_TIMEOUT', 5)),
+        },
     }
 }
 
@@ -136,13 +144,40 @@ LOGIN_REDIRECT_URL = '/'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
-# MongoDB settings
-MONGODB_SETTINGS = {
-    'host': os.getenv('MONGO_HOST', 'localhost'),
-    'port': int(os.getenv('MONGO_PORT', 27017)),
-    'db': os.getenv('MONGO_DB', 'devthoughts_db'),
-    'username': os.getenv('MONGO_INITDB_ROOT_USERNAME'),
-    'password': os.getenv('MONGO_INITDB_ROOT_PASSWORD')
+# MongoDB and client pool settings live in service_settings.py, which the
+# cron job reads without Django
+from service_settings import CONNECTION_SETTINGS, MONGODB_SETTINGS  # noqa: E402
+
+# Create missing declared Mongo indexes when the app loads
+# (`manage.py ensure_mongo_indexes` does the same on demand)
+MONGO_ENSURE_INDEXES_ON_STARTUP = os.getenv('MONGO_ENSURE_INDEXES_ON_STARTUP', 'False').lower() == 'true'
+
+# Search: Elasticsearch timeout per query and the circuit breaker that
+# switches to the Mongo text index after repeated failures; the per-worker
+# result cache (ids and totals, dropped when the sync job bumps the search
+# generation) and the query log used to warm it
+SEARCH_SETTINGS = {
+    'timeout': float(os.getenv('SEARCH_TIMEOUT', 2)),
+    'suggest_timeout': float(os.getenv('SEARCH_SUGGEST_TIMEOUT', 0.5)),
+    # How long a search cursor's point in time outlives its last page
+    # request; kept short since abandoned cursors hold theirs until it lapses
+    'pit_keep_alive': os.getenv('SEARCH_PIT_KEEP_ALIVE', '1m'),
+    'breaker_failure_threshold': int(os.getenv('SEARCH_BREAKER_FAILURES', 5)),
+    'breaker_reset_timeout': float(os.getenv('SEARCH_BREAKER_RESET', 30)),
+    'cache_ttl': float(os.getenv('SEARCH_CACHE_TTL', 60)),
+    'cache_max_entries': int(os.getenv('SEARCH_CACHE_MAX_ENTRIES', 5000)),
+    'generation_check_interval': float(os.getenv('SEARCH_GENERATION_CHECK_INTERVAL', 5)),
+    'query_log_flush_interval': float(os.getenv('SEARCH_QUERY_LOG_FLUSH_INTERVAL', 10)),
+    'query_log_window_days': int(os.getenv('SEARCH_QUERY_LOG_WINDOW_DAYS', 7)),
+}
+
+# What a production worker does before taking traffic (see devthoughts/warmup.py)
+WARMUP_SETTINGS = {
+    'prime_recent_posts': int(os.getenv('WARMUP_PRIME_RECENT_POSTS', 200)),
+    'elasticsearch': os.getenv('WARMUP_ELASTICSEARCH', 'True').lower() == 'true',
+    'storage': os.getenv('WARMUP_STORAGE', 'True').lower() == 'true',
+    # Most searched queries run through the search cache (0 disables)
+    'search_queries': int(os.getenv('WARMUP_SEARCH_QUERIES', 20)),
 }
 
 # REST Framework settings
@@ -154,3 +189,89 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.IsAuthenticated',
     ],
 }
+
+# In-process cache for user id -> username lookups on list pages; workers
+# see each other's invalidations within generation_check_interval seconds
+USER_DIRECTORY_SETTINGS = {
+    'max_entries': int(os.getenv('USER_DIRECTORY_MAX_ENTRIES', 10000)),
+    'ttl': float(os.getenv('USER_DIRECTORY_TTL', 300)),
+    'generation_check_interval': float(os.getenv('USER_DIRECTORY_GENERATION_CHECK_INTERVAL', 5)),
+}
+
+# Hard upper bound for the page_size query param on list endpoints
+POSTS_MAX_PAGE_SIZE = int(os.getenv('POSTS_MAX_PAGE_SIZE', 50))
+
+# Home timelines: fan-out-on-write batch size, the follower count above which
+# an author's posts are merged in at read time instead (the list of such
+# authors is cached per worker for high_fanout_ttl seconds), and how many
+# recent posts are copied into a timeline on follow. Fan-outs run on
+# fanout_workers background threads per worker; one whose claim is older
+# than fanout_stale_claim seconds is resumed by the sweeper
+FEED_SETTINGS = {
+    'fanout_batch_size': int(os.getenv('FEED_FANOUT_BATCH_SIZE', 1000)),
+    'fanout_workers': int(os.getenv('FEED_FANOUT_WORKERS', 2)),
+    'fanout_sweep_interval': float(os.getenv('FEED_FANOUT_SWEEP_INTERVAL', 30)),
+    'fanout_stale_claim': float(os.getenv('FEED_FANOUT_STALE_CLAIM', 120)),
+    'fanout_max_followers': int(os.getenv('FEED_FANOUT_MAX_FOLLOWERS', 10000)),
+    'high_fanout_ttl': float(os.getenv('FEED_HIGH_FANOUT_TTL', 30)),
+    'follow_backfill': int(os.getenv('FEED_FOLLOW_BACKFILL', 50)),
+}
+
+# Like pipeline: pending rows of the likes collection are swept into
+# like_count, coalesced per post, flush_interval seconds after a worker
+# records a like and every max_lag seconds regardless; max_pending rows are
+# claimed per batch and a claim older than stale_claim seconds is taken over
+LIKE_PIPELINE_SETTINGS = {
+    'flush_interval': float(os.getenv('LIKE_FLUSH_INTERVAL', 1.0)),
+    'max_lag': float(os.getenv('LIKE_MAX_LAG', 5.0)),
+    'max_pending': int(os.getenv('LIKE_MAX_PENDING', 1000)),
+    'stale_claim': float(os.getenv('LIKE_STALE_CLAIM', 60)),
+}
+
+# Object storage for attachments and avatars: `minio` talks to MinIO over
+# a per-process connection pool, `local` keeps objects under `local_root`
+STORAGE_SETTINGS = {
+    'backend': os.getenv('STORAGE_BACKEND', 'minio'),
+    'local_root': os.getenv('STORAGE_LOCAL_ROOT', str(BASE_DIR / 'media_storage')),
+    'pool_maxsize': int(os.getenv('MINIO_POOL_MAXSIZE', 32)),
+    'connect_timeout': float(os.getenv('MINIO_CONNECT_TIMEOUT', 3)),
+    'read_timeout': float(os.getenv('MINIO_READ_TIMEOUT', 30)),
+    'retries': int(os.getenv('MINIO_RETRIES', 3)),
+    # Where browsers reach MinIO (e.g. http://localhost:9000); presigned
+    # URLs are signed for this host. Unset, they use the internal MINIO_URL
+    'public_endpoint': os.getenv('MINIO_PUBLIC_ENDPOINT', ''),
+    'ensure_buckets_on_startup': os.getenv('STORAGE_ENSURE_BUCKETS_ON_STARTUP', 'False').lower() == 'true',
+}
+
+# Threads shared by all requests for streaming attachments into MinIO
+UPLOAD_WORKERS = int(os.getenv('UPLOAD_WORKERS', 8))
+
+# How feed responses link to attachments: `proxy` serves them through
+# /api/attachments/, `presigned` hands out MinIO presigned URLs
+ATTACHMENT_SETTINGS = {
+    'url_mode': os.getenv('ATTACHMENT_URL_MODE', 'proxy'),
+    'base_url': os.getenv('ATTACHMENT_BASE_URL', ''),
+    'presigned_ttl': int(os.getenv('ATTACHMENT_PRESIGNED_TTL', 3600)),
+}
+
+# Local disk cache for attachments and profile pictures, shared by the
+# workers on a host. serve_mode `sendfile` serves hits through FileResponse,
+# `accel` hands them to nginx via X-Accel-Redirect (accel_prefix must map to
+# an internal location aliased to root)
+MEDIA_CACHE_SETTINGS = {
+    'enabled': os.getenv('MEDIA_CACHE_ENABLED', 'False').lower() == 'true',
+    'root': os.getenv('MEDIA_CACHE_ROOT', '/var/cache/devthoughts/media'),
+    'max_bytes': int(os.getenv('MEDIA_CACHE_MAX_BYTES', 1024 ** 3)),
+    'max_object_bytes': int(os.getenv('MEDIA_CACHE_MAX_OBJECT_BYTES', 20 * 1024 ** 2)),
+    'serve_mode': os.getenv('MEDIA_CACHE_SERVE_MODE', 'sendfile'),
+    'accel_prefix': os.getenv('MEDIA_CACHE_ACCEL_PREFIX', '/_media_cache/'),
+}
+
+# Resized JPEG/WebP variants of uploaded images, rendered in a process pool.
+# Pool processes are started with `start_method` (forkserver or spawn), never
+# forked from a threaded server worker
+IMAGE_VARIANT_SETTINGS = {
+    'enabled': os.getenv('IMAGE_VARIANTS_ENABLED', 'True').lower() == 'true',
+    'workers': int(os.getenv('IMAGE_VARIANT_WORKERS', 2)),
+    'start_method': os.getenv('IMAGE_VARIANT_START_METHOD', 'forkserver'),
+}
@@ -17,11 +17,14 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import path, include
 from django.contrib.auth import views as auth_views
+from devthoughts.views import connection_stats, readiness
 
 urlpatterns = [
     path('api/', include('accounts.api.urls')),
     path('api/settings/', include('settings.api.urls')),
     path('api/', include('posts.api.url')),
     path('api/', include('search.api.url')),
+    path('api/system/connections/', connection_stats, name='connection-stats'),
+    path('api/system/ready/', readiness, name='readiness'),
     path('admin/', admin.site.urls),
 ]
\ No newline at end of file
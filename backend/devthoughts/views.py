@@ -0,0 +1,27 @@
+from rest_framework import status
+from rest_framework.decorators import api_view, permission_classes
+from rest_framework.permissions import AllowAny, IsAdminUser
+from rest_framework.response import Response
+from connection_manager import connection_manager
+from devthoughts import warmup
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def connection_stats(request):
+    """
+    Pool sizes and utilization of the backend clients held by the worker
+    process that answers the request
+    """
+    return Response(connection_manager.stats(), status=status.HTTP_200_OK)
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def readiness(request):
+    """
+    200 once this worker has finished warming up (or needs no warmup),
+    503 while it is still warming or a critical dependency failed
+    """
+    state = warmup.readiness()
+    return Response(state, status=status.HTTP_200_OK if state['ready'] else status.HTTP_503_SERVICE_UNAVAILABLE)
@@ -0,0 +1,142 @@
+import logging
+import os
+import time
+from typing import Callable, Dict
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+WARMUP_SETTINGS = getattr(settings, 'WARMUP_SETTINGS', {})
+
+# Per-process state reported by the readiness endpoint. A process that was
+# not started through the production server config has nothing to wait for.
+_state = {'required': False, 'done': False, 'started_at': None, 'seconds': None, 'steps': {}}
+
+# Steps whose failure keeps the worker out of rotation; the others only
+# degrade a feature (search, media) and are reported
+CRITICAL_STEPS = ('postgres', 'mongo')
+
+
+def _run_step(name: str, step: Callable):
+    start = time.perf_counter()
+    try:
+        step()
+        _state['steps'][name] = {'ok': True, 'seconds': round(time.perf_counter() - start, 3)}
+    except Exception as e:
+        logger.error(f"Warmup step {name} failed: {e}")
+        _state['steps'][name] = {'ok': False, 'seconds': round(time.perf_counter() - start, 3), 'error': str(e)}
+
+
+def prepare_cluster():
+    """
+    One-off setup run by the server master before workers fork: create
+    declared Mongo indexes, seed post counters, flag high-fanout authors,
+    storage buckets and the search index alias. Connections opened here are closed so no worker
+    inherits them.
+    """
+    from django.db import connections
+    from accounts.avatars import AVATAR_BUCKET
+    from connection_manager import connection_manager
+    from posts.attachments import ATTACHMENT_BUCKET
+    from posts.base import BaseDocument
+    from posts.feed import FANOUT_MAX_FOLLOWERS
+    from posts.models import CounterDocument, PostDocument
+    from storage import get_storage
+
+    def ensure_indexes():
+        for document_class in BaseDocument.document_classes():
+            document_class().ensure_indexes()
+
+    _run_step('indexes', ensure_indexes)
+    _run_step('post_counters', lambda: PostDocument().seed_counters())
+    # Follower counters written before the flag existed, or under another limit
+    _run_step('fanout_flags', lambda: CounterDocument().flag_high_fanout(FANOUT_MAX_FOLLOWERS))
+    _run_step('buckets', lambda: get_storage().ensure_buckets([ATTACHMENT_BUCKET, AVATAR_BUCKET]))
+    if WARMUP_SETTINGS.get('elasticsearch', True):
+        from search.index import ensure_posts_index
+        _run_step('search_index', lambda: ensure_posts_index(connection_manager.elasticsearch()))
+    connection_manager.close()
+    connections.close_all()
+
+
+def _prime_user_directory():
+    from accounts.directory import user_directory
+    from posts.models import PostDocument
+
+    recent = PostDocument().get_page_after(
+        PostDocument.feed_filter(), None, WARMUP_SETTINGS.get('prime_recent_posts', 200)
+    )
+    user_directory.get_entries(post.get('user_id') for post in recent)
+
+
+def _warm_search_cache():
+    from search.api.views import SEARCH_PAGE_SIZE, SearchPostsView
+    from search.cache import query_log
+
+    view = SearchPostsView()
+    for query in query_log.top(WARMUP_SETTINGS.get('search_queries', 20)):
+        view.search(query, 0, SEARCH_PAGE_SIZE)
+
+
+def _check_postgres():
+    """
+    Reachability check only: Django connections belong to the thread that
+    opened them, so one opened here would never serve a request. It is
+    closed again rather than held idle for the worker's lifetime.
+    """
+    from django.db import connection
+
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    finally:
+        connection.close()
+
+
+def warm_worker():
+    """
+    Open this worker's pools and fill its caches before it accepts
+    requests; Postgres is only checked, see _check_postgres. Called from
+    the server's post-worker-init hook.
+    """
+    from django.db import connections
+    from connection_manager import connection_manager
+    from posts.attachments import ATTACHMENT_BUCKET
+    from posts.feed import fan_out_queue
+    from posts.likes import like_buffer
+    from posts.models import PostDocument
+    from posts.variants import start_pool
+
+    _state.update(required=True, done=False, started_at=time.time(), steps={})
+    start = time.perf_counter()
+
+    # First, while this worker runs no threads of its own yet
+    _run_step('variant_pool', start_pool)
+    _run_step('postgres', _check_postgres)
+    _run_step('mongo', lambda: connection_manager.mongo().admin.command('ping'))
+    if WARMUP_SETTINGS.get('elasticsearch', True):
+        # Also pays the elasticsearch import here rather than on the first search
+        _run_step('elasticsearch', lambda: connection_manager.elasticsearch().info())
+    if WARMUP_SETTINGS.get('storage', True):
+        # A stat of a missing key is enough to open a pooled connection
+        _run_step('storage', lambda: connection_manager.storage().stat(ATTACHMENT_BUCKET, '.warmup'))
+    _run_step('user_directory', _prime_user_directory)
+    _run_step('post_counts', lambda: PostDocument().count_posts())
+    # Sweeps likes left pending by workers that died, even before this one records any
+    _run_step('like_sweeper', like_buffer.start)
+    _run_step('fanout_sweeper', fan_out_queue.start)
+    if WARMUP_SETTINGS.get('elasticsearch', True) and WARMUP_SETTINGS.get('search_queries', 20):
+        _run_step('search_cache', _warm_search_cache)
+
+    # The directory priming above queried Postgres from this thread too
+    connections.close_all()
+
+    _state['seconds'] = round(time.perf_counter() - start, 3)
+    _state['done'] = True
+    logger.info(f"Worker {os.getpid()} warmed up in {_state['seconds']}s")
+
+
+def readiness() -> Dict:
+    critical_ok = all(_state['steps'].get(name, {}).get('ok', False) for name in CRITICAL_STEPS)
+    ready = not _state['required'] or (_state['done'] and critical_ok)
+    return dict(_state, ready=ready, pid=os.getpid())
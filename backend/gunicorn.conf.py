@@ -0,0 +1,56 @@
+# Production server settings, used by `entrypoint.sh` when APP_MODE=production.
+# The app is imported once in the master (preload_app) so forked workers
+# start without re-importing Django; each worker then opens its own pools
+# in post_worker_init before it is handed any request.
+import multiprocessing
+import os
+import time
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:8000')
+workers = int(os.getenv('GUNICORN_WORKERS', multiprocessing.cpu_count() * 2 + 1))
+# `gthread` serves the WSGI app; `uvicorn.workers.UvicornWorker` serves the
+# ASGI app so the /api/async/ endpoints run on an event loop
+worker_class = os.getenv('GUNICORN_WORKER_CLASS', 'gthread')
+threads = int(os.getenv('GUNICORN_THREADS', 8))
+wsgi_app = 'devthoughts.asgi:application' if 'uvicorn' in worker_class.lower() else 'devthoughts.wsgi:application'
+
+preload_app = True
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 30))
+graceful_timeout = int(os.getenv('GUNICORN_GRACEFUL_TIMEOUT', 30))
+keepalive = int(os.getenv('GUNICORN_KEEPALIVE', 5))
+# Recycle workers periodically; jitter keeps them from restarting together
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 10000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 1000))
+
+accesslog = os.getenv('GUNICORN_ACCESS_LOG', '-')
+errorlog = '-'
+
+_master_started = time.perf_counter()
+
+
+def when_ready(server):
+    from devthoughts import warmup
+
+    warmup.prepare_cluster()
+    server.log.info(f"Master ready in {time.perf_counter() - _master_started:.2f}s")
+
+
+def pre_fork(server, worker):
+    from connection_manager import close_django_connections
+
+    close_django_connections()
+
+
+def post_fork(server, worker):
+    worker.forked_at = time.perf_counter()
+
+
+def post_worker_init(worker):
+    from devthoughts import warmup
+
+    warmup.warm_worker()
+    state = warmup.readiness()
+    worker.log.info(
+        f"Worker {worker.pid} booted in {time.perf_counter() - worker.forked_at:.2f}s "
+        f"(warmup {state['seconds']}s, ready={state['ready']})"
+    )
@@ -0,0 +1,159 @@
+import asyncio
+import logging
+from bson import ObjectId
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+from accounts.api.async_auth import asgi_only, async_token_required
+from accounts.directory import user_directory
+from posts import async_queries
+from posts.api.utils import clamp_page_size, decode_cursor, encode_cursor
+from posts.attachments import resolve_attachments
+from posts.models import PostDocument
+from .serializer import PostSerializer
+
+logger = logging.getLogger(__name__)
+
+# Async counterparts of the read-heavy endpoints in views.py, for ASGI
+# workers. Responses match the sync views; lookups that do not depend on
+# each other are awaited together instead of one after another.
+
+
+def _serialize(posts, usernames, liked):
+    serialized = []
+    for post in posts:
+        post_data = PostSerializer(post).data
+        post_data['username'] = usernames.get(post_data['user_id'])
+        post_data['is_liked'] = post['_id'] in liked
+        post_data['attachments'] = resolve_attachments(post)
+        serialized.append(post_data)
+    return serialized
+
+
+async def _cursor_page(query, cursor, page_size, ascending=False):
+    after = decode_cursor(cursor) if cursor else None
+    docs = await async_queries.get_page_after(query, after, page_size + 1, ascending)
+    next_cursor = encode_cursor(docs[page_size - 1]) if len(docs) > page_size else None
+    return docs[:page_size], next_cursor
+
+
+@require_GET
+@asgi_only
+@async_token_required
+async def get_all_posts(request):
+    try:
+        page_size = clamp_page_size(request.GET.get('page_size'), 10)
+        cursor_mode = 'cursor' in request.GET
+        if cursor_mode:
+            page_task = _cursor_page(PostDocument.feed_filter(), request.GET.get('cursor'), page_size)
+        else:
+            page = max(1, int(request.GET.get('page', 1)))
+            skip = (page - 1) * page_size
+            page_task = async_queries.get_posts(PostDocument.feed_filter(), skip, page_size)
+
+        page_result, total_posts = await asyncio.gather(page_task, async_queries.count_posts())
+        all_posts, next_cursor = page_result if cursor_mode else (page_result, None)
+
+        usernames, liked = await asyncio.gather(
+            user_directory.aget_usernames(post.get('user_id') for post in all_posts),
+            async_queries.liked_post_ids(request.user.id, [post['_id'] for post in all_posts]),
+        )
+        serialized_posts = _serialize(all_posts, usernames, liked)
+
+        if cursor_mode:
+            return JsonResponse({
+                'count': total_posts,
+                'next': f"?cursor={next_cursor}&page_size={page_size}" if next_cursor else None,
+                'previous': None,
+                'next_cursor': next_cursor,
+                'results': serialized_posts
+            })
+
+        return JsonResponse({
+            'count': total_posts,
+            'next': f"?page={page+1}&page_size={page_size}" if (skip + len(serialized_posts)) < total_posts else None,
+            'previous': f"?page={page-1}&page_size={page_size}" if page > 1 else None,
+            'results': serialized_posts
+        })
+
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        logger.error(f"Error fetching all posts: {e}")
+        return JsonResponse({'error': 'Failed to fetch posts'}, status=500)
+
+
+@require_GET
+@asgi_only
+@async_token_required
+async def post_detail(request, post_id):
+    if not ObjectId.is_valid(post_id):
+        return JsonResponse({'error': 'Post not found'}, status=404)
+    try:
+        post, liked = await asyncio.gather(
+            async_queries.get_post(post_id),
+            async_queries.liked_post_ids(request.user.id, [post_id]),
+        )
+        if not post:
+            return JsonResponse({'error': 'Post not found'}, status=404)
+
+        usernames = await user_directory.aget_usernames([post.get('user_id')])
+        return JsonResponse(_serialize([post], usernames, liked)[0])
+
+    except Exception as e:
+        logger.error(f"Error fetching post {post_id}: {e}")
+        return JsonResponse({'error': 'Failed to fetch post'}, status=500)
+
+
+@require_GET
+@asgi_only
+@async_token_required
+async def get_comment_post(request, post_id):
+    if not ObjectId.is_valid(post_id):
+        return JsonResponse({'error': 'Post not found'}, status=404)
+    try:
+        page_size = clamp_page_size(request.GET.get('page_size'), 5)
+        cursor_mode = 'cursor' in request.GET
+        if cursor_mode:
+            page_task = _cursor_page(
+                PostDocument.comment_filter(post_id), request.GET.get('cursor'), page_size, ascending=True
+            )
+        else:
+            page = max(1, int(request.GET.get('page', 1)))
+            skip = (page - 1) * page_size
+            page_task = async_queries.get_comments(post_id, skip, page_size)
+
+        query_post, page_result = await asyncio.gather(
+            async_queries.get_post(post_id, {'comment_count': 1, 'comments': 1}), page_task
+        )
+        if not query_post:
+            return JsonResponse({'error': 'Post not found'}, status=404)
+        total_comments = query_post.get('comment_count', len(query_post.get('comments', [])))
+        paginated_comments, next_cursor = page_result if cursor_mode else (page_result, None)
+
+        usernames, liked = await asyncio.gather(
+            user_directory.aget_usernames(comment.get('user_id') for comment in paginated_comments),
+            async_queries.liked_post_ids(request.user.id, [comment['_id'] for comment in paginated_comments]),
+        )
+        serialized_comments = _serialize(paginated_comments, usernames, liked)
+
+        if cursor_mode:
+            return JsonResponse({
+                'count': total_comments,
+                'next': f"?cursor={next_cursor}&page_size={page_size}" if next_cursor else None,
+                'previous': None,
+                'next_cursor': next_cursor,
+                'results': serialized_comments
+            })
+
+        return JsonResponse({
+            'count': total_comments,
+            'next': f"?page={page+1}&page_size={page_size}" if (skip + len(serialized_comments)) < total_comments else None,
+            'previous': f"?page={page-1}&page_size={page_size}" if page > 1 else None,
+            'results': serialized_comments
+        })
+
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        logger.error(f"Error fetching comments: {e}")
+        return JsonResponse({'error': 'Failed to fetch comments'}, status=500)
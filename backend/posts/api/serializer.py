@@ -32,8 +32,15 @@ class PostSerializer(serializers.Serializer):
         child=serializers.CharField(),
         read_only=True
     )
+    attachments = serializers.ListField(
+        child=serializers.DictField(),
+        read_only=True
+    )
 
     like_count = serializers.IntegerField(read_only=True)
+    comment_count = serializers.IntegerField(read_only=True)
+    parent_id = serializers.CharField(read_only=True)
+    root_id = serializers.CharField(read_only=True)
     created_at = serializers.DateTimeField(read_only=True)
     deleted = serializers.BooleanField(read_only=True)
     user_id = serializers.IntegerField(read_only=True)
@@ -1,13 +1,19 @@
 from django.urls import path
-from . import views
+from . import async_views, views
 
 urlpatterns = [
     path('posts/', views.post_list_create, name='post-list-create'),
     path('posts/user/', views.get_posts_by_user, name='user-posts'),
+    path('posts/home/', views.get_home_feed, name='home-feed'),
     path('posts/<str:post_id>/comment/', views.add_comment, name='add-comment'),
     path('posts/<str:post_id>/comments/', views.get_comment_post, name='post-comments'),
     path('posts/<str:post_id>/', views.post_detail, name='post-detail'),
     path('posts/<str:post_id>/like/', views.post_like, name='post-like'),
     path('posts/<str:post_id>/unlike/', views.post_unlike, name='post-unlike'),
     path('attachments/<str:object_name>', views.serve_attachment, name='serve-attachment'),
+    path('media/cache-stats/', views.media_cache_stats, name='media-cache-stats'),
+    # Async variants of the read endpoints; 404 unless served by the ASGI app
+    path('async/posts/', async_views.get_all_posts, name='async-post-list'),
+    path('async/posts/<str:post_id>/comments/', async_views.get_comment_post, name='async-post-comments'),
+    path('async/posts/<str:post_id>/', async_views.post_detail, name='async-post-detail'),
 ]
\ No newline at end of file
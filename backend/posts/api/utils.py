@@ -1,12 +1,37 @@
-import hashlib
+import base64
+import json
 from datetime import datetime
-def hash_with_current_time(data):
-    if isinstance(data, str):
-        data = data.encode('utf-8')
-    data += f"_{datetime.now()}".encode('utf-8')
-
-    sha256_hash = hashlib.sha256(data).hexdigest()
-    return sha256_hash
-    
-    
-    
\ No newline at end of file
+from bson import ObjectId
+from django.conf import settings
+
+
+def clamp_page_size(value, default):
+    """Parse a page_size query param and cap it at POSTS_MAX_PAGE_SIZE"""
+    max_page_size = getattr(settings, 'POSTS_MAX_PAGE_SIZE', 50)
+    try:
+        page_size = int(value) if value is not None else default
+    except (TypeError, ValueError):
+        page_size = default
+    return max(1, min(page_size, max_page_size))
+
+
+def encode_cursor(doc):
+    """Build an opaque cursor from the (created_at, _id) of a document"""
+    created_at = doc['created_at']
+    if isinstance(created_at, datetime):
+        created_at = created_at.isoformat()
+    payload = json.dumps({'t': created_at, 'id': str(doc['_id'])}, separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Inverse of encode_cursor; returns (created_at, _id) or raises ValueError"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        created_at, last_id = datetime.fromisoformat(payload['t']), payload['id']
+    except Exception as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if not ObjectId.is_valid(last_id):
+        raise ValueError(f"Invalid cursor: {cursor}")
+    return created_at, last_id
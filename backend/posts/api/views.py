@@ -4,16 +4,19 @@ from rest_framework.response import Response
 from django.http import Http404
 import logging
 import json
-from posts.models import PostDocument
+from posts.models import LikeDocument, PostDocument
 from .serializer import PostCreateSerializer, PostSerializer
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from bson import ObjectId
-from django.contrib.auth.models import User
-from minio_api import MinioClient
-from posts.api.utils import hash_with_current_time
-from django.http import FileResponse
-import tempfile
-import os
+from posts.api.utils import clamp_page_size, encode_cursor, decode_cursor
+from accounts.directory import user_directory
+from posts.feed import fan_out_queue, home_timeline_page
+from posts.likes import set_like
+from posts.uploads import AttachmentUploadError, release_attachments, upload_attachments
+from posts.attachments import ATTACHMENT_BUCKET, resolve_attachments
+from posts.streaming import serve_object
+from posts.media_cache import media_cache
+from posts.variants import ATTACHMENT_VARIANTS, variant_candidates
 
 logger = logging.getLogger(__name__)
 
@@ -62,15 +65,25 @@ def create_post(request):
             'content': content_data,
             'comments': comments_data,
             'likes': likes_data,
-            'user_id': request.user.id
+            'user_id': request.user.id,
+            # Denormalized for the search index; see PostDocument.set_username
+            'username': request.user.username
         }
         
-        media_urls = []
+        attachments = []
         if "attachments" in request.FILES:
-            media_urls = attach_images(request)
+            attachments = attach_images(request)
         
-        post_data['content']['medias'] = media_urls
-        created_post = post_doc.create(post_data)
+        post_data['content']['medias'] = [attachment['url'] for attachment in attachments]
+        post_data['content']['attachments'] = attachments
+        try:
+            created_post = post_doc.create(post_data)
+        except Exception:
+            release_attachments(attachments)
+            raise
+
+        # Home timelines are written in the background, off the request path
+        fan_out_queue.submit(created_post)
         
         response_serializer = PostSerializer(created_post)
         return Response(
@@ -78,6 +91,12 @@ def create_post(request):
             status=status.HTTP_201_CREATED
         )
         
+    except AttachmentUploadError as e:
+        logger.error(f"Error creating post: {e}")
+        return Response(
+            {'error': 'Failed to store attachments', 'failed': e.failed},
+            status=status.HTTP_503_SERVICE_UNAVAILABLE
+        )
     except Exception as e:
         logger.error(f"Error creating post: {e}")
         return Response(
@@ -87,88 +106,57 @@ def create_post(request):
     
 # bulk function
 def attach_images(request):
-    minio_client = MinioClient().get_client()
-    bucket_name = "attachment-pictures"
-    multiple_files = request.FILES.getlist('attachments')
-    media_urls = []
-    for file in multiple_files:
-        filename = file.name
-        object_name = f"{hash_with_current_time(filename)}_attach.jpg"
-        file_path = f"/dynamic/{object_name}"
-
-        with open(file_path, 'wb') as f:
-            for chunk in file.chunks():
-                f.write(chunk)
-        
-        if minio_client.put_object(bucket_name, object_name, file_path):
-            media_urls.append(f"/api/attachments/{object_name}")
-        
-    return media_urls
-    
-# bulk function
-def get_attachment(request, object_names: list):
-    minio_client = MinioClient().get_client()
-    bucket_name = "attachment-pictures"
-    attachments = []
-
-    with tempfile.TemporaryDirectory() as temp_dir:
-        for object_name in object_names:
-            temp_file_path = os.path.join(temp_dir, object_name)
-
-            try:
-                retived_object = minio_client.get_object(bucket_name, object_name, temp_file_path)
-                if retived_object:
-                    attachments.append({
-                        'name': object_name,
-                        'path': temp_file_path
-                    })
-
-            except:
-                continue
+    return upload_attachments(request.FILES.getlist('attachments'))
     
-    return Response({
-        'retrived_files': len(attachments),
-        'total_requested': len(object_names)
-    }, status=status.HTTP_200_OK)
+def get_cursor_page(post_doc, query, cursor, page_size, ascending=False):
+    """
+    Fetch one keyset page and the opaque cursor of the page after it.
+    Reads page_size + 1 documents to know whether a next page exists.
+    """
+    after = decode_cursor(cursor) if cursor else None
+    docs = post_doc.get_page_after(query, after, page_size + 1, ascending)
+    next_cursor = encode_cursor(docs[page_size - 1]) if len(docs) > page_size else None
+    return docs[:page_size], next_cursor
 
 
 def get_all_posts(request):
     post_doc = PostDocument()
     
-    all_object_names = []
     try:
-        page = int(request.query_params.get('page', 1))
-        page_size = int(request.query_params.get('page_size', 10))
-        skip = (page - 1) * page_size
-        limit = page_size
-        all_posts = post_doc.get_all(skip, limit)
+        page_size = clamp_page_size(request.query_params.get('page_size'), 10)
+        cursor_mode = 'cursor' in request.query_params
+        if cursor_mode:
+            all_posts, next_cursor = get_cursor_page(
+                post_doc, post_doc.feed_filter(), request.query_params.get('cursor'), page_size
+            )
+        else:
+            page = max(1, int(request.query_params.get('page', 1)))
+            skip = (page - 1) * page_size
+            all_posts = post_doc.get_all(skip, page_size)
+        usernames = user_directory.get_usernames(post.get('user_id') for post in all_posts)
+        liked = LikeDocument().liked_post_ids(request.user.id, [post['_id'] for post in all_posts])
   
         serialized_posts = []
         for post in all_posts:
 
-            if post.get('is_comment', False):
-                continue
-
-            medias = post.get('content', {}).get('medias', [])
-            if medias:
-                for media_url in medias:
-                    if media_url.startswith('/api/attachments/'):
-                        object_name = media_url.replace('/api/attachments/', '')
-                        all_object_names.append(object_name)
-
             serializer = PostSerializer(post)
             post_data = serializer.data
-            username = User.objects.filter(id=post_data['user_id']).values_list('username', flat=True).first()
-            post_data['username'] = username
-            post_data['is_liked'] = request.user.id in post_data.get('likes', [])
+            post_data['username'] = usernames.get(post_data['user_id'])
+            post_data['is_liked'] = post['_id'] in liked
+            post_data['attachments'] = resolve_attachments(post)
             serialized_posts.append(post_data)
-            
-        # Handle attachment retrieval
-        if all_object_names:
-            all_object_names = list(dict.fromkeys(all_object_names))
-            attachment_response = get_attachment(request, all_object_names)
 
-        total_posts = post_doc.collection.count_documents({'deleted': False})
+        if cursor_mode:
+            response_data = {
+                'count': post_doc.count_posts(),
+                'next': f"?cursor={next_cursor}&page_size={page_size}" if next_cursor else None,
+                'previous': None,
+                'next_cursor': next_cursor,
+                'results': serialized_posts
+            }
+            return Response(response_data, status=status.HTTP_200_OK)
+
+        total_posts = post_doc.count_posts()
         response_data = {
             'count': total_posts,
             'next': f"?page={page+1}&page_size={page_size}" if (skip + len(serialized_posts)) < total_posts else None,
@@ -177,7 +165,9 @@ def get_all_posts(request):
         }
         
         return Response(response_data, status=status.HTTP_200_OK)
-        
+
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         logger.error(f"Error fetching all posts: {e}")
         return Response(
@@ -185,44 +175,87 @@ def get_all_posts(request):
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def get_home_feed(request):
+    """
+    Posts by the user and the authors they follow, newest first, read from
+    the materialized home timeline with cursor pagination
+    """
+    try:
+        page_size = clamp_page_size(request.query_params.get('page_size'), 10)
+        cursor = request.query_params.get('cursor')
+        after = decode_cursor(cursor) if cursor else None
+        posts, next_after = home_timeline_page(request.user.id, after, page_size)
+        next_cursor = encode_cursor(next_after) if next_after else None
+        usernames = user_directory.get_usernames(post.get('user_id') for post in posts)
+        liked = LikeDocument().liked_post_ids(request.user.id, [post['_id'] for post in posts])
+
+        serialized_posts = []
+        for post in posts:
+            serializer = PostSerializer(post)
+            post_data = serializer.data
+            post_data['username'] = usernames.get(post_data['user_id'])
+            post_data['is_liked'] = post['_id'] in liked
+            post_data['attachments'] = resolve_attachments(post)
+            serialized_posts.append(post_data)
+
+        response_data = {
+            'next': f"?cursor={next_cursor}&page_size={page_size}" if next_cursor else None,
+            'previous': None,
+            'next_cursor': next_cursor,
+            'results': serialized_posts
+        }
+        return Response(response_data, status=status.HTTP_200_OK)
+
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+    except Exception as e:
+        logger.error(f"Error fetching home feed: {e}")
+        return Response(
+            {'error': 'Failed to fetch home feed'}, 
+            status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        )
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def get_posts_by_user(request):
     post_doc = PostDocument()
     
     try:
-        page = int(request.query_params.get('page', 1))
-        page_size = int(request.query_params.get('page_size', 7))
-        skip = (page - 1) * page_size
-        limit = page_size
-        user_posts = post_doc.get_posts_by_user(request.user.id, skip, limit)
+        page_size = clamp_page_size(request.query_params.get('page_size'), 7)
+        cursor_mode = 'cursor' in request.query_params
+        if cursor_mode:
+            user_posts, next_cursor = get_cursor_page(
+                post_doc, post_doc.feed_filter(request.user.id), request.query_params.get('cursor'), page_size
+            )
+        else:
+            page = max(1, int(request.query_params.get('page', 1)))
+            skip = (page - 1) * page_size
+            user_posts = post_doc.get_posts_by_user(request.user.id, skip, page_size)
         
-        all_object_names = []
+        liked = LikeDocument().liked_post_ids(request.user.id, [post['_id'] for post in user_posts])
         serialized_posts = []
         for post in user_posts:
             
-            if post.get('is_comment', False):
-                continue
-            
-            medias = post.get('content', {}).get('medias', [])
-            if medias:
-                for media_url in medias:
-                    if media_url.startswith('/api/attachments/'):
-                        object_name = media_url.replace('/api/attachments/', '')
-                        all_object_names.append(object_name)
-
             serializer = PostSerializer(post)
             post_data = serializer.data
             post_data['username'] = request.user.username
-            post_data['is_liked'] = request.user.id in post_data.get('likes', [])
+            post_data['is_liked'] = post['_id'] in liked
+            post_data['attachments'] = resolve_attachments(post)
             serialized_posts.append(post_data)
-            
-        # Handle attachment retrieval
-        if all_object_names:
-            all_object_names = list(dict.fromkeys(all_object_names))
-            attachment_response = get_attachment(request, all_object_names)
 
-        total_posts = post_doc.collection.count_documents({'user_id': request.user.id, 'deleted': False})
+        if cursor_mode:
+            response_data = {
+                'count': post_doc.count_posts(request.user.id),
+                'next': f"?cursor={next_cursor}&page_size={page_size}" if next_cursor else None,
+                'previous': None,
+                'next_cursor': next_cursor,
+                'results': serialized_posts
+            }
+            return Response(response_data, status=status.HTTP_200_OK)
+
+        total_posts = post_doc.count_posts(request.user.id)
         response_data = {
             'count': total_posts,
             'next': f"?page={page+1}&page_size={page_size}" if (skip + len(serialized_posts)) < total_posts else None,
@@ -231,7 +264,9 @@ def get_posts_by_user(request):
         }
         
         return Response(response_data, status=status.HTTP_200_OK)
-        
+
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         logger.error(f"Error fetching user posts: {e}")
         return Response(
@@ -279,14 +314,13 @@ def add_comment(request, post_id):
             'comments': comments_data,
             'likes': likes_data,
             'is_comment': True,
-            'user_id': request.user.id
+            'user_id': request.user.id,
+            'username': request.user.username
         }
         
-        created_post = post_doc.create(post_data)
-        post_data_id = created_post.get('_id')
-        result = post_doc.add_comment(post_id, post_data_id)
+        created_post = post_doc.add_comment(post_id, post_data)
 
-        if result:
+        if created_post:
             response_serializer = PostSerializer(created_post)
             return Response(
                 response_serializer.data, 
@@ -295,7 +329,7 @@ def add_comment(request, post_id):
         
         else:
         
-            return Response( {'error': 'Failed to link comment to the post'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR )
+            return Response({'error': 'Post not found'}, status=status.HTTP_404_NOT_FOUND)
             
     except Exception as e:
         return Response(
@@ -323,9 +357,9 @@ def post_detail(request, post_id):
         try:
             serializer = PostSerializer(post)
             post_detail = serializer.data
-            username = User.objects.filter(id=post_detail['user_id']).values_list('username', flat=True).first()
-            post_detail['username'] = username
-            post_detail['is_liked'] = request.user.id in post_detail.get('likes', [])
+            post_detail['username'] = user_directory.get_username(post_detail['user_id'])
+            post_detail['is_liked'] = post['_id'] in LikeDocument().liked_post_ids(request.user.id, [post['_id']])
+            post_detail['attachments'] = resolve_attachments(post)
         
 
             return Response(post_detail)
@@ -355,85 +389,57 @@ def post_detail(request, post_id):
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
-@api_view(['POST'])
-@permission_classes([IsAuthenticated])
-def post_like(request, post_id):
+def toggle_like(request, post_id, liked):
     """
-    Add a like to a post
+    Like or unlike with a single write to the likes collection. like_count
+    is updated asynchronously by the like pipeline, so the response carries
+    the new state for the client to apply optimistically.
     """
-    post_doc = PostDocument()
-    
-    post = post_doc.get_by_id(post_id)
-    if not post:
+    if not ObjectId.is_valid(post_id):
         return Response(
             {'error': 'Post not found'}, 
             status=status.HTTP_404_NOT_FOUND
         )
-    
+
     user_id = request.user.id
     if not user_id:
         return Response(
             {'error': 'user_id is required'}, 
             status=status.HTTP_400_BAD_REQUEST
         )
-    
+
+    action = 'like' if liked else 'unlike'
     try:
-        if post_doc.add_like(post_id, user_id):
-            updated_post = post_doc.get_by_id(post_id)
-            response_serializer = PostSerializer(updated_post)
-            return Response(response_serializer.data)
-        else:
-            return Response(
-                {'error': 'Failed to like post'}, 
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
+        changed = set_like(post_id, user_id, liked)
+        return Response({
+            '_id': post_id,
+            'is_liked': liked,
+            'changed': changed,
+            'like_count_delta': (1 if liked else -1) if changed else 0
+        })
     
     except Exception as e:
-        logger.error(f"Error liking post {post_id}: {e}")
+        logger.error(f"Error {action}ing post {post_id}: {e}")
         return Response(
-            {'error': 'Failed to like post'}, 
+            {'error': f'Failed to {action} post'}, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def post_like(request, post_id):
+    """
+    Add a like to a post
+    """
+    return toggle_like(request, post_id, liked=True)
+
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
 def post_unlike(request, post_id):
     """
     Remove a like from a post
     """
-    post_doc = PostDocument()
-    
-    post = post_doc.get_by_id(post_id)
-    if not post:
-        return Response(
-            {'error': 'Post not found'}, 
-            status=status.HTTP_404_NOT_FOUND
-        )
-    
-    user_id = request.user.id
-    if not user_id:
-        return Response(
-            {'error': 'user_id is required'}, 
-            status=status.HTTP_400_BAD_REQUEST
-        )
-    
-    try:
-        if post_doc.remove_like(post_id, user_id):
-            updated_post = post_doc.get_by_id(post_id)
-            response_serializer = PostSerializer(updated_post)
-            return Response(response_serializer.data)
-        else:
-            return Response(
-                {'error': 'Failed to unlike post'}, 
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
-    
-    except Exception as e:
-        logger.error(f"Error unliking post {post_id}: {e}")
-        return Response(
-            {'error': 'Failed to unlike post'}, 
-            status=status.HTTP_500_INTERNAL_SERVER_ERROR
-        )
+    return toggle_like(request, post_id, liked=False)
     
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
@@ -441,46 +447,49 @@ def get_comment_post(request, post_id):
     post_doc = PostDocument()
 
     try:    
-        query_post = post_doc.get_by_id(post_id)
+        query_post = post_doc.get_by_id(post_id, {'comment_count': 1, 'comments': 1})
         if not query_post:
             return Response({'error': 'Post not found'},
                             status=status.HTTP_404_NOT_FOUND
                             )
     
-        page = int(request.query_params.get('page', 1))
-        page_size = 5
-        skip = (page - 1) * page_size
-        limit = page_size
+        page_size = clamp_page_size(request.query_params.get('page_size'), 5)
+        cursor_mode = 'cursor' in request.query_params
+        total_comments = query_post.get('comment_count', len(query_post.get('comments', [])))
 
-        comment_ids = query_post.get('comments', [])
-        
-        if not comment_ids:
-            response_data = {
-                'count': 0,
-                'next': None,
-                'previous': None,
-                'results': []
-            }
-            return Response(response_data, status=status.HTTP_200_OK)
-        
-        object_ids = [ObjectId(cid) for cid in comment_ids]
-        total_comments = len(comment_ids)
-        paginated_comment_ids = object_ids[skip:skip + limit]
-        comments_cursor = post_doc.collection.find({
-            '_id': {'$in': paginated_comment_ids}
-        })
-        comments_dict = {str(comment['_id']): comment for comment in comments_cursor}
-        paginated_comments = [comments_dict[str(cid)] for cid in paginated_comment_ids if str(cid) in comments_dict]
+        if cursor_mode:
+            paginated_comments, next_cursor = get_cursor_page(
+                post_doc, post_doc.comment_filter(post_id), request.query_params.get('cursor'), page_size,
+                ascending=True
+            )
+        else:
+            page = max(1, int(request.query_params.get('page', 1)))
+            skip = (page - 1) * page_size
+            paginated_comments = post_doc.get_comments(post_id, skip, page_size)
+        usernames = user_directory.get_usernames(comment.get('user_id') for comment in paginated_comments)
+        liked = LikeDocument().liked_post_ids(
+            request.user.id, [comment['_id'] for comment in paginated_comments]
+        )
 
         serialized_comments = []
         for comment in paginated_comments:
             
             serializer = PostSerializer(comment)
             comment_data = serializer.data
-            username = User.objects.filter(id=comment_data['user_id']).values_list('username', flat=True).first()
-            comment_data['username'] = username
-            comment_data['is_liked'] = request.user.id in comment_data.get('likes', [])
+            comment_data['username'] = usernames.get(comment_data['user_id'])
+            comment_data['is_liked'] = comment['_id'] in liked
+            comment_data['attachments'] = resolve_attachments(comment)
             serialized_comments.append(comment_data)
+
+        if cursor_mode:
+            response_data = {
+                'count': total_comments,
+                'next': f"?cursor={next_cursor}&page_size={page_size}" if next_cursor else None,
+                'previous': None,
+                'next_cursor': next_cursor,
+                'results': serialized_comments
+            }
+            return Response(response_data, status=status.HTTP_200_OK)
             
         response_data = {
             'count': total_comments,
@@ -490,7 +499,9 @@ def get_comment_post(request, post_id):
         }
         
         return Response(response_data, status=status.HTTP_200_OK)
-        
+
+    except ValueError as e:
+        return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
     except Exception as e:
         logger.error(f"Error fetching comments: {e}")
         return Response(
@@ -503,19 +514,24 @@ def get_comment_post(request, post_id):
 @permission_classes([])
 def serve_attachment(request, object_name):
     """
-    Serve an attachment from MinIO storage
+    Serve an attachment from object storage
     """
     try:
-        minio_client = MinioClient().get_client()
-        bucket_name = "attachment-pictures"
-        temp_file_path = f"/tmp/{object_name}"
-        response = minio_client.get_object(bucket_name, object_name, temp_file_path)
+        candidates = variant_candidates(
+            object_name, request.query_params.get('size'), request.META.get('HTTP_ACCEPT'), ATTACHMENT_VARIANTS
+        )
+        for position, candidate in enumerate(candidates):
+            # A fallback (jpg for webp, or the original while variants render)
+            # stands in for what the URL names, so it must be revalidated
+            response = serve_object(
+                request, ATTACHMENT_BUCKET, candidate, immutable=position == 0, default_content_type='image/jpeg'
+            )
+            if response:
+                break
         
         if response:
-            return FileResponse(
-                open(temp_file_path, 'rb'),
-                content_type='image/jpeg'
-            )
+            response['Vary'] = 'Accept'
+            return response
         else:
             return Response(
                 {'error': 'File not found'}, 
@@ -528,3 +544,15 @@ def serve_attachment(request, object_name):
             {'error': 'Failed to serve attachment'}, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def media_cache_stats(request):
+    """
+    Hit/miss/eviction counters under `worker` cover only the worker that
+    answered; `host` is the size of the cache directory all workers share
+    """
+    if media_cache is None:
+        return Response({'enabled': False}, status=status.HTTP_200_OK)
+    return Response(dict(media_cache.snapshot(), enabled=True), status=status.HTTP_200_OK)
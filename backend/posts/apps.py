@@ -1,6 +1,30 @@
+import logging
 from django.apps import AppConfig
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
 
 
 class PostsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'posts'
+
+    def ready(self):
+        if getattr(settings, 'MONGO_ENSURE_INDEXES_ON_STARTUP', False):
+            from posts.base import BaseDocument
+
+            for document_class in BaseDocument.document_classes():
+                try:
+                    document_class().ensure_indexes()
+                except Exception as e:
+                    logger.warning(f"Could not ensure indexes for {document_class.collection_name}: {e}")
+
+        if getattr(settings, 'STORAGE_SETTINGS', {}).get('ensure_buckets_on_startup'):
+            from accounts.avatars import AVATAR_BUCKET
+            from posts.attachments import ATTACHMENT_BUCKET
+            from storage import get_storage
+
+            try:
+                get_storage().ensure_buckets([ATTACHMENT_BUCKET, AVATAR_BUCKET])
+            except Exception as e:
+                logger.warning(f"Could not ensure storage buckets: {e}")
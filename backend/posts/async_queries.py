@@ -0,0 +1,83 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+from bson import ObjectId
+from pymongo import ASCENDING, ReturnDocument
+from connection_manager import connection_manager
+from posts.models import CounterDocument, LikeDocument, PostDocument
+
+
+def _collection(document_class):
+    return connection_manager.mongo_async_db()[document_class.collection_name]
+
+
+def _to_dict(doc: Dict) -> Dict:
+    if doc and '_id' in doc:
+        doc['_id'] = str(doc['_id'])
+    return doc
+
+
+async def get_post(post_id: str, projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
+    try:
+        object_id = ObjectId(post_id)
+    except Exception:
+        return None
+    doc = await _collection(PostDocument).find_one({'_id': object_id}, projection)
+    return _to_dict(doc) if doc else None
+
+
+async def get_posts(query: Dict[str, Any], skip: int = 0, limit: int = 10) -> List[Dict[str, Any]]:
+    docs = await _collection(PostDocument).find(query).skip(skip).limit(limit).to_list(limit)
+    return [_to_dict(doc) for doc in docs]
+
+
+async def get_page_after(query: Dict[str, Any], after: Optional[tuple] = None,
+                         limit: int = 10, ascending: bool = False) -> List[Dict[str, Any]]:
+    query, sort = PostDocument.keyset_query(query, after, ascending)
+    docs = await _collection(PostDocument).find(query).sort(sort).limit(limit).to_list(limit)
+    return [_to_dict(doc) for doc in docs]
+
+
+async def get_comments(parent_id: str, skip: int = 0, limit: int = 5) -> List[Dict[str, Any]]:
+    cursor = _collection(PostDocument).find(PostDocument.comment_filter(parent_id)).sort(
+        [('created_at', ASCENDING), ('_id', ASCENDING)]
+    ).skip(skip).limit(limit)
+    return [_to_dict(doc) for doc in await cursor.to_list(limit)]
+
+
+async def count_posts(user_id: Optional[int] = None) -> int:
+    """PostDocument.count_posts: read the counter, seeding it if it is missing"""
+    counters = _collection(CounterDocument)
+    key = CounterDocument.posts_key(user_id)
+    doc = await counters.find_one({'_id': key}, {'value': 1})
+    if doc:
+        return doc['value']
+    total = await _collection(PostDocument).count_documents(PostDocument.feed_filter(user_id))
+    doc = await counters.find_one_and_update(
+        {'_id': key},
+        {'$max': {'value': total}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER
+    )
+    return doc['value']
+
+
+async def liked_post_ids(user_id: Optional[int], post_ids: List[str]) -> set:
+    if user_id is None or not post_ids:
+        return set()
+    cursor = _collection(LikeDocument).find(
+        dict(LikeDocument.LIKED_FILTER, user_id=user_id, post_id={'$in': [ObjectId(pid) for pid in post_ids]}),
+        {'post_id': 1, '_id': 0}
+    )
+    return {str(doc['post_id']) async for doc in cursor}
+
+
+async def search_posts(query: str, skip: int = 0, limit: int = 20) -> tuple:
+    """PostDocument.search_posts and its total, run concurrently"""
+    collection = _collection(PostDocument)
+    cursor = collection.find(
+        PostDocument.text_search_filter(query), PostDocument.TEXT_SEARCH_PROJECTION
+    ).sort(PostDocument.TEXT_SEARCH_SORT).skip(skip).limit(limit)
+    docs, total = await asyncio.gather(
+        cursor.to_list(limit), collection.count_documents(PostDocument.text_search_filter(query))
+    )
+    return docs, total
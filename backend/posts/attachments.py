@@ -0,0 +1,65 @@
+from typing import Dict, List
+from datetime import timedelta
+from django.conf import settings
+from storage import get_storage
+from posts.variants import variant_name
+
+ATTACHMENT_BUCKET = "attachment-pictures"
+ATTACHMENT_URL_PREFIX = '/api/attachments/'
+
+ATTACHMENT_SETTINGS = getattr(settings, 'ATTACHMENT_SETTINGS', {})
+
+
+def attachment_url(object_name: str) -> str:
+    """
+    Public URL for an attachment. In `presigned` mode the URL points at
+    MinIO directly; signing happens locally and costs no network call.
+    """
+    if ATTACHMENT_SETTINGS.get('url_mode') == 'presigned':
+        url = get_storage().presigned_url(
+            ATTACHMENT_BUCKET,
+            object_name,
+            timedelta(seconds=ATTACHMENT_SETTINGS.get('presigned_ttl', 3600))
+        )
+        if url:
+            return url
+    return f"{ATTACHMENT_SETTINGS.get('base_url', '')}{ATTACHMENT_URL_PREFIX}{object_name}"
+
+
+def thumbnail_url(object_name: str, meta: Dict) -> str:
+    """
+    URL of the feed-size variant. Proxied URLs let serve_attachment pick
+    WebP from the Accept header; presigned ones point at the JPEG variant.
+    """
+    if 'feed' not in meta.get('variants', []):
+        return attachment_url(object_name)
+    if ATTACHMENT_SETTINGS.get('url_mode') == 'presigned':
+        return attachment_url(variant_name(object_name, 'feed', 'jpg'))
+    return f"{attachment_url(object_name)}?size=feed"
+
+
+def resolve_attachments(post: Dict) -> List[Dict]:
+    """
+    URL and stored metadata for each attachment of a post, built only from
+    the post document. Legacy posts without stored metadata get the URL
+    alone.
+    """
+    content = post.get('content') or {}
+    stored = {meta['object_name']: meta for meta in content.get('attachments', [])}
+
+    resolved = []
+    for media_url in content.get('medias', []):
+        if not media_url.startswith(ATTACHMENT_URL_PREFIX):
+            resolved.append({'url': media_url})
+            continue
+        object_name = media_url[len(ATTACHMENT_URL_PREFIX):]
+        meta = stored.get(object_name, {})
+        resolved.append({
+            'url': attachment_url(object_name),
+            'thumbnail_url': thumbnail_url(object_name, meta),
+            'size': meta.get('size'),
+            'content_type': meta.get('content_type'),
+            'width': meta.get('width'),
+            'height': meta.get('height'),
+        })
+    return resolved
@@ -1,17 +1,75 @@
-from typing import Dict, List
+from typing import Dict, List, Optional
 from bson import ObjectId
+from pymongo import IndexModel
 from mongo_api import get_mongo_client
 
 class BaseDocument:
-    def __init__(self, collection_name: str):
-        self.collection = get_mongo_client().db[collection_name]
-    
+    collection_name: Optional[str] = None
+    # Declared indexes for the collection, applied by `manage.py ensure_mongo_indexes`
+    indexes: List[IndexModel] = []
+
+    def __init__(self, collection_name: Optional[str] = None):
+        self.collection = get_mongo_client().db[collection_name or self.collection_name]
+
     def to_dict(self, doc: Dict) -> Dict:
         """Convert MongoDB document to dictionary with string IDs"""
         if doc and '_id' in doc:
             doc['_id'] = str(doc['_id'])
         return doc
-    
+
     def to_dict_list(self, docs: List) -> List:
         """Convert list of MongoDB documents to list of dictionaries"""
-        return [self.to_dict(doc) for doc in docs]
\ No newline at end of file
+        return [self.to_dict(doc) for doc in docs]
+
+    @classmethod
+    def document_classes(cls) -> List[type]:
+        """All BaseDocument subclasses bound to a collection"""
+        found = []
+        for subclass in cls.__subclasses__():
+            if subclass.collection_name:
+                found.append(subclass)
+            found.extend(subclass.document_classes())
+        return found
+
+    @staticmethod
+    def _normalize_key(key) -> tuple:
+        pairs = [
+            (field, int(direction) if isinstance(direction, (int, float)) else direction)
+            for field, direction in (key.items() if hasattr(key, 'items') else key)
+        ]
+        text_positions = [i for i, (field, direction) in enumerate(pairs) if direction == 'text' or field == '_ftsx']
+        if text_positions:
+            # The server reports a text index as _fts/_ftsx whatever fields it covers
+            rest = [pair for i, pair in enumerate(pairs) if i not in text_positions]
+            rest[text_positions[0]:text_positions[0]] = [('_fts', 'text'), ('_ftsx', 1)]
+            pairs = rest
+        return tuple(pairs)
+
+    def index_diff(self) -> Dict[str, List]:
+        """
+        Compare declared indexes with the ones on the server.
+        `missing` are declared but absent, `redundant` exist on the server
+        without being declared (e.g. superseded by a wider compound index).
+        """
+        existing = {
+            name: self._normalize_key(info['key'])
+            for name, info in self.collection.index_information().items()
+            if name != '_id_'
+        }
+        declared = [index.document for index in self.indexes]
+        declared_keys = {self._normalize_key(index['key']) for index in declared}
+
+        missing = [index for index in declared if self._normalize_key(index['key']) not in existing.values()]
+        redundant = [name for name, key in existing.items() if key not in declared_keys]
+
+        return {'missing': missing, 'redundant': redundant}
+
+    def ensure_indexes(self, drop_redundant: bool = False) -> Dict[str, List]:
+        diff = self.index_diff()
+        if diff['missing']:
+            names = {index['name'] for index in diff['missing']}
+            self.collection.create_indexes([index for index in self.indexes if index.document['name'] in names])
+        if drop_redundant:
+            for name in diff['redundant']:
+                self.collection.drop_index(name)
+        return diff
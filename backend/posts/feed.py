@@ -0,0 +1,200 @@
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+from bson import ObjectId
+from django.conf import settings
+from django.db import close_old_connections
+from accounts.directory import LRUTTLCache
+from accounts.models import Follow
+from posts.models import CounterDocument, PostDocument, TimelineDocument
+
+logger = logging.getLogger(__name__)
+
+FEED_SETTINGS = getattr(settings, 'FEED_SETTINGS', {})
+FANOUT_BATCH_SIZE = FEED_SETTINGS.get('fanout_batch_size', 1000)
+# Authors with more followers than this are not fanned out on write; their
+# posts are merged into home pages at read time instead
+FANOUT_MAX_FOLLOWERS = FEED_SETTINGS.get('fanout_max_followers', 10000)
+FOLLOW_BACKFILL = FEED_SETTINGS.get('follow_backfill', 50)
+
+# An author crossing the limit is pulled by other workers once this expires
+_high_fanout_cache = LRUTTLCache(max_entries=1, ttl=FEED_SETTINGS.get('high_fanout_ttl', 30))
+
+
+def follower_count(user_id: int) -> int:
+    counters = CounterDocument()
+    return counters.get(counters.followers_key(user_id)) or 0
+
+
+def fan_out_post(post: Dict) -> int:
+    """
+    Write a top-level post into the home timelines of its author and the
+    author's followers, FANOUT_BATCH_SIZE entries per insert, in follower id
+    order. Progress is saved on the post after each batch, so a fan-out
+    that was cut short continues from `post['fanout']['cursor']`;
+    re-inserting an entry is a no-op.
+    """
+    author_id = post['user_id']
+    post_doc = PostDocument()
+    timelines = TimelineDocument()
+    cursor = (post.get('fanout') or {}).get('cursor')
+    inserted = timelines.add_entries([author_id], [post]) if cursor is None else 0
+
+    if follower_count(author_id) <= FANOUT_MAX_FOLLOWERS:
+        while True:
+            followers = Follow.objects.filter(following_id=author_id)
+            if cursor is not None:
+                followers = followers.filter(follower_id__gt=cursor)
+            batch = list(followers.order_by('follower_id').values_list('follower_id', flat=True)[:FANOUT_BATCH_SIZE])
+            if not batch:
+                break
+            inserted += timelines.add_entries(batch, [post])
+            cursor = batch[-1]
+            post_doc.save_fanout_cursor(post['_id'], cursor)
+    post_doc.finish_fanout(post['_id'])
+    return inserted
+
+
+class FanOutQueue:
+    """
+    Runs fan-outs off the request path on a per-worker thread pool. A
+    fan-out renews its claim on the post after every batch; the sweeper
+    resumes posts whose claim is older than `stale_claim` seconds, left by
+    a worker that died or a fan-out that failed.
+    """
+
+    def __init__(self, workers: int = 2, sweep_interval: float = 30.0, stale_claim: float = 120.0):
+        self.workers = workers
+        self.sweep_interval = sweep_interval
+        self.stale_claim = stale_claim
+        self._pool = None
+        self._sweeper = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def _get_pool(self) -> ThreadPoolExecutor:
+        # Threads do not survive fork, so each worker builds its own
+        with self._lock:
+            if self._pool is None or self._pid != os.getpid():
+                self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='fan-out')
+                self._sweeper = None
+                self._pid = os.getpid()
+            return self._pool
+
+    def submit(self, post: Dict):
+        self._get_pool().submit(self._run, post)
+
+    def _run(self, post: Dict):
+        # Outside a request nothing else retires this thread's Postgres connection
+        close_old_connections()
+        try:
+            inserted = fan_out_post(post)
+            logger.info(f"Fanned out post {post['_id']} to {inserted} timelines")
+        except Exception as e:
+            logger.error(f"Error fanning out post {post['_id']}, the sweeper will resume it: {e}")
+        finally:
+            close_old_connections()
+
+    def start(self):
+        """Start this worker's sweeper for interrupted fan-outs"""
+        self._get_pool()
+        with self._lock:
+            if self._sweeper is not None and self._sweeper.is_alive():
+                return
+            self._sweeper = threading.Thread(target=self._sweep_forever, name='fan-out-sweeper', daemon=True)
+            self._sweeper.start()
+
+    def sweep(self) -> int:
+        """Resume every stale fan-out on this thread; returns how many were resumed"""
+        post_doc = PostDocument()
+        resumed = 0
+        while True:
+            post = post_doc.claim_stale_fanout(datetime.utcnow() - timedelta(seconds=self.stale_claim))
+            if post is None:
+                return resumed
+            self._run(post)
+            resumed += 1
+
+    def _sweep_forever(self):
+        while True:
+            time.sleep(self.sweep_interval)
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error(f"Error resuming fan-outs: {e}")
+
+
+fan_out_queue = FanOutQueue(
+    workers=FEED_SETTINGS.get('fanout_workers', 2),
+    sweep_interval=FEED_SETTINGS.get('fanout_sweep_interval', 30),
+    stale_claim=FEED_SETTINGS.get('fanout_stale_claim', 120),
+)
+
+
+def high_fanout_authors() -> List[int]:
+    """All authors above the fan-out limit; a short list, cached per worker"""
+    authors = _high_fanout_cache.get_many(['authors']).get('authors')
+    if authors is None:
+        authors = CounterDocument().high_fanout_authors()
+        _high_fanout_cache.set_many({'authors': authors})
+    return authors
+
+
+def high_fanout_followees(user_id: int) -> List[int]:
+    """
+    Followed authors whose posts are pulled at read time: the high-fanout
+    set intersected with the user's follows, so the cost does not grow with
+    how many accounts the user follows.
+    """
+    authors = high_fanout_authors()
+    if not authors:
+        return []
+    return list(
+        Follow.objects.filter(follower_id=user_id, following_id__in=authors).values_list('following_id', flat=True)
+    )
+
+
+def home_timeline_page(user_id: int, after: Optional[Tuple] = None,
+                       limit: int = 10) -> Tuple[List[Dict], Optional[Dict]]:
+    """
+    One page of the user's home feed, newest first. Returns the posts and
+    the (created_at, _id) of the last one when another page exists.
+    """
+    post_doc = PostDocument()
+    entries = TimelineDocument().get_page(user_id, after, limit + 1)
+    candidates = {str(entry['post_id']): entry['created_at'] for entry in entries}
+
+    pull_authors = high_fanout_followees(user_id)
+    if pull_authors:
+        query = post_doc.feed_filter()
+        query['user_id'] = {'$in': pull_authors}
+        for post in post_doc.get_page_after(query, after, limit + 1):
+            candidates[post['_id']] = post['created_at']
+
+    ordered = sorted(candidates.items(), key=lambda item: (item[1], item[0]), reverse=True)[:limit + 1]
+    page_ids = [post_id for post_id, _ in ordered[:limit]]
+    next_after = None
+    if len(ordered) > limit:
+        last_id, last_created_at = ordered[limit - 1]
+        next_after = {'_id': last_id, 'created_at': last_created_at}
+
+    docs = post_doc.collection.find({'_id': {'$in': [ObjectId(pid) for pid in page_ids]}, 'deleted': False})
+    posts_by_id = {str(doc['_id']): post_doc.to_dict(doc) for doc in docs}
+    return [posts_by_id[pid] for pid in page_ids if pid in posts_by_id], next_after
+
+
+def on_follow(follower_id: int, following_id: int):
+    CounterDocument().increment_followers(following_id, 1, FANOUT_MAX_FOLLOWERS)
+    if follower_count(following_id) > FANOUT_MAX_FOLLOWERS:
+        return
+    recent = PostDocument().get_page_after(PostDocument.feed_filter(following_id), None, FOLLOW_BACKFILL)
+    TimelineDocument().add_entries([follower_id], recent)
+
+
+def on_unfollow(follower_id: int, following_id: int):
+    CounterDocument().increment_followers(following_id, -1, FANOUT_MAX_FOLLOWERS)
+    TimelineDocument().remove_author(follower_id, following_id)
@@ -0,0 +1,147 @@
+import atexit
+import logging
+import os
+import threading
+import time
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List
+from bson import ObjectId
+from django.conf import settings
+from pymongo import UpdateOne
+from posts.models import LikeDocument, PostDocument
+
+logger = logging.getLogger(__name__)
+
+LIKE_PIPELINE_SETTINGS = getattr(settings, 'LIKE_PIPELINE_SETTINGS', {})
+
+
+class LikeCountBuffer:
+    """
+    Applies like_count changes from the pending rows of the likes
+    collection, coalesced per post into one bulk_write, so a hot post takes
+    one $inc per sweep instead of one per like. The rows are the durable
+    record: a worker killed before sweeping loses nothing, the next sweep
+    by any worker picks its likes up.
+
+    Each worker sweeps every `flush_interval` seconds after recording a
+    toggle, and every `max_lag` seconds otherwise, which also bounds how
+    long a dead worker's likes wait. Sweeps claim rows, so concurrent
+    workers never count a row twice; a claim older than `stale_claim`
+    seconds is taken over (a sweep killed between its $inc and settling
+    the rows counts them again).
+    """
+
+    def __init__(self, flush_interval: float = 1.0, max_lag: float = 5.0, max_pending: int = 1000,
+                 stale_claim: float = 60.0):
+        self.flush_interval = flush_interval
+        self.max_lag = max_lag
+        self.max_pending = max_pending
+        self.stale_claim = stale_claim
+        self._dirty = threading.Event()
+        self._lock = threading.Lock()
+        self._flusher = None
+        self._pid = None
+
+    def record(self):
+        """Note a toggle made by this worker, so the next sweep comes soon"""
+        self._dirty.set()
+        self.start()
+
+    @staticmethod
+    def coalesce(rows: List[Dict]) -> Dict[ObjectId, int]:
+        """
+        like_count change per post for claimed rows. A row counted at
+        `counted_rev` was liked then exactly when an even number of toggles
+        separate it from its current state.
+        """
+        deltas: Dict[ObjectId, int] = defaultdict(int)
+        for row in rows:
+            liked = row.get('liked', True)
+            liked_then = liked == ((row['rev'] - row.get('counted_rev', 0)) % 2 == 0)
+            deltas[row['post_id']] += int(liked) - int(liked_then)
+        return {post_id: delta for post_id, delta in deltas.items() if delta}
+
+    def flush(self) -> int:
+        """Sweep pending likes until none are left; returns the number of rows counted"""
+        likes = LikeDocument()
+        counted = 0
+        while True:
+            try:
+                batch = self._flush_batch(likes)
+            except Exception as e:
+                logger.error(f"Error applying like counts, retrying next sweep: {e}")
+                return counted
+            counted += batch
+            if batch < self.max_pending:
+                return counted
+
+    def _flush_batch(self, likes: LikeDocument) -> int:
+        token = uuid.uuid4().hex
+        now = datetime.utcnow()
+        rows = likes.claim_pending(token, self.max_pending, now - timedelta(seconds=self.stale_claim))
+        deltas = self.coalesce(rows)
+        gone = []
+        if deltas:
+            posts = PostDocument().collection
+            result = posts.bulk_write([
+                UpdateOne(
+                    {'_id': post_id, 'deleted': False},
+                    {'$inc': {'like_count': delta}, '$set': {'updated_at': now}}
+                )
+                for post_id, delta in deltas.items()
+            ], ordered=False)
+            if result.matched_count < len(deltas):
+                # Likes were written without reading the post first; those on
+                # posts that are gone are dropped here
+                live = {doc['_id'] for doc in posts.find(
+                    {'_id': {'$in': list(deltas)}, 'deleted': False}, {'_id': 1}
+                )}
+                gone = [post_id for post_id in deltas if post_id not in live]
+                logger.info(f"Dropped the likes of {len(gone)} missing or deleted posts")
+        likes.settle(token, rows)
+        if gone:
+            likes.delete_for_posts(gone)
+        return len(rows)
+
+    def start(self):
+        # Threads do not survive fork, so a worker re-starts its own flusher
+        if self._flusher is not None and self._flusher.is_alive() and self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._flusher is not None and self._flusher.is_alive() and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._flusher = threading.Thread(target=self._run, name='like-count-flusher', daemon=True)
+            self._flusher.start()
+
+    def _run(self):
+        while True:
+            self._dirty.wait(self.max_lag)
+            time.sleep(self.flush_interval)
+            self._dirty.clear()
+            self.flush()
+
+
+like_buffer = LikeCountBuffer(
+    flush_interval=LIKE_PIPELINE_SETTINGS.get('flush_interval', 1.0),
+    max_lag=LIKE_PIPELINE_SETTINGS.get('max_lag', 5.0),
+    max_pending=LIKE_PIPELINE_SETTINGS.get('max_pending', 1000),
+    stale_claim=LIKE_PIPELINE_SETTINGS.get('stale_claim', 60.0),
+)
+atexit.register(like_buffer.flush)
+
+
+def set_like(post_id: str, user_id: int, liked: bool) -> bool:
+    """
+    Record a like toggle with a single write to the likes collection; the
+    like_count change follows from the sweep. Returns False when nothing
+    changed (already liked / not liked). The post is not read first: likes
+    on a missing post are dropped by the sweep.
+    """
+    likes = LikeDocument()
+    changed = likes.add(post_id, user_id) if liked else likes.remove(post_id, user_id)
+    if changed:
+        like_buffer.record()
+    return changed
@@ -0,0 +1,39 @@
+from datetime import datetime
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from posts.models import PostDocument
+
+
+class Command(BaseCommand):
+    help = (
+        "Store author usernames on posts that predate them and mark legacy posts as "
+        "changed, so the search sync sends their denormalized fields"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help=(
+                "Mark every post as changed, not only legacy ones, so the sync resends the "
+                "mutable fields of the whole collection (e.g. suggest inputs after a reindex)"
+            ),
+        )
+
+    def handle(self, *args, **options):
+        post_doc = PostDocument()
+        batch_size = options['batch_size']
+
+        user_ids = [user_id for user_id in post_doc.collection.distinct('user_id') if user_id is not None]
+        renamed = 0
+        for start in range(0, len(user_ids), batch_size):
+            rows = User.objects.filter(id__in=user_ids[start:start + batch_size]).values_list('id', 'username')
+            for user_id, username in rows:
+                renamed += post_doc.set_username(user_id, username)
+        self.stdout.write(f"Stored usernames on {renamed} posts")
+
+        query = {} if options['all'] else {'updated_at': {'$exists': False}}
+        touched = post_doc.collection.update_many(query, {'$set': {'updated_at': datetime.utcnow()}}).modified_count
+        kind = 'posts' if options['all'] else 'legacy posts'
+        self.stdout.write(f"Marked {touched} {kind} for the next search sync")
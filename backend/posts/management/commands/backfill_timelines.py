@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from accounts.models import Follow
+from posts.feed import FANOUT_BATCH_SIZE, FANOUT_MAX_FOLLOWERS, FOLLOW_BACKFILL, fan_out_queue, follower_count
+from posts.models import PostDocument, TimelineDocument
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy each author's recent posts into their own and their followers' home timelines, "
+        "for posts and follows made before fan-out on write, and resume interrupted fan-outs"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--posts-per-author',
+            type=int,
+            default=FOLLOW_BACKFILL,
+            help="Recent posts copied per author, as on a new follow",
+        )
+
+    def handle(self, *args, **options):
+        resumed = fan_out_queue.sweep()
+        self.stdout.write(f"Resumed {resumed} interrupted fan-outs")
+
+        post_doc = PostDocument()
+        timelines = TimelineDocument()
+        author_ids = sorted(
+            user_id for user_id in post_doc.collection.distinct('user_id', post_doc.feed_filter())
+            if user_id is not None
+        )
+
+        inserted = 0
+        for author_id in author_ids:
+            recent = post_doc.get_page_after(post_doc.feed_filter(author_id), None, options['posts_per_author'])
+            inserted += timelines.add_entries([author_id], recent)
+            # High-fanout authors are pulled at read time
+            if follower_count(author_id) > FANOUT_MAX_FOLLOWERS:
+                continue
+            follower_ids = (
+                Follow.objects.filter(following_id=author_id)
+                .values_list('follower_id', flat=True)
+                .iterator(chunk_size=FANOUT_BATCH_SIZE)
+            )
+            batch = []
+            for follower_id in follower_ids:
+                batch.append(follower_id)
+                if len(batch) * len(recent) >= FANOUT_BATCH_SIZE:
+                    inserted += timelines.add_entries(batch, recent)
+                    batch = []
+            if batch:
+                inserted += timelines.add_entries(batch, recent)
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Backfilled {inserted} timeline entries for {len(author_ids)} authors"
+        ))
@@ -0,0 +1,44 @@
+import os
+import statistics
+import time
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand
+from storage import get_storage
+from posts.attachments import ATTACHMENT_BUCKET
+from posts.uploads import release_attachments, upload_attachments
+
+
+class Command(BaseCommand):
+    help = "Report per-request attachment upload latency for 1-4 attachments"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--size-kb', type=int, default=512, help="Size of each attachment")
+        parser.add_argument('--rounds', type=int, default=10, help="Requests simulated per attachment count")
+
+    def handle(self, *args, **options):
+        storage = get_storage()
+
+        for count in range(1, 5):
+            timings = []
+            for _ in range(options['rounds']):
+                files = [
+                    # Fresh content per file, identical payloads would be deduplicated
+                    SimpleUploadedFile(f"bench_{i}.jpg", os.urandom(options['size_kb'] * 1024),
+                                       content_type='image/jpeg')
+                    for i in range(count)
+                ]
+                start = time.perf_counter()
+                attachments = upload_attachments(files)
+                timings.append((time.perf_counter() - start) * 1000)
+
+                release_attachments(attachments)
+                for attachment in attachments:
+                    storage.delete_object(ATTACHMENT_BUCKET, attachment['object_name'])
+
+            timings.sort()
+            self.stdout.write(
+                f"{count} attachment(s) x {options['size_kb']} KB: "
+                f"p50 {statistics.median(timings):.1f} ms, "
+                f"p95 {timings[round(0.95 * (len(timings) - 1))]:.1f} ms, "
+                f"max {timings[-1]:.1f} ms"
+            )
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from posts.base import BaseDocument
+
+
+class Command(BaseCommand):
+    help = "Create the MongoDB indexes declared on BaseDocument subclasses"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Only print missing and redundant indexes, change nothing",
+        )
+        parser.add_argument(
+            '--drop-redundant',
+            action='store_true',
+            help="Drop indexes that exist on the server but are not declared",
+        )
+
+    def handle(self, *args, **options):
+        for document_class in BaseDocument.document_classes():
+            document = document_class()
+            name = document_class.collection_name
+
+            if options['dry_run']:
+                diff = document.index_diff()
+            else:
+                diff = document.ensure_indexes(drop_redundant=options['drop_redundant'])
+
+            for index in diff['missing']:
+                action = "missing" if options['dry_run'] else "created"
+                self.stdout.write(f"{name}: {action} {index['name']} {dict(index['key'])}")
+            for index_name in diff['redundant']:
+                action = "dropped" if options['drop_redundant'] and not options['dry_run'] else "redundant"
+                self.stdout.write(f"{name}: {action} {index_name}")
+            if not diff['missing'] and not diff['redundant']:
+                self.stdout.write(f"{name}: up to date")
@@ -0,0 +1,42 @@
+from datetime import datetime, timedelta
+from django.core.management.base import BaseCommand
+from storage import get_storage
+from posts.attachments import ATTACHMENT_BUCKET
+from posts.models import AttachmentRefDocument
+from posts.variants import ATTACHMENT_VARIANTS, VARIANT_FORMATS, variant_name
+
+
+class Command(BaseCommand):
+    help = "Delete attachment objects (and their variants) no post has referenced for a grace period"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-seconds',
+            type=int,
+            default=3600,
+            help="How long an object must have been unreferenced before it is deleted",
+        )
+        parser.add_argument('--limit', type=int, default=1000, help="Maximum objects deleted in one run")
+
+    def handle(self, *args, **options):
+        refs = AttachmentRefDocument()
+        storage = get_storage()
+        cutoff = datetime.utcnow() - timedelta(seconds=options['grace_seconds'])
+
+        deleted = 0
+        while deleted < options['limit']:
+            object_name = refs.claim_orphan(cutoff)
+            if object_name is None:
+                break
+            names = [object_name] + [
+                variant_name(object_name, variant, ext)
+                for variant in ATTACHMENT_VARIANTS
+                for ext in VARIANT_FORMATS
+            ]
+            if all(storage.delete_object(ATTACHMENT_BUCKET, name) for name in names):
+                refs.forget(object_name)
+                deleted += 1
+            else:
+                self.stderr.write(f"Could not delete {object_name}, it will be retried on a later run")
+
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} unreferenced attachment(s)"))
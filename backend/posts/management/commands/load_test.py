@@ -0,0 +1,100 @@
+import asyncio
+import statistics
+import time
+from django.core.management.base import BaseCommand, CommandError
+
+SYNC_PATHS = [
+    '/api/posts/?page_size=10',
+    '/api/posts/{post_id}/',
+    '/api/posts/{post_id}/comments/',
+    '/api/search/?q={query}',
+]
+ASYNC_PATHS = [
+    '/api/async/posts/?page_size=10',
+    '/api/async/posts/{post_id}/',
+    '/api/async/posts/{post_id}/comments/',
+    '/api/async/search/?q={query}',
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive the feed, post detail, comments and search endpoints with N concurrent "
+        "clients and compare the WSGI views with their async counterparts"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sync-url', default='http://localhost:8000', help="Server running the WSGI app")
+        parser.add_argument('--async-url', default=None, help="Server running the ASGI app (defaults to --sync-url)")
+        parser.add_argument('--token', required=True, help="API token sent as `Authorization: Token ...`")
+        parser.add_argument('--post-id', required=True, help="Post used for the detail and comment requests")
+        parser.add_argument('--query', default='hello', help="Search query")
+        parser.add_argument('--concurrency', type=int, default=50, help="Concurrent clients")
+        parser.add_argument('--duration', type=float, default=20.0, help="Seconds per target")
+        parser.add_argument('--workers', type=int, default=1, help="Server worker processes, for per-worker figures")
+        parser.add_argument('--targets', default='sync,async', help="Comma-separated: sync, async")
+
+    def handle(self, *args, **options):
+        try:
+            import aiohttp  # noqa: F401
+        except ImportError:
+            raise CommandError("load_test needs aiohttp")
+
+        bases = {'sync': options['sync_url'], 'async': options['async_url'] or options['sync_url']}
+        paths = {'sync': SYNC_PATHS, 'async': ASYNC_PATHS}
+        for target in [name.strip() for name in options['targets'].split(',') if name.strip()]:
+            if target not in paths:
+                raise CommandError(f"Unknown target: {target}")
+            urls = [
+                bases[target].rstrip('/') + path.format(post_id=options['post_id'], query=options['query'])
+                for path in paths[target]
+            ]
+            latencies, errors, elapsed = asyncio.run(self.run(urls, options))
+            self.report(target, latencies, errors, elapsed, options['workers'])
+
+    async def run(self, urls, options):
+        import aiohttp
+
+        latencies, errors = [], 0
+        deadline = time.monotonic() + options['duration']
+        headers = {'Authorization': f"Token {options['token']}"}
+        connector = aiohttp.TCPConnector(limit=options['concurrency'])
+
+        async with aiohttp.ClientSession(headers=headers, connector=connector) as session:
+            async def client(offset):
+                nonlocal errors
+                i = offset
+                while time.monotonic() < deadline:
+                    start = time.perf_counter()
+                    try:
+                        async with session.get(urls[i % len(urls)]) as response:
+                            await response.read()
+                            if response.status >= 400:
+                                errors += 1
+                    except aiohttp.ClientError:
+                        errors += 1
+                    latencies.append(time.perf_counter() - start)
+                    i += 1
+
+            started = time.monotonic()
+            await asyncio.gather(*(client(n) for n in range(options['concurrency'])))
+            return latencies, errors, time.monotonic() - started
+
+    def report(self, target, latencies, errors, elapsed, workers):
+        if not latencies:
+            self.stdout.write(f"{target}: no requests completed")
+            return
+        latencies.sort()
+        throughput = len(latencies) / elapsed
+        # Little's law: requests in flight = throughput x mean latency
+        in_flight = throughput * statistics.mean(latencies)
+
+        def pct(p):
+            return latencies[round(p * (len(latencies) - 1))] * 1000
+
+        self.stdout.write(
+            f"{target}: {len(latencies)} requests, {errors} errors, "
+            f"{throughput:.1f} req/s ({throughput / workers:.1f} per worker), "
+            f"{in_flight / workers:.1f} concurrent requests per worker, "
+            f"p50 {pct(0.5):.1f} ms, p95 {pct(0.95):.1f} ms, p99 {pct(0.99):.1f} ms"
+        )
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from pymongo import UpdateMany, UpdateOne
+from posts.models import PostDocument
+
+
+class Command(BaseCommand):
+    help = "Link legacy comments to their parent via parent_id and replace `comments` arrays with comment_count"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        post_doc = PostDocument()
+        batch_size = options['batch_size']
+        operations = []
+        migrated = 0
+        # Replies are always created after their parent, so walking parents
+        # oldest first means a nested parent's own root is already known here
+        roots = {}
+
+        cursor = post_doc.collection.find(
+            {'comments': {'$exists': True}}, {'comments': 1, 'root_id': 1}
+        ).sort('created_at', 1).batch_size(batch_size)
+        for parent in cursor:
+            comment_ids = parent.get('comments') or []
+            root_id = roots.get(parent['_id']) or parent.get('root_id') or parent['_id']
+            for comment_id in comment_ids:
+                roots[comment_id] = root_id
+            if comment_ids:
+                operations.append(UpdateMany(
+                    {'_id': {'$in': comment_ids}, 'parent_id': {'$exists': False}},
+                    {'$set': {'parent_id': parent['_id'], 'root_id': root_id, 'is_comment': True}}
+                ))
+            live = post_doc.collection.count_documents({'_id': {'$in': comment_ids}, 'deleted': False}) if comment_ids else 0
+            operations.append(UpdateOne(
+                {'_id': parent['_id']},
+                {'$set': {'comment_count': live}, '$unset': {'comments': ''}}
+            ))
+            migrated += 1
+
+            if len(operations) >= batch_size:
+                post_doc.collection.bulk_write(operations, ordered=True)
+                operations = []
+
+        if operations:
+            post_doc.collection.bulk_write(operations, ordered=True)
+
+        self.stdout.write(f"Migrated comments of {migrated} posts")
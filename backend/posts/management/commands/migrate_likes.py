@@ -0,0 +1,54 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand
+from pymongo import UpdateOne
+from posts.models import LikeDocument, PostDocument
+
+
+class Command(BaseCommand):
+    help = "Move embedded `likes` arrays out of post documents into the likes collection"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=500)
+
+    def handle(self, *args, **options):
+        post_doc = PostDocument()
+        likes = LikeDocument()
+        batch_size = options['batch_size']
+        migrated = 0
+
+        cursor = post_doc.collection.find({'likes': {'$exists': True}}, {'likes': 1}).batch_size(batch_size)
+        like_ops, post_ids = [], []
+        for post in cursor:
+            for user_id in set(post.get('likes') or []):
+                like_ops.append(UpdateOne(
+                    {'post_id': post['_id'], 'user_id': user_id},
+                    {'$setOnInsert': {'created_at': datetime.utcnow()}},
+                    upsert=True
+                ))
+            post_ids.append(post['_id'])
+
+            if len(post_ids) >= batch_size:
+                migrated += self._flush(post_doc, likes, like_ops, post_ids)
+                like_ops, post_ids = [], []
+
+        if post_ids:
+            migrated += self._flush(post_doc, likes, like_ops, post_ids)
+
+        self.stdout.write(f"Migrated likes of {migrated} posts")
+
+    def _flush(self, post_doc, likes, like_ops, post_ids):
+        if like_ops:
+            likes.collection.bulk_write(like_ops, ordered=False)
+
+        counts = {
+            row['_id']: row['total']
+            for row in likes.collection.aggregate([
+                {'$match': dict(LikeDocument.LIKED_FILTER, post_id={'$in': post_ids})},
+                {'$group': {'_id': '$post_id', 'total': {'$sum': 1}}},
+            ])
+        }
+        post_doc.collection.bulk_write([
+            UpdateOne({'_id': post_id}, {'$set': {'like_count': counts.get(post_id, 0)}, '$unset': {'likes': ''}})
+            for post_id in post_ids
+        ], ordered=False)
+        return len(post_ids)
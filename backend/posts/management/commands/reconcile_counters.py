@@ -0,0 +1,79 @@
+from datetime import datetime
+from django.core.management.base import BaseCommand
+from django.db.models import Count
+from pymongo import UpdateOne
+from accounts.models import Follow
+from posts.feed import FANOUT_MAX_FOLLOWERS
+from posts.likes import like_buffer
+from posts.models import CounterDocument, LikeDocument, PostDocument
+
+
+class Command(BaseCommand):
+    help = "Recompute the maintained post and follower counters from their sources"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--likes',
+            action='store_true',
+            help="Also recompute each post's like_count from the likes collection",
+        )
+
+    def handle(self, *args, **options):
+        post_doc = PostDocument()
+        counters = CounterDocument()
+
+        values = post_doc.post_totals()
+        changed = counters.set_many({counters.posts_key(): values.pop(counters.posts_key())})
+        changed += counters.set_many(values, prefix=CounterDocument.USER_POSTS_PREFIX)
+
+        followers = {
+            counters.followers_key(row['following_id']): row['total']
+            for row in Follow.objects.values('following_id').annotate(total=Count('id'))
+        }
+        changed += counters.set_many(followers, prefix=CounterDocument.FOLLOWERS_PREFIX)
+        counters.flag_high_fanout(FANOUT_MAX_FOLLOWERS)
+
+        self.stdout.write(
+            f"Reconciled {len(values)} user counters, the global counter and "
+            f"{len(followers)} follower counters, {changed} changed"
+        )
+
+        if options['likes']:
+            self.stdout.write(f"Reconciled like_count, {self.reconcile_likes(post_doc)} posts changed")
+
+    def reconcile_likes(self, post_doc, batch_size=1000):
+        # Settle pending likes first so the recount and the sweep agree
+        like_buffer.flush()
+        now = datetime.utcnow()
+        like_counts = LikeDocument().collection.aggregate([
+            {'$match': LikeDocument.LIKED_FILTER},
+            {'$group': {'_id': '$post_id', 'total': {'$sum': 1}}},
+        ])
+        liked_ids = []
+        changed = 0
+        operations = []
+        for row in like_counts:
+            liked_ids.append(row['_id'])
+            operations.append(UpdateOne(
+                {'_id': row['_id'], 'like_count': {'$ne': row['total']}},
+                {'$set': {'like_count': row['total'], 'updated_at': now}}
+            ))
+            if len(operations) >= batch_size:
+                changed += post_doc.collection.bulk_write(operations, ordered=False).modified_count
+                operations = []
+        if operations:
+            changed += post_doc.collection.bulk_write(operations, ordered=False).modified_count
+
+        liked_ids = set(liked_ids)
+        stale_ids = [
+            doc['_id']
+            for doc in post_doc.collection.find({'like_count': {'$ne': 0}}, {'_id': 1})
+            if doc['_id'] not in liked_ids
+        ]
+        for start in range(0, len(stale_ids), batch_size):
+            result = post_doc.collection.update_many(
+                {'_id': {'$in': stale_ids[start:start + batch_size]}},
+                {'$set': {'like_count': 0, 'updated_at': now}}
+            )
+            changed += result.modified_count
+        return changed
@@ -0,0 +1,48 @@
+import os
+import re
+import subprocess
+import sys
+import time
+from django.core.management.base import BaseCommand
+
+_importtime_re = re.compile(r'^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)')
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure how long a fresh process takes to import Django and the URL "
+        "configuration (what a recycled worker pays) and list the slowest imports"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=15, help="How many top-level imports to list")
+        parser.add_argument('--runs', type=int, default=3, help="Fresh processes to time")
+
+    def handle(self, *args, **options):
+        script = "import django; django.setup(); import devthoughts.urls"
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get('DJANGO_SETTINGS_MODULE', 'devthoughts.settings'))
+
+        timings = []
+        for _ in range(options['runs']):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, '-c', script], env=env, check=True)
+            timings.append(time.perf_counter() - start)
+        self.stdout.write(f"Cold start: best {min(timings):.2f}s, worst {max(timings):.2f}s over {len(timings)} run(s)")
+
+        result = subprocess.run(
+            [sys.executable, '-X', 'importtime', '-c', script],
+            env=env, check=True, capture_output=True, text=True
+        )
+        # Only top-level packages, with their cumulative time (children included)
+        packages = {}
+        for line in result.stderr.splitlines():
+            match = _importtime_re.match(line)
+            if match and len(match.group(3)) <= 1:
+                name = match.group(4).split('.')[0]
+                packages[name] = packages.get(name, 0) + int(match.group(2))
+
+        for name, micros in sorted(packages.items(), key=lambda item: item[1], reverse=True)[:options['top']]:
+            self.stdout.write(f"{micros / 1000:8.1f} ms  {name}")
+        for heavy in ('elasticsearch', 'minio', 'PIL', 'motor', 'aiohttp'):
+            if heavy in packages:
+                self.stdout.write(self.style.WARNING(f"{heavy} is imported at startup"))
@@ -0,0 +1,44 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from bson import ObjectId
+from django.core.management.base import BaseCommand
+from posts.likes import like_buffer, set_like
+from posts.models import LikeDocument, PostDocument
+
+
+class Command(BaseCommand):
+    help = "Measure like/unlike throughput on a single hot post, direct $inc vs. the coalescing pipeline"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=2000, help="Distinct users liking the post")
+        parser.add_argument('--threads', type=int, default=32)
+
+    def handle(self, *args, **options):
+        post_doc = PostDocument()
+        users = range(10_000_000, 10_000_000 + options['users'])
+
+        for mode, like, unlike in (
+            ('direct', post_doc.add_like, post_doc.remove_like),
+            ('pipeline', lambda pid, uid: set_like(pid, uid, True), lambda pid, uid: set_like(pid, uid, False)),
+        ):
+            post = post_doc.create({'content': {'text': f'stress_likes {mode}'}, 'user_id': 0, 'is_comment': True})
+            post_id = post['_id']
+            try:
+                for label, action in (('like', like), ('unlike', unlike)):
+                    elapsed = self._run(action, post_id, users, options['threads'])
+                    self.stdout.write(
+                        f"{mode:>8} {label:>6}: {len(users)} ops in {elapsed:.2f}s "
+                        f"({len(users) / elapsed:,.0f} ops/s)"
+                    )
+                like_buffer.flush()
+                final = post_doc.get_by_id(post_id)['like_count']
+                self.stdout.write(f"{mode:>8} final like_count: {final} (expected 0)")
+            finally:
+                LikeDocument().collection.delete_many({'post_id': ObjectId(post_id)})
+                post_doc.collection.delete_one({'_id': ObjectId(post_id)})
+
+    def _run(self, action, post_id, users, threads):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            list(pool.map(lambda user_id: action(post_id, user_id), users))
+        return time.perf_counter() - start
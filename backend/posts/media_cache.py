@@ -0,0 +1,199 @@
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from typing import Dict, Optional
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+MEDIA_CACHE_SETTINGS = getattr(settings, 'MEDIA_CACHE_SETTINGS', {})
+
+
+class MediaDiskCache:
+    """
+    On-disk cache for MinIO objects shared by all worker processes on a
+    host, addressed by a hash of bucket and object name. Objects served as
+    immutable are trusted once cached; mutable ones are only used when the
+    entry's ETag matches the one storage reports. Each entry is a body file
+    plus a `.meta` JSON sidecar, both published with an atomic rename so readers never see a
+    partial file. Recency is the body's mtime, refreshed on every hit; when
+    the directory grows past `max_bytes` the oldest entries are evicted by
+    whichever process gets the eviction lock.
+    """
+
+    def __init__(self, root: str, max_bytes: int, max_object_bytes: int):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.max_object_bytes = max_object_bytes
+        self.stats = {'hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0, 'evicted_bytes': 0}
+        self._stats_lock = threading.Lock()
+        self._written_since_sweep = 0
+        os.makedirs(self.root, exist_ok=True)
+
+    def _count(self, name: str, amount: int = 1):
+        with self._stats_lock:
+            self.stats[name] += amount
+
+    def _key(self, bucket_name: str, object_name: str) -> str:
+        return hashlib.sha256(f"{bucket_name}/{object_name}".encode('utf-8')).hexdigest()
+
+    def path_for(self, bucket_name: str, object_name: str) -> str:
+        key = self._key(bucket_name, object_name)
+        return os.path.join(self.root, key[:2], key)
+
+    def lookup(self, bucket_name: str, object_name: str, etag: Optional[str] = None) -> Optional[Dict]:
+        """
+        Metadata of a cached object (with its `path`), or None on a miss.
+        When `etag` is given, an entry for a different version is a miss.
+        """
+        path = self.path_for(bucket_name, object_name)
+        try:
+            with open(f"{path}.meta") as f:
+                meta = json.load(f)
+            if etag is not None and meta.get('etag') != etag:
+                raise FileNotFoundError(path)
+            os.utime(path)
+        except (OSError, ValueError):
+            self._count('misses')
+            return None
+
+        self._count('hits')
+        meta['path'] = path
+        return meta
+
+    def writer(self, bucket_name: str, object_name: str, meta: Dict) -> Optional['CacheWriter']:
+        if meta.get('size', 0) > self.max_object_bytes:
+            return None
+        return CacheWriter(self, self.path_for(bucket_name, object_name), meta)
+
+    def _stored(self, size: int):
+        self._count('stores')
+        with self._stats_lock:
+            self._written_since_sweep += size
+            due = self._written_since_sweep >= self.max_bytes // 20
+            if due:
+                self._written_since_sweep = 0
+        if due:
+            self.sweep()
+
+    def disk_usage(self) -> int:
+        total = 0
+        for shard in os.scandir(self.root):
+            if shard.is_dir():
+                for entry in os.scandir(shard.path):
+                    total += entry.stat().st_size
+        return total
+
+    def sweep(self):
+        """Evict least recently used entries until usage is below 90% of the budget"""
+        lock_path = os.path.join(self.root, '.sweep.lock')
+        with open(lock_path, 'w') as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return
+
+            entries = []
+            total = 0
+            for shard in os.scandir(self.root):
+                if not shard.is_dir():
+                    continue
+                for entry in os.scandir(shard.path):
+                    try:
+                        stat = entry.stat()
+                    except FileNotFoundError:
+                        continue
+                    if entry.name.endswith(('.tmp', '.tmp.meta')) and stat.st_mtime < time.time() - 3600:
+                        # Left behind by a worker that died mid-download or mid-commit
+                        os.remove(entry.path)
+                        continue
+                    total += stat.st_size
+                    if not entry.name.endswith(('.meta', '.tmp')):
+                        entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+            target = int(self.max_bytes * 0.9)
+            if total <= self.max_bytes:
+                return
+            for _, size, path in sorted(entries):
+                if total <= target:
+                    break
+                for victim in (f"{path}.meta", path):
+                    try:
+                        os.remove(victim)
+                    except FileNotFoundError:
+                        pass
+                total -= size
+                self._count('evictions')
+                self._count('evicted_bytes', size)
+
+    def snapshot(self) -> Dict:
+        """
+        The counters of this process only (each worker keeps its own),
+        next to the size of the directory all workers on the host share
+        """
+        with self._stats_lock:
+            stats = dict(self.stats)
+        return {
+            'worker': dict(stats, pid=os.getpid()),
+            'host': {'max_bytes': self.max_bytes, 'disk_bytes': self.disk_usage()},
+        }
+
+
+class CacheWriter:
+    """Collects a streamed body into a temp file and publishes it on commit"""
+
+    def __init__(self, cache: MediaDiskCache, path: str, meta: Dict):
+        self.cache = cache
+        self.path = path
+        self.meta = meta
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, self._tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        self._file = os.fdopen(fd, 'wb')
+        self._size = 0
+
+    def write(self, chunk: bytes):
+        self._file.write(chunk)
+        self._size += len(chunk)
+
+    def commit(self):
+        self._file.close()
+        if self._size != self.meta.get('size', self._size):
+            self.abort()
+            return
+        os.replace(self._tmp_path, self.path)
+        meta_tmp = f"{self._tmp_path}.meta"
+        try:
+            with open(meta_tmp, 'w') as f:
+                json.dump(dict(self.meta, stored_at=time.time()), f)
+            os.replace(meta_tmp, f"{self.path}.meta")
+        except BaseException:
+            try:
+                os.remove(meta_tmp)
+            except FileNotFoundError:
+                pass
+            raise
+        self.cache._stored(self._size)
+
+    def abort(self):
+        self._file.close()
+        try:
+            os.remove(self._tmp_path)
+        except FileNotFoundError:
+            pass
+
+
+media_cache = None
+if MEDIA_CACHE_SETTINGS.get('enabled'):
+    try:
+        media_cache = MediaDiskCache(
+            root=MEDIA_CACHE_SETTINGS.get('root', '/var/cache/devthoughts/media'),
+            max_bytes=MEDIA_CACHE_SETTINGS.get('max_bytes', 1024 ** 3),
+            max_object_bytes=MEDIA_CACHE_SETTINGS.get('max_object_bytes', 20 * 1024 ** 2),
+        )
+    except OSError as e:
+        logger.error(f"Media cache disabled, cannot use its directory: {e}")
@@ -2,94 +2,685 @@ from bson import ObjectId
 from datetime import datetime
 from typing import Optional, Dict, Any, List
 import json
+import re
+import time
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel, ReturnDocument, UpdateMany, UpdateOne
+from pymongo.errors import BulkWriteError, DuplicateKeyError
 from posts.base import BaseDocument
 
 
 class PostDocument(BaseDocument):
+    collection_name = 'posts'
+    indexes = [
+        # Global feed: feed_filter() + keyset sort on (created_at, _id)
+        IndexModel(
+            [('deleted', ASCENDING), ('is_comment', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)],
+            name='feed_created_at'
+        ),
+        # Per-user posts: feed_filter(user_id) + the same sort
+        IndexModel(
+            [('user_id', ASCENDING), ('deleted', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)],
+            name='user_created_at'
+        ),
+        # Direct replies: comment_filter(parent_id), oldest first
+        IndexModel(
+            [('parent_id', ASCENDING), ('deleted', ASCENDING), ('created_at', ASCENDING), ('_id', ASCENDING)],
+            name='parent_created_at',
+            partialFilterExpression={'is_comment': True}
+        ),
+        # Whole threads under a top-level post
+        IndexModel(
+            [('root_id', ASCENDING), ('created_at', ASCENDING)],
+            name='root_created_at',
+            partialFilterExpression={'is_comment': True}
+        ),
+        # Fallback search while Elasticsearch is unavailable
+        IndexModel([('content.text', TEXT)], name='content_text'),
+        # Search sync: posts created, or whose counts, author name or deleted flag changed
+        IndexModel([('updated_at', ASCENDING)], name='updated_at', sparse=True),
+        # Fan-outs still in progress, for resuming ones whose worker died
+        IndexModel(
+            [('fanout.claimed_at', ASCENDING)],
+            name='fanout_claimed_at',
+            partialFilterExpression={'fanout': {'$exists': True}}
+        ),
+    ]
+
     def __init__(self):
-        super().__init__('posts')
+        super().__init__()
 
     def create(self, data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new post document"""
         data['deleted'] = False
-        data['like_count'] = len(data.get('likes', []))
+        data.setdefault('is_comment', False)
+        # Likes and replies live in their own documents; the post only keeps counts
+        data.pop('likes', None)
+        data.pop('comments', None)
+        data['like_count'] = 0
+        data['comment_count'] = 0
         data['created_at'] = datetime.utcnow()
+        data['updated_at'] = data['created_at']
+        if not data['is_comment']:
+            # Home timeline fan-out still to do, claimed by the creating worker
+            data['fanout'] = {'cursor': None, 'claimed_at': data['created_at']}
         
         result = self.collection.insert_one(data)
+        if not data['is_comment']:
+            CounterDocument().increment_posts(data['user_id'], 1)
         created_doc = self.collection.find_one({'_id': result.inserted_id})
         return self.to_dict(created_doc)
 
-    def get_by_id(self, post_id: str) -> Optional[Dict[str, Any]]:
+    def save_fanout_cursor(self, post_id: str, cursor: int):
+        """Record fan-out progress (the last follower written) and renew the claim"""
+        self.collection.update_one(
+            {'_id': ObjectId(post_id), 'fanout': {'$exists': True}},
+            {'$set': {'fanout.cursor': cursor, 'fanout.claimed_at': datetime.utcnow()}}
+        )
+
+    def finish_fanout(self, post_id: str):
+        self.collection.update_one({'_id': ObjectId(post_id)}, {'$unset': {'fanout': ''}})
+
+    def claim_stale_fanout(self, stale_before: datetime) -> Optional[Dict[str, Any]]:
+        """Take over a fan-out whose claim was last renewed before `stale_before`"""
+        doc = self.collection.find_one_and_update(
+            {'fanout.claimed_at': {'$lt': stale_before}},
+            {'$set': {'fanout.claimed_at': datetime.utcnow()}},
+            return_document=ReturnDocument.AFTER
+        )
+        return self.to_dict(doc) if doc else None
+
+    def get_by_id(self, post_id: str, projection: Optional[Dict[str, Any]] = None) -> Optional[Dict[str, Any]]:
         try:
-            doc = self.collection.find_one({'_id': ObjectId(post_id)})
+            doc = self.collection.find_one({'_id': ObjectId(post_id)}, projection)
             return self.to_dict(doc) if doc else None
         except Exception:
             return None
         
     def get_all(self, skip: int = 0, limit: int = 100) -> list:
-        docs = self.collection.find({'deleted': False}).skip(skip).limit(limit)
+        docs = self.collection.find(self.feed_filter()).skip(skip).limit(limit)
+        return self.to_dict_list(list(docs))
+
+    @staticmethod
+    def feed_filter(user_id: Optional[int] = None) -> Dict[str, Any]:
+        """Filter for top-level, non-deleted posts (optionally of one user)"""
+        # $in on point values (None also matches legacy docs without the field)
+        # lets the feed indexes serve the sort with a SORT_MERGE, unlike $ne
+        query = {'deleted': False, 'is_comment': {'$in': [False, None]}}
+        if user_id is not None:
+            query['user_id'] = user_id
+        return query
+
+    def get_page_after(self, query: Dict[str, Any], after: Optional[tuple] = None,
+                       limit: int = 10, ascending: bool = False) -> list:
+        """
+        Keyset pagination over (created_at, _id). `after` is the
+        (created_at, _id) of the last document of the previous page.
+        """
+        query, sort = self.keyset_query(query, after, ascending)
+        docs = self.collection.find(query).sort(sort).limit(limit)
         return self.to_dict_list(list(docs))
 
+    @staticmethod
+    def keyset_query(query: Dict[str, Any], after: Optional[tuple] = None,
+                     ascending: bool = False) -> tuple:
+        """The filter and sort that continue a (created_at, _id) keyset page"""
+        query = dict(query)
+        direction = 1 if ascending else -1
+        if after:
+            created_at, last_id = after
+            op = '$gt' if ascending else '$lt'
+            query['$or'] = [
+                {'created_at': {op: created_at}},
+                {'created_at': created_at, '_id': {op: ObjectId(last_id)}},
+            ]
+        return query, [('created_at', direction), ('_id', direction)]
+
     def delete(self, post_id: str) -> bool:
         try:
-            result = self.collection.update_one(
-                {'_id': ObjectId(post_id)}, 
-                {'$set': {'deleted': True}}
+            # Only the call that flips `deleted` gets the document back, so
+            # concurrent deletes decrement the counters exactly once
+            doc = self.collection.find_one_and_update(
+                {'_id': ObjectId(post_id), 'deleted': False},
+                {'$set': {'deleted': True, 'updated_at': datetime.utcnow()}},
+                projection={'user_id': 1, 'is_comment': 1, 'parent_id': 1, 'content.attachments.object_name': 1}
             )
-            return result.modified_count > 0
+            if doc and doc.get('parent_id'):
+                self.collection.update_one(
+                    {'_id': doc['parent_id']},
+                    {'$inc': {'comment_count': -1}, '$set': {'updated_at': datetime.utcnow()}}
+                )
+            elif doc and not doc.get('is_comment', False):
+                CounterDocument().increment_posts(doc.get('user_id'), -1)
+                TimelineDocument().remove_post(post_id)
+            if doc:
+                attachments = (doc.get('content') or {}).get('attachments') or []
+                AttachmentRefDocument().release([a['object_name'] for a in attachments if a.get('object_name')])
+            return doc is not None
         except Exception:
             return False
+
+    def count_posts(self, user_id: Optional[int] = None) -> int:
+        """Non-deleted, non-comment post total read from the counters collection"""
+        counters = CounterDocument()
+        key = counters.posts_key(user_id)
+        value = counters.get(key)
+        if value is None:
+            # Once seed_counters has run a missing counter means no posts;
+            # before that, count and seed it here
+            value = counters.seed(key, self.collection.count_documents(self.feed_filter(user_id)))
+        return value
+
+    def post_totals(self) -> Dict[str, int]:
+        """Every post counter (global and per user) recounted from the collection"""
+        per_user = self.collection.aggregate([
+            {'$match': self.feed_filter()},
+            {'$group': {'_id': '$user_id', 'total': {'$sum': 1}}},
+        ])
+        totals = {
+            CounterDocument.posts_key(row['_id']): row['total']
+            for row in per_user
+            if row['_id'] is not None
+        }
+        totals[CounterDocument.posts_key()] = self.collection.count_documents(self.feed_filter())
+        return totals
+
+    def seed_counters(self) -> int:
+        """
+        Create the post counters that do not exist yet, once per database.
+        From then on increment_posts creates missing counters itself, so
+        none is left to be seeded lazily while posts are being written.
+        Run by the server master before workers serve; returns the number
+        of counters created.
+        """
+        counters = CounterDocument()
+        if counters.get(CounterDocument.POSTS_SEEDED_KEY) is not None:
+            return 0
+        created = counters.set_missing(self.post_totals())
+        counters.seed(CounterDocument.POSTS_SEEDED_KEY, 1)
+        return created
     
-    def add_comment(self, post_id: str, comment_id: str) -> bool:
+    @staticmethod
+    def comment_filter(parent_id: str) -> Dict[str, Any]:
+        """Filter for non-deleted direct replies to a post or comment"""
+        return {'parent_id': ObjectId(parent_id), 'deleted': False, 'is_comment': True}
+
+    def add_comment(self, parent_id: str, data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """
+        Create a reply under `parent_id` (a post or another comment) and bump
+        the parent's comment_count. Returns None if the parent does not exist.
+        """
         try:
-            result = self.collection.update_one(
-                {'_id': ObjectId(post_id)}, 
-                {'$push': {'comments': ObjectId(comment_id)}}
+            parent = self.collection.find_one(
+                {'_id': ObjectId(parent_id), 'deleted': False}, {'root_id': 1}
             )
-            return result.modified_count > 0
         except Exception:
-            return False
+            return None
+        if not parent:
+            return None
+
+        data['is_comment'] = True
+        data['parent_id'] = parent['_id']
+        data['root_id'] = parent.get('root_id') or parent['_id']
+        created = self.create(data)
+        self.collection.update_one(
+            {'_id': parent['_id']}, {'$inc': {'comment_count': 1}, '$set': {'updated_at': datetime.utcnow()}}
+        )
+        return created
+
+    def get_comments(self, parent_id: str, skip: int = 0, limit: int = 5) -> list:
+        docs = self.collection.find(self.comment_filter(parent_id)).sort(
+            [('created_at', ASCENDING), ('_id', ASCENDING)]
+        ).skip(skip).limit(limit)
+        return self.to_dict_list(list(docs))
     
     def add_like(self, post_id: str, user_id: int) -> bool:
         try:
-            result = self.collection.update_one(
-                {'_id': ObjectId(post_id)}, 
-                {'$addToSet': {'likes': user_id}}
+            if not LikeDocument().add(post_id, user_id, counted=True):
+                return False
+            self.collection.update_one(
+                {'_id': ObjectId(post_id)}, {'$inc': {'like_count': 1}, '$set': {'updated_at': datetime.utcnow()}}
             )
-            if result.modified_count > 0:
-                self.collection.update_one(
-                    {'_id': ObjectId(post_id)}, 
-                    {'$set': {'like_count': len(self.get_by_id(post_id)['likes'])}}
-                )
-            return result.modified_count > 0
+            return True
         except Exception:
             return False
 
     def remove_like(self, post_id: str, user_id: int) -> bool:
         try:
-            result = self.collection.update_one(
-                {'_id': ObjectId(post_id)}, 
-                {'$pull': {'likes': user_id}}
+            if not LikeDocument().remove(post_id, user_id, counted=True):
+                return False
+            self.collection.update_one(
+                {'_id': ObjectId(post_id)}, {'$inc': {'like_count': -1}, '$set': {'updated_at': datetime.utcnow()}}
             )
-            if result.modified_count > 0:
-                self.collection.update_one(
-                    {'_id': ObjectId(post_id)}, 
-                    {'$set': {'like_count': len(self.get_by_id(post_id)['likes'])}}
-                )
-            return result.modified_count > 0
+            return True
         except Exception:
             return False
     
+    def set_username(self, user_id: int, username: str) -> int:
+        """
+        Rewrite the author name stored on a user's posts and comments. The
+        updated_at mark lets the search sync pick the change up.
+        """
+        result = self.collection.update_many(
+            {'user_id': user_id, 'username': {'$ne': username}},
+            {'$set': {'username': username, 'updated_at': datetime.utcnow()}}
+        )
+        return result.modified_count
+
     def get_posts_by_user(self, user_id: int, skip: int = 0, limit: int = 100) -> list:
-        docs = self.collection.find({'user_id': user_id, 'deleted': False}).skip(skip).limit(limit)
+        docs = self.collection.find(self.feed_filter(user_id)).skip(skip).limit(limit)
         return self.to_dict_list(list(docs))
     
+    @staticmethod
+    def text_search_filter(query: str) -> Dict[str, Any]:
+        """Non-deleted posts and comments matching `query` through the content_text index"""
+        return {'$text': {'$search': query}, 'deleted': False}
+
+    # Best matches first, newest first among equal scores
+    TEXT_SEARCH_PROJECTION = {'score': {'$meta': 'textScore'}}
+    TEXT_SEARCH_SORT = [('score', {'$meta': 'textScore'}), ('created_at', DESCENDING)]
+
     def search_posts(self, query: str, skip: int = 0, limit: int = 20) -> list:
-        search_filter = {
-            'deleted': False,
-            '$or': [
-                {'content.text': {'$regex': query, '$options': 'i'}}
-            ]
+        docs = self.collection.find(
+            self.text_search_filter(query), self.TEXT_SEARCH_PROJECTION
+        ).sort(self.TEXT_SEARCH_SORT).skip(skip).limit(limit)
+        return self.to_dict_list(list(docs))
+
+    def count_search_results(self, query: str) -> int:
+        return self.collection.count_documents(self.text_search_filter(query))
+
+
+class CounterDocument(BaseDocument):
+    """
+    Maintained totals keyed by name, e.g. `posts:all` and `posts:user:<id>`.
+    Writers adjust them with atomic $inc; `manage.py reconcile_counters`
+    recomputes them from the source collections to repair drift.
+    """
+    collection_name = 'counters'
+    USER_POSTS_PREFIX = 'posts:user:'
+    FOLLOWERS_PREFIX = 'followers:'
+    # Bumped by the search sync job whenever it indexes or deletes posts
+    SEARCH_GENERATION_KEY = 'search:generation'
+    # Bumped by accounts.directory.UserDirectory.invalidate
+    USER_DIRECTORY_GENERATION_KEY = 'directory:generation'
+    # Set once PostDocument.seed_counters has created every post counter
+    POSTS_SEEDED_KEY = 'posts:seeded'
+    indexes = [
+        # Follower counters above the fan-out limit, see increment_followers
+        IndexModel([('high_fanout', ASCENDING)], name='high_fanout', partialFilterExpression={'high_fanout': True}),
+    ]
+
+    def __init__(self):
+        super().__init__()
+
+    @classmethod
+    def posts_key(cls, user_id: Optional[int] = None) -> str:
+        return 'posts:all' if user_id is None else f'{cls.USER_POSTS_PREFIX}{user_id}'
+
+    @classmethod
+    def followers_key(cls, user_id: int) -> str:
+        return f'{cls.FOLLOWERS_PREFIX}{user_id}'
+
+    def get(self, key: str) -> Optional[int]:
+        doc = self.collection.find_one({'_id': key}, {'value': 1})
+        return doc['value'] if doc else None
+
+    def get_many(self, keys: List[str]) -> Dict[str, int]:
+        docs = self.collection.find({'_id': {'$in': list(keys)}}, {'value': 1})
+        return {doc['_id']: doc['value'] for doc in docs}
+
+    def increment(self, key: str, delta: int = 1, upsert: bool = True):
+        self.collection.update_one({'_id': key}, {'$inc': {'value': delta}}, upsert=upsert)
+
+    def increment_posts(self, user_id: Optional[int], delta: int):
+        # Post counters are seeded up front (PostDocument.seed_counters), so
+        # a missing one belongs to a user without posts and starts at delta
+        self.increment(self.posts_key(), delta)
+        if user_id is not None:
+            self.increment(self.posts_key(user_id), delta)
+
+    def increment_followers(self, user_id: int, delta: int, fanout_limit: int):
+        """
+        Adjust a follower counter and, in the same write, flag it while it
+        is above `fanout_limit`, so high-fanout authors can be listed
+        without reading every followee's counter.
+        """
+        value = {'$add': [{'$ifNull': ['$value', 0]}, delta]}
+        self.collection.update_one(
+            {'_id': self.followers_key(user_id)},
+            [{'$set': {'value': value, 'high_fanout': {'$gt': [value, fanout_limit]}}}],
+            upsert=True
+        )
+
+    def high_fanout_authors(self) -> List[int]:
+        """Users whose follower counter is flagged by increment_followers"""
+        prefix = len(self.FOLLOWERS_PREFIX)
+        return [int(doc['_id'][prefix:]) for doc in self.collection.find({'high_fanout': True}, {'_id': 1})]
+
+    def flag_high_fanout(self, fanout_limit: int) -> int:
+        """Recompute every follower counter's flag, e.g. after the limit changed"""
+        followers = {'_id': {'$regex': f'^{re.escape(self.FOLLOWERS_PREFIX)}'}}
+        result = self.collection.update_many(
+            followers, [{'$set': {'high_fanout': {'$gt': ['$value', fanout_limit]}}}]
+        )
+        return result.modified_count
+
+    def seed(self, key: str, value: int) -> int:
+        """
+        Raise a counter to at least `value`, creating it if missing, and
+        return its current value. $max keeps an increment that created the
+        counter between the caller's count and this write.
+        """
+        doc = self.collection.find_one_and_update(
+            {'_id': key},
+            {'$max': {'value': value}},
+            upsert=True,
+            return_document=ReturnDocument.AFTER
+        )
+        return doc['value']
+
+    def set_missing(self, values: Dict[str, int]) -> int:
+        """Create the counters in `values` that do not exist yet; returns how many were created"""
+        if not values:
+            return 0
+        result = self.collection.bulk_write([
+            UpdateOne({'_id': key}, {'$setOnInsert': {'value': value}}, upsert=True)
+            for key, value in values.items()
+        ], ordered=False)
+        return result.upserted_count
+
+    def set_many(self, values: Dict[str, int], prefix: Optional[str] = None) -> int:
+        """
+        Overwrite counters with recomputed values. When `prefix` is given,
+        counters under it that are not in `values` are reset to zero.
+        Returns the number of counters that changed.
+        """
+        operations = [
+            UpdateOne({'_id': key}, {'$set': {'value': value}}, upsert=True)
+            for key, value in values.items()
+        ]
+        if prefix:
+            operations.append(UpdateMany(
+                {'_id': {'$regex': f'^{re.escape(prefix)}', '$nin': list(values)}, 'value': {'$ne': 0}},
+                {'$set': {'value': 0}}
+            ))
+        if not operations:
+            return 0
+        result = self.collection.bulk_write(operations, ordered=False)
+        return result.modified_count + result.upserted_count
+
+
+
+class TimelineDocument(BaseDocument):
+    """
+    Materialized home timelines: one entry per (owner, post) written when a
+    followed author posts. Entries carry the post's created_at so a home
+    page is a single range read on (owner_id, created_at, post_id).
+    """
+    collection_name = 'timelines'
+    indexes = [
+        IndexModel(
+            [('owner_id', ASCENDING), ('created_at', DESCENDING), ('post_id', DESCENDING)],
+            name='owner_created_at'
+        ),
+        IndexModel([('owner_id', ASCENDING), ('post_id', ASCENDING)], name='owner_post', unique=True),
+        IndexModel([('owner_id', ASCENDING), ('author_id', ASCENDING)], name='owner_author'),
+        IndexModel([('post_id', ASCENDING)], name='post_id'),
+    ]
+
+    def __init__(self):
+        super().__init__()
+
+    @staticmethod
+    def _entry(owner_id: int, post: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'owner_id': owner_id,
+            'post_id': ObjectId(post['_id']),
+            'author_id': post['user_id'],
+            'created_at': post['created_at'],
         }
-        docs = self.collection.find(search_filter).skip(skip).limit(limit)
-        return self.to_dict_list(list(docs))
\ No newline at end of file
+
+    def add_entries(self, owner_ids: List[int], posts: List[Dict[str, Any]]) -> int:
+        """Insert timeline entries, ignoring ones that already exist"""
+        entries = [self._entry(owner_id, post) for owner_id in owner_ids for post in posts]
+        if not entries:
+            return 0
+        try:
+            result = self.collection.insert_many(entries, ordered=False)
+            return len(result.inserted_ids)
+        except BulkWriteError as e:
+            return e.details.get('nInserted', 0)
+
+    def get_page(self, owner_id: int, after: Optional[tuple] = None, limit: int = 10) -> list:
+        query = {'owner_id': owner_id}
+        if after:
+            created_at, last_id = after
+            query['$or'] = [
+                {'created_at': {'$lt': created_at}},
+                {'created_at': created_at, 'post_id': {'$lt': ObjectId(last_id)}},
+            ]
+        docs = self.collection.find(query, {'post_id': 1, 'created_at': 1}).sort(
+            [('created_at', DESCENDING), ('post_id', DESCENDING)]
+        ).limit(limit)
+        return list(docs)
+
+    def remove_author(self, owner_id: int, author_id: int) -> int:
+        return self.collection.delete_many({'owner_id': owner_id, 'author_id': author_id}).deleted_count
+
+    def remove_post(self, post_id: str) -> int:
+        return self.collection.delete_many({'post_id': ObjectId(post_id)}).deleted_count
+
+
+
+class SearchQueryDocument(BaseDocument):
+    """
+    How often each normalized search query was run, for warming the search
+    cache after deploys. Queries not seen for 30 days expire.
+    """
+    collection_name = 'search_queries'
+    indexes = [
+        IndexModel([('count', DESCENDING)], name='count'),
+        IndexModel([('last_seen', ASCENDING)], name='last_seen_ttl', expireAfterSeconds=30 * 24 * 3600),
+    ]
+
+    def __init__(self):
+        super().__init__()
+
+    def record_many(self, counts: Dict[str, int]) -> int:
+        if not counts:
+            return 0
+        now = datetime.utcnow()
+        self.collection.bulk_write([
+            UpdateOne({'_id': query}, {'$inc': {'count': count}, '$set': {'last_seen': now}}, upsert=True)
+            for query, count in counts.items()
+        ], ordered=False)
+        return len(counts)
+
+    def top(self, limit: int = 20, seen_since: Optional[datetime] = None) -> List[str]:
+        """Most run queries, optionally only those run since `seen_since`"""
+        query = {'last_seen': {'$gte': seen_since}} if seen_since else {}
+        docs = self.collection.find(query, {'_id': 1}).sort('count', DESCENDING).limit(limit)
+        return [doc['_id'] for doc in docs]
+
+
+class LikeDocument(BaseDocument):
+    """
+    One document per (post, user) like. Keeps post documents a fixed size
+    and lets a page check membership for all its posts in one query.
+
+    The rows are also the durable queue of like_count changes. Every toggle
+    bumps `rev` and sets `pending`; `counted_rev` is the revision like_count
+    reflects. An unlike keeps the row as a tombstone (`liked: False`) until
+    its -1 has been counted. Rows from before the pipeline have none of
+    these fields: they are likes that are already counted.
+    """
+    collection_name = 'likes'
+    indexes = [
+        IndexModel([('post_id', ASCENDING), ('user_id', ASCENDING)], name='post_user', unique=True),
+        IndexModel([('user_id', ASCENDING), ('post_id', ASCENDING)], name='user_post'),
+        # Rows whose toggle like_count does not reflect yet, for the sweep
+        IndexModel([('pending', ASCENDING)], name='pending', partialFilterExpression={'pending': True}),
+    ]
+    # Liked rows, including legacy ones without the field
+    LIKED_FILTER = {'liked': {'$ne': False}}
+
+    def __init__(self):
+        super().__init__()
+
+    @staticmethod
+    def _toggle(liked: bool, counted: bool) -> List[Dict[str, Any]]:
+        """Pipeline update flipping a row to `liked`, pending unless the caller counts it"""
+        rev = {'$add': [{'$ifNull': ['$rev', 0]}, 1]}
+        return [{'$set': {
+            'liked': liked,
+            'rev': rev,
+            'counted_rev': rev if counted else {'$ifNull': ['$counted_rev', 0]},
+            'pending': not counted,
+        }}]
+
+    def add(self, post_id: str, user_id: int, counted: bool = False) -> bool:
+        """
+        Like with one write: revives a tombstone or inserts a new row.
+        Returns False when the like already exists. `counted` is for
+        callers that update like_count themselves.
+        """
+        try:
+            self.collection.update_one(
+                {'post_id': ObjectId(post_id), 'user_id': user_id, 'liked': False},
+                self._toggle(True, counted) + [{'$set': {'created_at': datetime.utcnow()}}],
+                upsert=True
+            )
+            return True
+        except DuplicateKeyError:
+            # A live like (or a legacy row) made the upsert collide
+            return False
+
+    def remove(self, post_id: str, user_id: int, counted: bool = False) -> bool:
+        result = self.collection.update_one(
+            dict(self.LIKED_FILTER, post_id=ObjectId(post_id), user_id=user_id),
+            self._toggle(False, counted)
+        )
+        if counted and result.modified_count:
+            # Nothing left to count, the tombstone can go straight away
+            self.collection.delete_one(
+                {'post_id': ObjectId(post_id), 'user_id': user_id, 'liked': False, 'pending': False}
+            )
+        return result.modified_count > 0
+
+    def liked_post_ids(self, user_id: Optional[int], post_ids: List[str]) -> set:
+        """Subset of post_ids the user has liked, answered from the user_post index"""
+        if user_id is None or not post_ids:
+            return set()
+        docs = self.collection.find(
+            dict(self.LIKED_FILTER, user_id=user_id, post_id={'$in': [ObjectId(pid) for pid in post_ids]}),
+            {'post_id': 1, '_id': 0}
+        )
+        return {str(doc['post_id']) for doc in docs}
+
+    def claim_pending(self, token: str, limit: int, stale_before: datetime) -> List[Dict[str, Any]]:
+        """
+        Claim up to `limit` pending rows for one sweep and return them. A
+        claim older than `stale_before` belongs to a sweep that died and is
+        taken over.
+        """
+        unclaimed = {'pending': True, '$or': [
+            {'claim': {'$exists': False}}, {'claimed_at': {'$lt': stale_before}},
+        ]}
+        ids = [doc['_id'] for doc in self.collection.find(unclaimed, {'_id': 1}).limit(limit)]
+        if not ids:
+            return []
+        self.collection.update_many(
+            dict(unclaimed, _id={'$in': ids}), {'$set': {'claim': token, 'claimed_at': datetime.utcnow()}}
+        )
+        return list(self.collection.find({'claim': token}, {'post_id': 1, 'liked': 1, 'rev': 1, 'counted_rev': 1}))
+
+    def settle(self, token: str, rows: List[Dict[str, Any]]):
+        """
+        Record that like_count now reflects each claimed row as it was
+        read. A row toggled since stays pending; settled tombstones are
+        deleted.
+        """
+        if not rows:
+            return
+        self.collection.bulk_write([
+            UpdateOne({'_id': row['_id'], 'claim': token}, [
+                {'$set': {'counted_rev': row['rev'], 'pending': {'$ne': ['$rev', row['rev']]}}},
+                {'$unset': ['claim', 'claimed_at']},
+            ])
+            for row in rows
+        ], ordered=False)
+        self.collection.delete_many(
+            {'_id': {'$in': [row['_id'] for row in rows]}, 'liked': False, 'pending': False}
+        )
+
+    def delete_for_posts(self, post_ids: List[ObjectId]) -> int:
+        return self.collection.delete_many({'post_id': {'$in': post_ids}}).deleted_count
+
+
+class AttachmentRefDocument(BaseDocument):
+    """
+    Reference counts of content-addressed attachment objects, keyed by
+    object name. A count that drops to zero only marks the object orphaned;
+    it is removed later by `gc_attachments`, which first claims the entry
+    so a concurrent upload of the same content cannot take a reference to
+    an object that is about to disappear.
+    """
+    collection_name = 'attachment_refs'
+    indexes = [
+        IndexModel([('refs', ASCENDING), ('orphaned_at', ASCENDING)], name='refs_orphaned_at'),
+    ]
+
+    def __init__(self):
+        super().__init__()
+
+    def acquire(self, object_name: str, attempts: int = 5) -> bool:
+        """
+        Take one reference, creating the entry when the object is new.
+        Returns False while a collector is deleting the object.
+        """
+        for attempt in range(attempts):
+            try:
+                self.collection.update_one(
+                    {'_id': object_name, 'deleting': {'$ne': True}},
+                    {'$inc': {'refs': 1}, '$unset': {'orphaned_at': ''}},
+                    upsert=True
+                )
+                return True
+            except DuplicateKeyError:
+                # Either a concurrent first upload won the insert, or the
+                # entry is claimed for deletion and will be gone shortly
+                time.sleep(0.05 * (attempt + 1))
+        return False
+
+    def release(self, object_names: List[str]) -> List[str]:
+        """Drop one reference per name; returns the names left unreferenced"""
+        orphaned = []
+        for object_name in object_names:
+            doc = self.collection.find_one_and_update(
+                {'_id': object_name, 'refs': {'$gt': 0}},
+                {'$inc': {'refs': -1}},
+                return_document=ReturnDocument.AFTER
+            )
+            if doc and doc['refs'] <= 0:
+                self.collection.update_one(
+                    {'_id': object_name, 'refs': 0},
+                    {'$set': {'orphaned_at': datetime.utcnow()}}
+                )
+                orphaned.append(object_name)
+        return orphaned
+
+    def claim_orphan(self, orphaned_before: datetime) -> Optional[str]:
+        """Mark one object unreferenced since before the cutoff as being deleted"""
+        doc = self.collection.find_one_and_update(
+            {
+                'refs': 0,
+                'orphaned_at': {'$lt': orphaned_before},
+                # Claims left behind by a collector that died are retaken
+                '$or': [{'deleting': {'$ne': True}}, {'claimed_at': {'$lt': orphaned_before}}],
+            },
+            {'$set': {'deleting': True, 'claimed_at': datetime.utcnow()}},
+            projection={'_id': 1}
+        )
+        return doc['_id'] if doc else None
+
+    def forget(self, object_name: str) -> bool:
+        return self.collection.delete_one({'_id': object_name, 'deleting': True}).deleted_count > 0
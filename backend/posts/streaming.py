@@ -0,0 +1,183 @@
+import os
+import re
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date, parse_http_date_safe
+from storage import get_storage
+from posts.media_cache import MEDIA_CACHE_SETTINGS, media_cache
+
+CHUNK_SIZE = 64 * 1024
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+_range_re = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def parse_range(header, size):
+    """
+    Parse a single-range `Range: bytes=...` header into (start, end)
+    inclusive. Returns None when absent or unsupported, and raises
+    ValueError when it cannot be satisfied.
+    """
+    if not header:
+        return None
+    match = _range_re.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first and not last:
+        return None
+    if not first:
+        suffix = int(last)
+        if suffix == 0:
+            raise ValueError(header)
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(header)
+    return start, end
+
+
+def not_modified(request, etag, last_modified):
+    if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+    if if_none_match:
+        tags = [tag.strip().removeprefix('W/') for tag in if_none_match.split(',')]
+        return '*' in tags or etag in tags
+    if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+    return if_modified_since is not None and int(last_modified) <= if_modified_since
+
+
+def _iter_body(body):
+    try:
+        for chunk in body.stream(CHUNK_SIZE):
+            yield chunk
+    finally:
+        body.close()
+        body.release_conn()
+
+
+def _iter_file_range(f, start, length):
+    with f:
+        f.seek(start)
+        while length > 0:
+            chunk = f.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def _iter_body_into_cache(body, writer):
+    """Stream the storage body to the client while filling the disk cache"""
+    completed = False
+    try:
+        for chunk in body.stream(CHUNK_SIZE):
+            writer.write(chunk)
+            yield chunk
+        completed = True
+    finally:
+        body.close()
+        body.release_conn()
+        if completed:
+            writer.commit()
+        else:
+            writer.abort()
+
+
+def _serve_cached(meta, byte_range, content_type):
+    """Response for a cache hit, or None if the entry was evicted since the lookup"""
+    path = meta['path']
+    if MEDIA_CACHE_SETTINGS.get('serve_mode') == 'accel':
+        # nginx serves the file (ranges included) from an internal location
+        response = HttpResponse(content_type=content_type)
+        relative = os.path.relpath(path, media_cache.root)
+        response['X-Accel-Redirect'] = f"{MEDIA_CACHE_SETTINGS.get('accel_prefix', '/_media_cache/')}{relative}"
+        return response
+
+    try:
+        f = open(path, 'rb')
+    except FileNotFoundError:
+        return None
+    if byte_range:
+        start, end = byte_range
+        response = StreamingHttpResponse(
+            _iter_file_range(f, start, end - start + 1), status=206, content_type=content_type
+        )
+        response['Content-Range'] = f"bytes {start}-{end}/{meta['size']}"
+        response['Content-Length'] = str(end - start + 1)
+        return response
+
+    # FileResponse hands the file to wsgi.file_wrapper, which uses sendfile
+    response = FileResponse(f, content_type=content_type)
+    response['Content-Length'] = str(meta['size'])
+    return response
+
+
+def serve_object(request, bucket_name, object_name, immutable=True, default_content_type='application/octet-stream'):
+    """
+    Serve an object from the local media cache or stream it from storage
+    chunk by chunk, honouring Range and If-None-Match / If-Modified-Since.
+    Immutable objects are served from cache without asking storage at all;
+    mutable ones are revalidated by ETag. Returns None when the object does
+    not exist.
+    """
+    storage = get_storage()
+    cached = media_cache.lookup(bucket_name, object_name) if media_cache and immutable else None
+
+    if cached:
+        meta = cached
+    else:
+        stat = storage.stat(bucket_name, object_name)
+        if stat is None:
+            return None
+        meta = {
+            'etag': f'"{stat.etag}"',
+            'last_modified': stat.last_modified.timestamp(),
+            'size': stat.size,
+            'content_type': stat.content_type,
+        }
+        if media_cache and not immutable:
+            cached = media_cache.lookup(bucket_name, object_name, etag=meta['etag'])
+
+    # Objects stored with fput_object carry the generic binary type
+    content_type = meta['content_type']
+    if not content_type or content_type == 'application/octet-stream':
+        content_type = default_content_type
+
+    headers = {
+        'ETag': meta['etag'],
+        'Last-Modified': http_date(meta['last_modified']),
+        'Accept-Ranges': 'bytes',
+        'Cache-Control': IMMUTABLE_CACHE_CONTROL if immutable else 'no-cache',
+    }
+
+    if not_modified(request, meta['etag'], meta['last_modified']):
+        response = HttpResponse(status=304)
+        for name, value in headers.items():
+            response[name] = value
+        return response
+
+    try:
+        byte_range = parse_range(request.META.get('HTTP_RANGE'), meta['size'])
+    except ValueError:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f"bytes */{meta['size']}"
+        return response
+
+    # An entry evicted between the lookup and the open is fetched from storage
+    response = _serve_cached(cached, byte_range, content_type) if cached else None
+    if response is None and byte_range:
+        start, end = byte_range
+        body = storage.open_stream(bucket_name, object_name, offset=start, length=end - start + 1)
+        response = StreamingHttpResponse(_iter_body(body), status=206, content_type=content_type)
+        response['Content-Range'] = f"bytes {start}-{end}/{meta['size']}"
+        response['Content-Length'] = str(end - start + 1)
+    elif response is None:
+        body = storage.open_stream(bucket_name, object_name)
+        writer = media_cache.writer(bucket_name, object_name, meta) if media_cache else None
+        chunks = _iter_body_into_cache(body, writer) if writer else _iter_body(body)
+        response = StreamingHttpResponse(chunks, content_type=content_type)
+        response['Content-Length'] = str(meta['size'])
+
+    for name, value in headers.items():
+        response[name] = value
+    return response
@@ -0,0 +1,168 @@
+from datetime import datetime
+from unittest import skipUnless
+from bson import ObjectId
+from django.test import SimpleTestCase
+from posts.api.utils import decode_cursor, encode_cursor
+from posts.likes import LikeCountBuffer
+from posts.models import CounterDocument, PostDocument
+from posts.streaming import parse_range
+from posts.variants import ATTACHMENT_VARIANTS, variant_candidates
+
+
+def mongo_test_database():
+    """Only run against a reachable test database (devthoughts.test_settings); these tests wipe collections"""
+    try:
+        database = PostDocument().collection.database
+        if 'test' not in database.name:
+            return False
+        database.client.admin.command('ping')
+        return True
+    except Exception:
+        return False
+
+
+@skipUnless(mongo_test_database(), "needs a MongoDB test database")
+class PostCountersTests(SimpleTestCase):
+    """Post totals on a database that has posts but no counters yet"""
+
+    def setUp(self):
+        self.posts = PostDocument()
+        self.counters = CounterDocument()
+        self.posts.collection.delete_many({})
+        self.counters.collection.delete_many({})
+        self.posts.collection.insert_many([
+            {'user_id': 1, 'deleted': False, 'is_comment': False, 'content': {'text': f'post {i}'}}
+            for i in range(3)
+        ])
+
+    def tearDown(self):
+        self.posts.collection.delete_many({})
+        self.counters.collection.delete_many({})
+
+    def test_count_seeds_from_existing_posts(self):
+        self.assertEqual(self.posts.count_posts(), 3)
+        self.assertEqual(self.posts.count_posts(1), 3)
+
+    def test_seed_counters_creates_missing_counters_once(self):
+        self.assertEqual(self.posts.seed_counters(), 2)
+        self.assertEqual(self.counters.get(self.counters.posts_key()), 3)
+        self.assertEqual(self.counters.get(self.counters.posts_key(1)), 3)
+        self.assertEqual(self.posts.seed_counters(), 0)
+
+    def test_create_after_seeding(self):
+        self.posts.seed_counters()
+        self.posts.create({'user_id': 1, 'content': {'text': 'new'}})
+        self.posts.create({'user_id': 2, 'content': {'text': 'new'}})
+
+        self.assertEqual(self.posts.count_posts(), 5)
+        self.assertEqual(self.posts.count_posts(1), 4)
+        self.assertEqual(self.posts.count_posts(2), 1)
+
+    def test_delete_after_seeding(self):
+        self.posts.seed_counters()
+        post_id = str(self.posts.collection.find_one({'user_id': 1})['_id'])
+        self.posts.delete(post_id)
+
+        self.assertEqual(self.posts.count_posts(), 2)
+        self.assertEqual(self.posts.count_posts(1), 2)
+
+    def test_seed_keeps_a_concurrent_increment(self):
+        # An increment that created the counter after the count was taken
+        self.counters.increment_posts(2, 1)
+
+        self.assertEqual(self.counters.seed(self.counters.posts_key(2), 0), 1)
+
+
+class ParseRangeTests(SimpleTestCase):
+    def test_absent_or_unsupported_header_serves_everything(self):
+        self.assertIsNone(parse_range(None, 1000))
+        self.assertIsNone(parse_range('bytes=-', 1000))
+        self.assertIsNone(parse_range('bytes=0-1,5-6', 1000))
+        self.assertIsNone(parse_range('items=0-10', 1000))
+
+    def test_bounded_and_open_ranges(self):
+        self.assertEqual(parse_range('bytes=0-99', 1000), (0, 99))
+        self.assertEqual(parse_range('bytes=500-', 1000), (500, 999))
+        self.assertEqual(parse_range('bytes=900-5000', 1000), (900, 999))
+
+    def test_suffix_ranges(self):
+        self.assertEqual(parse_range('bytes=-100', 1000), (900, 999))
+        self.assertEqual(parse_range('bytes=-5000', 1000), (0, 999))
+
+    def test_unsatisfiable_ranges(self):
+        for header in ('bytes=1000-', 'bytes=5-2', 'bytes=-0'):
+            with self.assertRaises(ValueError):
+                parse_range(header, 1000)
+
+
+class CursorTests(SimpleTestCase):
+    def test_round_trip(self):
+        post_id = ObjectId()
+        created_at = datetime(2024, 5, 1, 12, 30, 15, 250000)
+
+        cursor = encode_cursor({'created_at': created_at, '_id': post_id})
+
+        self.assertEqual(decode_cursor(cursor), (created_at, str(post_id)))
+
+    def test_malformed_cursor(self):
+        for cursor in ('', 'not-a-cursor', encode_cursor({'created_at': 'yesterday', '_id': ObjectId()})):
+            with self.assertRaises(ValueError):
+                decode_cursor(cursor)
+
+    def test_invalid_object_id(self):
+        cursor = encode_cursor({'created_at': datetime(2024, 5, 1), '_id': 'abc'})
+
+        with self.assertRaises(ValueError):
+            decode_cursor(cursor)
+
+
+class VariantCandidatesTests(SimpleTestCase):
+    def test_webp_first_when_accepted(self):
+        self.assertEqual(
+            variant_candidates('abc_attach.jpg', 'feed', 'image/avif,image/webp,*/*', ATTACHMENT_VARIANTS),
+            ['abc_attach.feed.webp', 'abc_attach.feed.jpg', 'abc_attach.jpg'],
+        )
+
+    def test_jpeg_without_webp_support(self):
+        self.assertEqual(
+            variant_candidates('abc_attach.jpg', 'detail', 'image/jpeg', ATTACHMENT_VARIANTS),
+            ['abc_attach.detail.jpg', 'abc_attach.jpg'],
+        )
+
+    def test_original_only_without_a_known_variant(self):
+        self.assertEqual(variant_candidates('abc_attach.jpg', None, 'image/webp', ATTACHMENT_VARIANTS), ['abc_attach.jpg'])
+        self.assertEqual(variant_candidates('abc_attach.jpg', 'huge', 'image/webp', ATTACHMENT_VARIANTS), ['abc_attach.jpg'])
+
+
+class LikeCoalesceTests(SimpleTestCase):
+    """LikeCountBuffer.coalesce over claimed like rows"""
+
+    def setUp(self):
+        self.post = ObjectId()
+
+    def row(self, liked, rev, counted_rev, post_id=None):
+        return {'post_id': post_id or self.post, 'liked': liked, 'rev': rev, 'counted_rev': counted_rev}
+
+    def test_new_like(self):
+        self.assertEqual(LikeCountBuffer.coalesce([self.row(True, 1, 0)]), {self.post: 1})
+
+    def test_unlike_of_a_counted_like(self):
+        self.assertEqual(LikeCountBuffer.coalesce([self.row(False, 3, 2)]), {self.post: -1})
+
+    def test_toggles_cancel_out(self):
+        self.assertEqual(LikeCountBuffer.coalesce([self.row(False, 2, 0)]), {})
+        self.assertEqual(LikeCountBuffer.coalesce([self.row(True, 3, 1)]), {})
+
+    def test_odd_toggles_count_once(self):
+        self.assertEqual(LikeCountBuffer.coalesce([self.row(True, 3, 0)]), {self.post: 1})
+
+    def test_rows_are_summed_per_post(self):
+        other = ObjectId()
+        rows = [
+            self.row(True, 1, 0),
+            self.row(True, 1, 0),
+            self.row(False, 1, 0, post_id=other),
+            self.row(True, 1, 0, post_id=other),
+        ]
+
+        self.assertEqual(LikeCountBuffer.coalesce(rows), {self.post: 2})
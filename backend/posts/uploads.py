@@ -0,0 +1,141 @@
+import hashlib
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from django.conf import settings
+from storage import get_storage
+from posts.attachments import ATTACHMENT_BUCKET, ATTACHMENT_URL_PREFIX
+from posts.models import AttachmentRefDocument
+from posts.variants import ATTACHMENT_VARIANTS, schedule_variants
+
+logger = logging.getLogger(__name__)
+
+_upload_pool = None
+_upload_pool_pid = None
+_upload_pool_lock = threading.Lock()
+
+
+class AttachmentUploadError(Exception):
+    """Some attachments of a request could not be stored; `failed` names them"""
+
+    def __init__(self, failed: List[str]):
+        super().__init__(f"Could not store attachments: {', '.join(failed)}")
+        self.failed = failed
+
+
+def _get_upload_pool() -> ThreadPoolExecutor:
+    # Shared by all requests in the process so concurrent uploads stay
+    # bounded; built on first use, since threads do not survive the fork
+    # from the preloading master into each worker
+    global _upload_pool, _upload_pool_pid
+    with _upload_pool_lock:
+        if _upload_pool is None or _upload_pool_pid != os.getpid():
+            _upload_pool = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'UPLOAD_WORKERS', 8),
+                thread_name_prefix='attachment-upload'
+            )
+            _upload_pool_pid = os.getpid()
+        return _upload_pool
+
+
+def image_dimensions(file) -> Tuple[Optional[int], Optional[int]]:
+    """Read width/height from the image header; the pixels are not decoded"""
+    try:
+        from PIL import Image
+
+        file.seek(0)
+        with Image.open(file) as image:
+            return image.size
+    except Exception:
+        return None, None
+    finally:
+        file.seek(0)
+
+
+def content_digest(file) -> str:
+    """sha256 of the upload, read chunk by chunk from Django's staged copy"""
+    digest = hashlib.sha256()
+    file.seek(0)
+    for chunk in file.chunks():
+        digest.update(chunk)
+    file.seek(0)
+    return digest.hexdigest()
+
+
+def _upload_one(storage, file) -> Optional[Dict]:
+    """
+    Store one attachment under the hash of its content. The reference is
+    taken before the existence check so the object cannot be collected in
+    between; identical content already in the bucket is not sent again.
+    """
+    object_name = f"{content_digest(file)}_attach.jpg"
+    width, height = image_dimensions(file)
+    content_type = getattr(file, 'content_type', None) or 'application/octet-stream'
+
+    refs = AttachmentRefDocument()
+    if not refs.acquire(object_name):
+        return None
+
+    variants = list(ATTACHMENT_VARIANTS) if width is not None else []
+    try:
+        stored = storage.stat(ATTACHMENT_BUCKET, object_name) is not None
+        if not stored and not storage.put_stream(ATTACHMENT_BUCKET, object_name, file, file.size, content_type):
+            refs.release([object_name])
+            return None
+    except Exception:
+        refs.release([object_name])
+        raise
+    if stored:
+        logger.info(f"Attachment {object_name} already stored, skipping upload")
+    elif variants:
+        file.seek(0)
+        schedule_variants(ATTACHMENT_BUCKET, object_name, file.read(), ATTACHMENT_VARIANTS)
+
+    return {
+        'object_name': object_name,
+        'url': f"{ATTACHMENT_URL_PREFIX}{object_name}",
+        'size': file.size,
+        'content_type': content_type,
+        'width': width,
+        'height': height,
+        'variants': variants,
+    }
+
+
+def upload_attachments(files) -> List[Dict]:
+    """
+    Stream uploaded files straight into object storage in parallel on the shared
+    pool. Returns the stored metadata of each attachment in the order the
+    files were given. Each returned attachment holds one reference that the
+    caller must either hand to a post or give back with `release_attachments`.
+    If any file fails, the references already taken are given back and
+    AttachmentUploadError is raised, so no post is created with missing media.
+    """
+    if not files:
+        return []
+    storage = get_storage()
+    pool = _get_upload_pool()
+    futures = [pool.submit(_upload_one, storage, file) for file in files]
+
+    attachments, failed = [], []
+    for file, future in zip(files, futures):
+        try:
+            attachment = future.result()
+        except Exception as e:
+            logger.error(f"Error uploading attachment {file.name}: {e}")
+            attachment = None
+        if attachment:
+            attachments.append(attachment)
+        else:
+            failed.append(file.name)
+    if failed:
+        release_attachments(attachments)
+        raise AttachmentUploadError(failed)
+    return attachments
+
+
+def release_attachments(attachments: List[Dict]) -> List[str]:
+    """Give back the references of attachments that ended up unused"""
+    return AttachmentRefDocument().release([attachment['object_name'] for attachment in attachments])
@@ -0,0 +1,135 @@
+import io
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional
+from django.conf import settings
+from storage import get_storage
+
+logger = logging.getLogger(__name__)
+
+IMAGE_VARIANT_SETTINGS = getattr(settings, 'IMAGE_VARIANT_SETTINGS', {})
+
+# Longest edge in pixels for each named variant
+ATTACHMENT_VARIANTS = {'feed': 640, 'detail': 1280}
+AVATAR_VARIANTS = {'sm': 64, 'md': 128, 'lg': 256}
+
+VARIANT_FORMATS = {
+    'jpg': ('JPEG', 'image/jpeg', {'quality': 82, 'optimize': True, 'progressive': True}),
+    'webp': ('WEBP', 'image/webp', {'quality': 80, 'method': 4}),
+}
+
+
+def variant_name(object_name: str, variant: str, ext: str) -> str:
+    """`abc_attach.jpg` -> `abc_attach.feed.webp`"""
+    stem = object_name.rsplit('.', 1)[0]
+    return f"{stem}.{variant}.{ext}"
+
+
+def variant_candidates(object_name: str, variant: Optional[str], accept: str, allowed: Dict) -> List[str]:
+    """Object names to try for a request, best match first, ending with the original"""
+    if variant not in allowed:
+        return [object_name]
+    candidates = []
+    if 'image/webp' in (accept or ''):
+        candidates.append(variant_name(object_name, variant, 'webp'))
+    candidates.append(variant_name(object_name, variant, 'jpg'))
+    candidates.append(object_name)
+    return candidates
+
+
+def render_variants(bucket_name: str, object_name: str, data: bytes, sizes: Dict[str, int]) -> List[str]:
+    """
+    Decode the image once and upload every size in every format. Runs in a
+    worker process, which builds its own storage driver on first use.
+    """
+    from PIL import Image, ImageOps
+
+    with Image.open(io.BytesIO(data)) as source:
+        image = ImageOps.exif_transpose(source)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+    storage = get_storage()
+    stored = []
+    for variant, edge in sizes.items():
+        resized = image.copy()
+        resized.thumbnail((edge, edge), Image.LANCZOS)
+        for ext, (fmt, content_type, options) in VARIANT_FORMATS.items():
+            frame = resized.convert('RGB') if fmt == 'JPEG' and resized.mode != 'RGB' else resized
+            buffer = io.BytesIO()
+            frame.save(buffer, fmt, **options)
+            size = buffer.tell()
+            buffer.seek(0)
+            name = variant_name(object_name, variant, ext)
+            if storage.put_stream(bucket_name, name, buffer, size, content_type):
+                stored.append(name)
+    return stored
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def _mp_context():
+    method = IMAGE_VARIANT_SETTINGS.get('start_method', 'forkserver')
+    if method not in multiprocessing.get_all_start_methods():
+        method = 'spawn'
+    return multiprocessing.get_context(method)
+
+
+def _init_process():
+    # Pool processes start from a fresh interpreter, not a copy of the worker
+    import django
+    django.setup()
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    # Forking a worker that already runs threads can copy held locks into
+    # the child, so pool processes come from a forkserver (or spawn), and a
+    # pool inherited from another pid is never reused
+    global _pool, _pool_pid
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = ProcessPoolExecutor(
+                max_workers=IMAGE_VARIANT_SETTINGS.get('workers', 2),
+                mp_context=_mp_context(),
+                initializer=_init_process,
+            )
+            _pool_pid = os.getpid()
+        return _pool
+
+
+def start_pool(timeout: float = 30):
+    """
+    Create this worker's pool and start a pool process, before the worker
+    serves requests or starts its own threads. Called from warmup.warm_worker.
+    """
+    if IMAGE_VARIANT_SETTINGS.get('enabled', True):
+        _get_pool().submit(os.getpid).result(timeout=timeout)
+
+
+def _log_result(object_name: str):
+    def done(future):
+        try:
+            logger.info(f"Stored {len(future.result())} variants of {object_name}")
+        except Exception as e:
+            logger.error(f"Error generating variants of {object_name}: {e}")
+    return done
+
+
+def schedule_variants(bucket_name: str, object_name: str, data: bytes, sizes: Dict[str, int]):
+    """Queue variant generation off the request path; failures are only logged"""
+    if not IMAGE_VARIANT_SETTINGS.get('enabled', True):
+        return
+    try:
+        future = _get_pool().submit(render_variants, bucket_name, object_name, data, sizes)
+    except Exception as e:
+        # e.g. a broken pool; the original is stored and served without variants
+        logger.error(f"Could not queue variants of {object_name}: {e}")
+        return
+    future.add_done_callback(_log_result(object_name))
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.http import require_GET
+from pymongo.errors import OperationFailure
+from accounts.api.async_auth import asgi_only, async_token_required
+from accounts.directory import user_directory
+from connection_manager import connection_manager
+from posts import async_queries
+from .serializer import PostSerializer
+from search.breaker import SEARCH_SETTINGS, is_unavailable, search_breaker
+from search.cache import async_search_flights, query_log, search_cache
+from search.documents import SOURCE_FIELDS
+from search.index import POSTS_ALIAS
+from search.pagination import asearch_pit_page, decode_search_cursor, first_state, mongo_page_state
+from .views import (
+    SEARCH_PAGE_SIZE, build_results, build_search_body, cached_hits, cursor_search_response, missing_usernames,
+    mongo_hits, raise_unless_missing_text_index, search_error, search_response, source_hits
+)
+
+logger = logging.getLogger(__name__)
+
+
+def _es_client():
+    return connection_manager.elasticsearch_async().options(
+        request_timeout=SEARCH_SETTINGS.get('timeout', 2), max_retries=0
+    )
+
+
+async def _run_search(key, query, from_index, page_size):
+    result = await _es_client().search(index=POSTS_ALIAS, body=build_search_body(query, from_index, page_size))
+    posts, total = source_hits(result['hits']['hits']), result['hits']['total']['value']
+    search_cache.set(key, posts, total)
+    return posts, total
+
+
+async def _search_elasticsearch(query, from_index, page_size):
+    """SearchPostsView.search_elasticsearch"""
+    # The generation is re-read from Mongo at most every few seconds
+    if search_cache.generation_due():
+        await sync_to_async(search_cache.generation, thread_sensitive=False)()
+    key = search_cache.key(query, from_index, page_size)
+    entry = search_cache.get(key)
+    if entry is not None:
+        if not entry['ids']:
+            return [], entry['total']
+        result = await _es_client().mget(index=POSTS_ALIAS, ids=entry['ids'], source_includes=SOURCE_FIELDS)
+        return cached_hits(entry, result['docs']), entry['total']
+    return await async_search_flights.do(key, lambda: _run_search(key, query, from_index, page_size))
+
+
+async def _search_elasticsearch_cursor(query, state, page_size):
+    body = build_search_body(query, 0, page_size)
+    hits, total, next_state = await asearch_pit_page(_es_client(), body, state, page_size)
+    return source_hits(hits), total, next_state
+
+
+async def _search_mongo_cursor(query, state, page_size):
+    try:
+        docs, total = await async_queries.search_posts(query, state['n'], page_size + 1)
+    except OperationFailure as e:
+        raise_unless_missing_text_index(e)
+        return [], 0, None
+    docs, next_state = mongo_page_state(docs, state, page_size)
+    return mongo_hits(docs), total, next_state
+
+
+async def _search_mongo(query, from_index, page_size):
+    try:
+        docs, total = await async_queries.search_posts(query, from_index, page_size)
+    except OperationFailure as e:
+        raise_unless_missing_text_index(e)
+        return [], 0
+    return mongo_hits(docs), total
+
+
+async def _with_fallback(search_es, search_mongo):
+    """SearchPostsView.with_fallback for coroutine functions"""
+    if search_breaker.allow_request():
+        try:
+            result = await search_es()
+            search_breaker.record_success()
+            return result, 'elasticsearch'
+        except Exception as e:
+            if not is_unavailable(e):
+                search_breaker.record_success()
+                raise
+            search_breaker.record_failure()
+            logger.warning(f"Elasticsearch unavailable, searching Mongo instead: {e}")
+    return await search_mongo(), 'mongo'
+
+
+@require_GET
+@asgi_only
+@async_token_required
+async def search_posts(request):
+    """
+    SearchPostsView for ASGI workers. Results come from the hits' _source;
+    the viewer's like state and any missing author names are fetched
+    concurrently afterwards.
+    """
+    query = request.GET.get('q', '')
+    try:
+        page = max(int(request.GET.get('page', 1)), 1)
+    except ValueError:
+        return JsonResponse({'error': 'Invalid page'}, status=400)
+    page_size = SEARCH_PAGE_SIZE
+    from_index = (page - 1) * page_size
+    cursor_mode = 'cursor' in request.GET
+
+    if not query:
+        return JsonResponse({'error': 'Query parameter "q" is required'}, status=400)
+    if cursor_mode:
+        cursor = request.GET.get('cursor')
+        try:
+            state = decode_search_cursor(cursor, query) if cursor else first_state()
+        except ValueError as e:
+            return JsonResponse({'error': str(e)}, status=400)
+        page = 1 if not cursor else None
+    if page == 1 and query_log.record(query, flush=False):
+        await sync_to_async(query_log.flush, thread_sensitive=False)()
+
+    try:
+        if cursor_mode:
+            (posts, total, next_state), engine = await _with_fallback(
+                lambda: _search_elasticsearch_cursor(query, state, page_size),
+                lambda: _search_mongo_cursor(query, state, page_size),
+            )
+        else:
+            (posts, total), engine = await _with_fallback(
+                lambda: _search_elasticsearch(query, from_index, page_size),
+                lambda: _search_mongo(query, from_index, page_size),
+            )
+
+        usernames, liked = await asyncio.gather(
+            user_directory.aget_usernames(missing_usernames(posts)),
+            async_queries.liked_post_ids(request.user.id, [post['id'] for post in posts]),
+        )
+        serializer = PostSerializer(build_results(posts, liked, usernames), many=True)
+        if cursor_mode:
+            return JsonResponse(cursor_search_response(serializer.data, total, page_size, query, engine, next_state))
+        return JsonResponse(search_response(serializer.data, total, page, page_size, query, engine))
+
+    except Exception as e:
+        error, error_status = search_error(e)
+        return JsonResponse(error, status=error_status)
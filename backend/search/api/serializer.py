@@ -33,6 +33,7 @@ class PostSerializer(serializers.Serializer):
     )
 
     like_count = serializers.IntegerField(read_only=True)
+    comment_count = serializers.IntegerField(read_only=True)
     created_at = serializers.DateTimeField(read_only=True)
     deleted = serializers.BooleanField(read_only=True)
     username = serializers.CharField(read_only=True)
@@ -1,6 +1,9 @@
 from django.urls import path
-from .views import SearchPostsView
+from .async_views import search_posts
+from .views import SearchPostsView, SuggestView
 
 urlpatterns = [
     path('search/', SearchPostsView.as_view(), name='search-posts'),
+    path('search/suggest/', SuggestView.as_view(), name='search-suggest'),
+    path('async/search/', search_posts, name='async-search-posts'),
 ]
\ No newline at end of file
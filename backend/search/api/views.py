@@ -1,196 +1,436 @@
-import os
 import sys
 import logging
-import requests
+from urllib.parse import quote
+from pymongo.errors import OperationFailure
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
-from elasticsearch import Elasticsearch
-from elasticsearch.exceptions import ConnectionError, RequestError
-from bson import ObjectId
-from django.contrib.auth.models import User
 
 sys.path.append('/app')
 
-from mongo_api import get_mongo_client
-from posts.models import PostDocument
+from connection_manager import connection_manager
+from posts.models import LikeDocument, PostDocument
+from accounts.directory import user_directory
+from search.breaker import SEARCH_SETTINGS, is_unavailable, search_breaker
+from search.cache import query_log, search_cache, search_flights
+from search.documents import SOURCE_FIELDS
+from search.index import POSTS_ALIAS
+from search.pagination import (
+    decode_search_cursor, encode_search_cursor, first_state, mongo_page_state, search_pit_page
+)
 from .serializer import PostSerializer
 
 logger = logging.getLogger(__name__)
 
+SEARCH_PAGE_SIZE = 10
+SUGGEST_DEFAULT_SIZE = 5
+SUGGEST_MAX_SIZE = 10
+# Completion inputs are cut at 50 characters, so longer prefixes never match
+SUGGEST_MAX_PREFIX = 50
+# Response key -> completion field under `suggest` in the posts mapping
+SUGGEST_FIELDS = {'phrases': 'phrase', 'hashtags': 'hashtag', 'users': 'user'}
+
+def build_search_body(query, from_index, page_size):
+    """
+    Elasticsearch request body for one page of post search results. Prefix
+    and infix matches go to the edge n-gram and trigram subfields declared
+    in search.index rather than to wildcard queries.
+    """
+    return {
+        "from": from_index,
+        "size": page_size,
+        "_source": SOURCE_FIELDS,
+        "query": {
+            "bool": {
+                "should": [
+                    {
+                        "match_phrase": {
+                            "content.text": {
+                                "query": query,
+                                "boost": 3.0
+                            }
+                        }
+                    },
+                    {
+                        "match": {
+                            "content.text.prefix": {
+                                "query": query,
+                                "operator": "and",
+                                "boost": 2.0
+                            }
+                        }
+                    },
+                    {
+                        "match": {
+                            "content.text": {
+                                "query": query,
+                                "fuzziness": "AUTO",
+                                "boost": 1.5
+                            }
+                        }
+                    },
+                    {
+                        "match": {
+                            "content.text.ngram": {
+                                "query": query,
+                                "minimum_should_match": "75%",
+                                "boost": 1.0
+                            }
+                        }
+                    }
+                ],
+                "minimum_should_match": 1,
+                # Deletions reach the index as a flag through the sync job
+                "filter": [{"term": {"deleted": False}}]
+            }
+        },
+        "sort": [
+            {"_score": {"order": "desc"}},
+            {"created_at": {"order": "desc"}}
+        ],
+        "highlight": {
+            "fields": {
+                "content.text": {
+                    "pre_tags": ["<mark>"],
+                    "post_tags": ["</mark>"],
+                    "fragment_size": 150,
+                    "number_of_fragments": 3
+                }
+            }
+        }
+    }
+
+
+def source_hits(hits):
+    """Posts in hit order, read from the indexed documents, with their highlights"""
+    posts = []
+    for hit in hits:
+        post_data = hit.get('_source', {})
+        post_data['id'] = hit['_id']
+        post_data['highlight'] = hit.get('highlight', {})
+        posts.append(post_data)
+    return posts
+
+
+def cached_hits(entry, docs):
+    """
+    Posts for a cached page from an mget of its ids, in the cached order
+    with the cached highlights. Documents gone or deleted since are dropped.
+    """
+    by_id = {doc['_id']: doc.get('_source', {}) for doc in docs if doc.get('found')}
+    posts = []
+    for post_id in entry['ids']:
+        post_data = by_id.get(post_id)
+        if post_data is None or post_data.get('deleted'):
+            continue
+        post_data['id'] = post_id
+        post_data['highlight'] = entry['highlights'].get(post_id, {})
+        posts.append(post_data)
+    return posts
+
+
+def raise_unless_missing_text_index(e):
+    """
+    Re-raise a Mongo fallback failure unless it is the content_text index
+    missing (prepare_cluster creates it; a server started another way may
+    not have), in which case the fallback serves no results.
+    """
+    if not isinstance(e, OperationFailure) or e.code != 27:
+        raise e
+    logger.error(f"Mongo text index missing, search fallback returns no results: {e}")
+
+
+def missing_usernames(posts):
+    """Author ids of results that do not carry a username (Mongo fallback, posts not yet backfilled)"""
+    return [post.get('user_id') for post in posts if post.get('user_id') and not post.get('username')]
+
+
+def build_results(posts, liked, usernames=None):
+    """Search hits with their author and like state"""
+    usernames = usernames or {}
+    processed_posts = []
+    for post in posts:
+        user_id = post.get('user_id')
+        username = None
+        if user_id:
+            username = post.get('username') or usernames.get(user_id) or f"User {user_id}"
+        
+        is_liked = post.get('id') in liked
+        like_count = post.get('like_count', 0)
+        
+        processed_post = {
+            'id': post.get('id', ''),
+            'user_id': user_id,
+            'username': username,
+            'content': post.get('content', {}),
+            'comments': post.get('comments', []),
+            'like_count': like_count,
+            'comment_count': post.get('comment_count', 0),
+            'is_liked': is_liked,
+            'created_at': post.get('created_at', ''),
+            'deleted': post.get('deleted', False),
+            'medias': post.get('content', {}).get('medias', []),
+            'highlight': post.get('highlight', {})
+        }
+        
+        processed_posts.append(processed_post)
+    return processed_posts
+
+
+def search_error(e):
+    """Error body and status for an exception raised while searching"""
+    # Imported here so workers that never search do not load the client
+    from elasticsearch.exceptions import ConnectionError, RequestError
+
+    if isinstance(e, ConnectionError):
+        logger.error(f"Elasticsearch connection error: {str(e)}")
+        return {'error': 'Search service is temporarily unavailable. Please try again later.'}, status.HTTP_503_SERVICE_UNAVAILABLE
+    if isinstance(e, RequestError):
+        logger.error(f"Elasticsearch request error: {str(e)}")
+        return {'error': 'Invalid search query. Please try a different query.'}, status.HTTP_400_BAD_REQUEST
+    logger.error(f"Search error: {str(e)}", exc_info=True)
+    return {'error': 'An unexpected error occurred. Please try again later.'}, status.HTTP_500_INTERNAL_SERVER_ERROR
+
+
+def mongo_hits(docs):
+    """Mongo text-search results shaped like hydrated Elasticsearch hits"""
+    posts = []
+    for doc in docs:
+        doc.pop('score', None)
+        doc['id'] = str(doc.pop('_id'))
+        doc['highlight'] = {}
+        posts.append(doc)
+    return posts
+
+
+def build_suggest_body(prefix, size):
+    """Completion suggestions only: no hits, no _source, no scoring"""
+    return {
+        "size": 0,
+        "_source": False,
+        "suggest": {
+            name: {
+                "prefix": prefix,
+                "completion": {"field": f"suggest.{field}", "size": size, "skip_duplicates": True}
+            }
+            for name, field in SUGGEST_FIELDS.items()
+        }
+    }
+
+
+def suggest_response(result, query):
+    suggestions = {
+        name: [option['text'] for entry in result.get('suggest', {}).get(name, []) for option in entry['options']]
+        for name in SUGGEST_FIELDS
+    }
+    return dict(suggestions, query=query)
+
+
+def search_response(results, total, page, page_size, query, engine):
+    return {
+        'results': results,
+        'total': total,
+        'page': page,
+        'page_size': page_size,
+        'has_next': page * page_size < total,
+        'query': query,
+        'engine': engine
+    }
+
+
+def cursor_search_response(results, total, page_size, query, engine, next_state):
+    """search_response for cursor mode; the cursor replaces page numbers"""
+    next_cursor = encode_search_cursor(query, next_state) if next_state else None
+    return {
+        'results': results,
+        'total': total,
+        'page_size': page_size,
+        'has_next': next_cursor is not None,
+        'next': f"?q={quote(query)}&cursor={next_cursor}" if next_cursor else None,
+        'next_cursor': next_cursor,
+        'query': query,
+        'engine': engine
+    }
+
+
 class SearchPostsView(APIView):
+    """
+    Full-text post search on Elasticsearch. While the search breaker is
+    open (Elasticsearch failing or unreachable) results come from the Mongo
+    text index instead; `engine` in the response says which one answered.
+
+    `?page=N` pages with from/size. Passing `cursor` (empty for the first
+    page) switches to search_after over a point in time; each response
+    then carries the `next_cursor` to send back.
+    """
+
+    @staticmethod
+    def es_client():
+        return connection_manager.elasticsearch().options(
+            request_timeout=SEARCH_SETTINGS.get('timeout', 2), max_retries=0
+        )
+
+    def search_elasticsearch(self, query, from_index, page_size):
+        """
+        A cached page costs an mget of its ids. On a miss, concurrent
+        requests for the same page share a single search.
+        """
+        key = search_cache.key(query, from_index, page_size)
+        entry = search_cache.get(key)
+        if entry is not None:
+            if not entry['ids']:
+                return [], entry['total']
+            result = self.es_client().mget(index=POSTS_ALIAS, ids=entry['ids'], source_includes=SOURCE_FIELDS)
+            return cached_hits(entry, result['docs']), entry['total']
+        return search_flights.do(key, lambda: self.run_search(key, query, from_index, page_size))
+
+    def run_search(self, key, query, from_index, page_size):
+        """One request; the page is built from the hits' _source"""
+        logger.info(f"Performing search for query: {query}")
+        result = self.es_client().search(index=POSTS_ALIAS, body=build_search_body(query, from_index, page_size))
+        logger.info(f"Search completed, found {result['hits']['total']['value']} results")
+        posts, total = source_hits(result['hits']['hits']), result['hits']['total']['value']
+        search_cache.set(key, posts, total)
+        return posts, total
+
+    def search_mongo(self, query, from_index, page_size):
+        post_doc = PostDocument()
+        try:
+            docs = post_doc.search_posts(query, from_index, page_size)
+            return mongo_hits(docs), post_doc.count_search_results(query)
+        except OperationFailure as e:
+            raise_unless_missing_text_index(e)
+            return [], 0
+
+    @staticmethod
+    def with_fallback(search_es, search_mongo):
+        """search_es() unless the breaker is open or it finds Elasticsearch down, else search_mongo()"""
+        if search_breaker.allow_request():
+            try:
+                result = search_es()
+                search_breaker.record_success()
+                return result, 'elasticsearch'
+            except Exception as e:
+                if not is_unavailable(e):
+                    search_breaker.record_success()
+                    raise
+                search_breaker.record_failure()
+                logger.warning(f"Elasticsearch unavailable, searching Mongo instead: {e}")
+        return search_mongo(), 'mongo'
+
+    def search(self, query, from_index, page_size):
+        (posts, total), engine = self.with_fallback(
+            lambda: self.search_elasticsearch(query, from_index, page_size),
+            lambda: self.search_mongo(query, from_index, page_size),
+        )
+        return posts, total, engine
+
+    def search_elasticsearch_cursor(self, query, state, page_size):
+        body = build_search_body(query, 0, page_size)
+        hits, total, next_state = search_pit_page(self.es_client(), body, state, page_size)
+        return source_hits(hits), total, next_state
+
+    def search_mongo_cursor(self, query, state, page_size):
+        post_doc = PostDocument()
+        try:
+            docs, next_state = mongo_page_state(post_doc.search_posts(query, state['n'], page_size + 1), state, page_size)
+            return mongo_hits(docs), post_doc.count_search_results(query), next_state
+        except OperationFailure as e:
+            raise_unless_missing_text_index(e)
+            return [], 0, None
+
+    def search_cursor(self, query, state, page_size):
+        """Cursor mode: bypasses the result cache, which is keyed by offset"""
+        (posts, total, next_state), engine = self.with_fallback(
+            lambda: self.search_elasticsearch_cursor(query, state, page_size),
+            lambda: self.search_mongo_cursor(query, state, page_size),
+        )
+        return posts, total, engine, next_state
+
     def get(self, request):
         query = request.GET.get('q', '')
-        page = int(request.GET.get('page', 1))
-        page_size = 10
+        try:
+            page = max(int(request.GET.get('page', 1)), 1)
+        except ValueError:
+            return Response({'error': 'Invalid page'}, status=status.HTTP_400_BAD_REQUEST)
+        page_size = SEARCH_PAGE_SIZE
         from_index = (page - 1) * page_size
+        cursor_mode = 'cursor' in request.GET
         
         if not query:
             return Response({'error': 'Query parameter "q" is required'}, status=status.HTTP_400_BAD_REQUEST)
+        if cursor_mode:
+            cursor = request.GET.get('cursor')
+            try:
+                state = decode_search_cursor(cursor, query) if cursor else first_state()
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            page = 1 if not cursor else None
+        if page == 1:
+            query_log.record(query)
         
         try:
-            es_host = os.getenv('ELASTIC_URL', 'elasticsearch')
-            es_port = os.getenv('ELASTIC_PORT', '9200')
-            es_url = f"http://{es_host}:{es_port}"
-            
-            es_client = Elasticsearch(
-                hosts=[es_url],
-                headers={
-                    'Content-Type': 'application/vnd.elasticsearch+json; compatible-with=8',
-                    'Accept': 'application/vnd.elasticsearch+json; compatible-with=8'
-                },
-                max_retries=3,
-                retry_on_timeout=True
-            )
+            if cursor_mode:
+                posts, total, engine, next_state = self.search_cursor(query, state, page_size)
+            else:
+                posts, total, engine = self.search(query, from_index, page_size)
             
-            logger.info("Testing Elasticsearch connection...")
             try:
-                health_response = requests.get(f"{es_url}/_cluster/health", timeout=10)
-                if health_response.status_code != 200:
-                    logger.error(f"Cannot connect to Elasticsearch, status code: {health_response.status_code}")
-                    return Response({'error': 'Search service is temporarily unavailable. Please try again later.'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
-                logger.info("Elasticsearch connection successful")
+                usernames = user_directory.get_usernames(missing_usernames(posts))
             except Exception as e:
-                logger.error(f"Cannot connect to Elasticsearch: {str(e)}")
-                return Response({'error': 'Search service is temporarily unavailable. Please try again later.'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
-            
-            search_body = {
-                "from": from_index,
-                "size": page_size,
-                "query": {
-                    "bool": {
-                        "should": [
-                            {
-                                "match_phrase": {
-                                    "content.text": {
-                                        "query": query,
-                                        "boost": 3.0
-                                    }
-                                }
-                            },
-                            {
-                                "wildcard": {
-                                    "content.text": {
-                                        "value": f"*{query.lower()}*",
-                                        "boost": 2.0,
-                                        "case_insensitive": True
-                                    }
-                                }
-                            },
-                            {
-                                "match": {
-                                    "content.text": {
-                                        "query": query,
-                                        "fuzziness": "AUTO",
-                                        "boost": 1.5
-                                    }
-                                }
-                            },
-                            {
-                                "match": {
-                                    "content.text.ngram": {
-                                        "query": query,
-                                        "boost": 1.0
-                                    }
-                                }
-                            }
-                        ],
-                        "minimum_should_match": 1
-                    }
-                },
-                "sort": [
-                    {"_score": {"order": "desc"}},
-                    {"created_at": {"order": "desc"}}
-                ],
-                "highlight": {
-                    "fields": {
-                        "content.text": {
-                            "pre_tags": ["<mark>"],
-                            "post_tags": ["</mark>"],
-                            "fragment_size": 150,
-                            "number_of_fragments": 3
-                        }
-                    }
-                }
-            }
-            
-            logger.info(f"Performing search for query: {query}")
-            result = es_client.search(index="posts", body=search_body)
-            logger.info(f"Search completed, found {result['hits']['total']['value']} results")
-            
-            post_ids = [hit['_id'] for hit in result['hits']['hits']]
-            highlights = {hit['_id']: hit.get('highlight', {}) for hit in result['hits']['hits']}
-            logger.info(f"Extracted {len(post_ids)} post IDs from search results")
-            
-            post_doc = PostDocument()
-            posts = []
-            
-            if post_ids:
-                object_ids = [ObjectId(post_id) for post_id in post_ids]
-                posts_cursor = post_doc.collection.find({'_id': {'$in': object_ids}})
-                posts_dict = {str(post['_id']): post for post in posts_cursor}
-                
-                for post_id in post_ids:
-                    if post_id in posts_dict:
-                        post_data = posts_dict[post_id]
-                        post_data['id'] = str(post_data.pop('_id', post_id))
-                        post_data['highlight'] = highlights.get(post_id, {})
-                        posts.append(post_data)
-                
-                logger.info(f"Found {len(posts)} posts in MongoDB")
-            
-            processed_posts = []
-            for post in posts:
-                user_id = post.get('user_id')
-                username = None
-                if user_id:
-                    try:
-                        user = User.objects.filter(id=user_id).values_list('username', flat=True).first()
-                        username = user if user else f"User {user_id}"
-                    except Exception as e:
-                        logger.error(f"Error fetching username for user_id {user_id}: {str(e)}")
-                        username = f"User {user_id}"
-                
-                likes = post.get('likes', [])
-                is_liked = request.user.id in likes if hasattr(request.user, 'id') else False
-                like_count = len(likes)
-                
-                processed_post = {
-                    'id': post.get('id', ''),
-                    'user_id': user_id,
-                    'username': username,
-                    'content': post.get('content', {}),
-                    'comments': post.get('comments', []),
-                    'likes': likes,
-                    'like_count': like_count,
-                    'is_liked': is_liked,
-                    'created_at': post.get('created_at', ''),
-                    'deleted': post.get('deleted', False),
-                    'medias': post.get('content', {}).get('medias', []),
-                    'highlight': post.get('highlight', {})
-                }
-                
-                processed_posts.append(processed_post)
-            
+                logger.error(f"Error fetching usernames for search results: {str(e)}")
+                usernames = {}
+
+            liked = LikeDocument().liked_post_ids(
+                getattr(request.user, 'id', None), [post['id'] for post in posts]
+            )
+
+            processed_posts = build_results(posts, liked, usernames)
             serializer = PostSerializer(processed_posts, many=True)
             
-            response_data = {
-                'results': serializer.data,
-                'total': result['hits']['total']['value'],
-                'page': page,
-                'page_size': page_size,
-                'has_next': page * page_size < result['hits']['total']['value'],
-                'query': query  
-            }
-            
+            if cursor_mode:
+                response_data = cursor_search_response(serializer.data, total, page_size, query, engine, next_state)
+            else:
+                response_data = search_response(serializer.data, total, page, page_size, query, engine)
             return Response(response_data, status=status.HTTP_200_OK)
             
-        except ConnectionError as e:
-            logger.error(f"Elasticsearch connection error: {str(e)}")
-            return Response({'error': 'Search service is temporarily unavailable. Please try again later.'}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
-        except RequestError as e:
-            logger.error(f"Elasticsearch request error: {str(e)}")
-            return Response({'error': 'Invalid search query. Please try a different query.'}, status=status.HTTP_400_BAD_REQUEST)
         except Exception as e:
-            logger.error(f"Search error: {str(e)}", exc_info=True)
-            return Response({'error': 'An unexpected error occurred. Please try again later.'}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
\ No newline at end of file
+            error, error_status = search_error(e)
+            return Response(error, status=error_status)
+
+
+class SuggestView(APIView):
+    """
+    Typeahead for the search box: phrase, hashtag and username completions
+    from the completion fields of the posts index. Suggestions are a
+    nice-to-have, so while Elasticsearch is unavailable the lists are empty
+    instead of falling back to Mongo.
+    """
+
+    def get(self, request):
+        query = request.GET.get('q', '').strip()[:SUGGEST_MAX_PREFIX]
+        if not query:
+            return Response({'error': 'Query parameter "q" is required'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            size = min(max(int(request.GET.get('size', SUGGEST_DEFAULT_SIZE)), 1), SUGGEST_MAX_SIZE)
+        except ValueError:
+            return Response({'error': 'Invalid size'}, status=status.HTTP_400_BAD_REQUEST)
+
+        empty = suggest_response({}, query)
+        if not search_breaker.allow_request():
+            return Response(empty, status=status.HTTP_200_OK)
+        try:
+            es_client = connection_manager.elasticsearch().options(
+                request_timeout=SEARCH_SETTINGS.get('suggest_timeout', 0.5), max_retries=0
+            )
+            result = es_client.search(index=POSTS_ALIAS, body=build_suggest_body(query, size))
+            search_breaker.record_success()
+            return Response(suggest_response(result, query), status=status.HTTP_200_OK)
+        except Exception as e:
+            if is_unavailable(e):
+                search_breaker.record_failure()
+                logger.warning(f"Elasticsearch unavailable, no suggestions: {e}")
+                return Response(empty, status=status.HTTP_200_OK)
+            search_breaker.record_success()
+            error, error_status = search_error(e)
+            return Response(error, status=error_status)
@@ -0,0 +1,79 @@
+import logging
+import threading
+import time
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+SEARCH_SETTINGS = getattr(settings, 'SEARCH_SETTINGS', {})
+
+
+class CircuitBreaker:
+    """
+    Tracks the health of a dependency from the outcome of real calls, so
+    no request has to probe it first. After `failure_threshold` consecutive
+    failures the breaker opens and callers skip the dependency; once
+    `reset_timeout` seconds have passed, a single trial call is let through
+    and its outcome closes or re-opens the breaker.
+    """
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half_open'
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    def allow_request(self) -> bool:
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            now = time.monotonic()
+            if now - self._opened_at >= self.reset_timeout:
+                # This caller is the trial; others keep skipping until it
+                # reports back, or until another timeout if it never does
+                self._state = self.HALF_OPEN
+                self._opened_at = now
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self._state != self.CLOSED:
+                logger.info(f"Circuit {self.name} closed")
+            self._state = self.CLOSED
+            self._failures = 0
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self._state != self.OPEN:
+                    logger.warning(f"Circuit {self.name} opened after {self._failures} failure(s)")
+                self._state = self.OPEN
+                self._opened_at = time.monotonic()
+
+
+search_breaker = CircuitBreaker(
+    'elasticsearch',
+    failure_threshold=SEARCH_SETTINGS.get('breaker_failure_threshold', 5),
+    reset_timeout=SEARCH_SETTINGS.get('breaker_reset_timeout', 30),
+)
+
+
+def is_unavailable(e: Exception) -> bool:
+    """Whether an Elasticsearch error means the cluster cannot serve searches"""
+    from elasticsearch.exceptions import ApiError, TransportError
+
+    if isinstance(e, TransportError):
+        return True
+    return isinstance(e, ApiError) and e.meta.status >= 500
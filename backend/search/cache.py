@@ -0,0 +1,193 @@
+import asyncio
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from accounts.directory import LRUTTLCache
+from posts.models import CounterDocument, SearchQueryDocument
+from search.breaker import SEARCH_SETTINGS
+
+logger = logging.getLogger(__name__)
+
+
+def normalize_query(query: str) -> str:
+    """Case and whitespace do not change what the analyzers see"""
+    return ' '.join(query.lower().split())
+
+
+class SearchResultCache:
+    """
+    Per-worker cache of search pages keyed by normalized query and page. An
+    entry holds the hit ids, their highlights and the total, never the
+    documents: counts and author names are read fresh for every request.
+    Keys include the search generation the sync job bumps whenever it
+    indexes or deletes posts, so a change in what searches match retires
+    every cached page at once.
+    The generation is re-read at most every `generation_check_interval`
+    seconds.
+    """
+
+    def __init__(self, max_entries: int = 5000, ttl: float = 60.0, generation_check_interval: float = 5.0):
+        self._cache = LRUTTLCache(max_entries=max_entries, ttl=ttl)
+        self.generation_check_interval = generation_check_interval
+        self._generation = 0
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    def generation_due(self) -> bool:
+        """Whether the next generation() call reads Mongo"""
+        return self._checked_at is None or time.monotonic() - self._checked_at >= self.generation_check_interval
+
+    def generation(self) -> int:
+        if not self.generation_due():
+            return self._generation
+        now = time.monotonic()
+        with self._lock:
+            if self._checked_at is None or now - self._checked_at >= self.generation_check_interval:
+                try:
+                    self._generation = CounterDocument().get(CounterDocument.SEARCH_GENERATION_KEY) or 0
+                except Exception as e:
+                    logger.warning(f"Could not read the search generation: {e}")
+                self._checked_at = now
+        return self._generation
+
+    def key(self, query: str, from_index: int, page_size: int) -> tuple:
+        return (self.generation(), normalize_query(query), from_index, page_size)
+
+    def get(self, key: tuple) -> Optional[Dict[str, Any]]:
+        return self._cache.get_many([key]).get(key)
+
+    def set(self, key: tuple, posts: List[Dict], total: int):
+        self._cache.set_many({key: {
+            'ids': [post['id'] for post in posts],
+            'highlights': {post['id']: post.get('highlight', {}) for post in posts},
+            'total': total,
+        }})
+
+    def clear(self):
+        self._cache.clear()
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key into one: the first caller
+    runs `fn`, the others wait for and share its result or exception.
+    """
+
+    def __init__(self):
+        self._calls: Dict[Any, _Call] = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn: Callable):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+
+class AsyncSingleFlight:
+    """SingleFlight for coroutines; calls are shared within one event loop"""
+
+    def __init__(self):
+        self._calls: Dict[Any, asyncio.Future] = {}
+
+    async def do(self, key, fn: Callable):
+        loop = asyncio.get_running_loop()
+        flight_key = (id(loop), key)
+        future = self._calls.get(flight_key)
+        if future is not None:
+            # A waiter being cancelled must not cancel the shared call
+            return await asyncio.shield(future)
+
+        future = self._calls[flight_key] = loop.create_future()
+        try:
+            result = await fn()
+            future.set_result(result)
+            return result
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieved here so an unshared failure is not reported as unhandled
+            future.exception()
+            raise
+        finally:
+            del self._calls[flight_key]
+            if not future.done():
+                future.cancel()
+
+
+class QueryLog:
+    """
+    Counts normalized queries in memory and adds them to the search_queries
+    collection at most every `flush_interval` seconds, from whichever
+    request finds the interval elapsed.
+    """
+
+    def __init__(self, flush_interval: float = 10.0):
+        self.flush_interval = flush_interval
+        self._counts = Counter()
+        self._flushed_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def record(self, query: str, flush: bool = True) -> bool:
+        """Count a query; returns whether a flush is due (async callers run it themselves)"""
+        with self._lock:
+            self._counts[normalize_query(query)] += 1
+            due = time.monotonic() - self._flushed_at >= self.flush_interval
+        if due and flush:
+            self.flush()
+        return due
+
+    def flush(self) -> int:
+        with self._lock:
+            counts, self._counts = dict(self._counts), Counter()
+            self._flushed_at = time.monotonic()
+        try:
+            return SearchQueryDocument().record_many(counts)
+        except Exception as e:
+            logger.warning(f"Could not write {len(counts)} search query counts: {e}")
+            return 0
+
+    @staticmethod
+    def top(limit: int = 20) -> List[str]:
+        window = timedelta(days=SEARCH_SETTINGS.get('query_log_window_days', 7))
+        return SearchQueryDocument().top(limit, datetime.utcnow() - window)
+
+
+search_cache = SearchResultCache(
+    max_entries=SEARCH_SETTINGS.get('cache_max_entries', 5000),
+    ttl=SEARCH_SETTINGS.get('cache_ttl', 60),
+    generation_check_interval=SEARCH_SETTINGS.get('generation_check_interval', 5),
+)
+search_flights = SingleFlight()
+async_search_flights = AsyncSingleFlight()
+query_log = QueryLog(flush_interval=SEARCH_SETTINGS.get('query_log_flush_interval', 10))
+atexit.register(query_log.flush)
@@ -0,0 +1,104 @@
+"""
+Search documents built from Mongo posts. Each carries everything a search
+result renders (author name, counts, media URLs), so a search page is
+served from Elasticsearch `_source` without hydrating from Mongo or
+Postgres. Django-free, for the sync cron job.
+"""
+import re
+from datetime import datetime
+from typing import Any, Dict, List
+
+from bson import ObjectId
+
+# Fields that change after a post is created; the sync job sends only these
+# for posts it has already indexed
+MUTABLE_FIELDS = ('username', 'like_count', 'comment_count', 'deleted', 'suggest')
+
+HASHTAG_RE = re.compile(r'#\w+')
+# Phrase suggestions start at each of the first few words of a post, so a
+# prefix typed from the middle of a sentence still completes
+PHRASE_START_WORDS = 10
+# Completion inputs longer than this are cut by the field anyway
+PHRASE_MAX_LENGTH = 50
+
+# `_source` filter for search requests: what build_results reads
+SOURCE_FIELDS: List[str] = [
+    'user_id', 'username', 'content.text', 'content.medias',
+    'like_count', 'comment_count', 'created_at', 'deleted',
+]
+
+
+def _json_value(value):
+    if isinstance(value, ObjectId):
+        return str(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def suggest_inputs(post: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Completion inputs for the suggest endpoint. Phrases and hashtags are
+    weighted by likes so popular posts complete first; deleted posts
+    contribute nothing.
+    """
+    if post.get('deleted'):
+        return {'phrase': [], 'hashtag': [], 'user': []}
+
+    text = (post.get('content') or {}).get('text', '')
+    weight = max(post.get('like_count', 0), 0) + 1
+    words = text.split()
+    phrases = {
+        ' '.join(words[start:])[:PHRASE_MAX_LENGTH].strip()
+        for start in range(min(len(words), PHRASE_START_WORDS))
+        if not words[start].startswith('#')
+    }
+    hashtags = {tag.lower() for tag in HASHTAG_RE.findall(text)}
+    username = post.get('username')
+    phrases = sorted(phrase for phrase in phrases if phrase)
+    return {
+        'phrase': {'input': phrases, 'weight': weight} if phrases else [],
+        'hashtag': {'input': sorted(hashtags), 'weight': weight} if hashtags else [],
+        'user': [username] if username else [],
+    }
+
+
+def search_document(post: Dict[str, Any]) -> Dict[str, Any]:
+    """The indexed form of a Mongo post"""
+    content = post.get('content') or {}
+    return {
+        'user_id': post.get('user_id'),
+        'username': post.get('username'),
+        'content': {
+            'text': content.get('text', ''),
+            'medias': content.get('medias', []),
+        },
+        'like_count': post.get('like_count', 0),
+        'comment_count': post.get('comment_count', 0),
+        'created_at': _json_value(post.get('created_at')),
+        'deleted': post.get('deleted', False),
+        'is_comment': post.get('is_comment', False),
+        'parent_id': _json_value(post.get('parent_id')),
+        'root_id': _json_value(post.get('root_id')),
+        'suggest': suggest_inputs(post),
+    }
+
+
+def index_action(post: Dict[str, Any], index: str) -> Dict[str, Any]:
+    """Bulk action writing the whole document, for posts new since the last sync"""
+    return {'_index': index, '_id': str(post['_id']), '_source': search_document(post)}
+
+
+def update_action(post: Dict[str, Any], index: str) -> Dict[str, Any]:
+    """
+    Bulk action sending only the mutable fields. The full document is the
+    upsert, for posts that changed before they were ever indexed.
+    """
+    document = search_document(post)
+    return {
+        '_op_type': 'update',
+        '_index': index,
+        '_id': str(post['_id']),
+        'doc': {field: document[field] for field in MUTABLE_FIELDS},
+        'upsert': document,
+    }
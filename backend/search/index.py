@@ -0,0 +1,210 @@
+"""
+Mapping for the posts search index.
+
+Documents live in a versioned index (posts_v<N>) behind the `posts` alias,
+which is what searches and the sync job address. Changing an analyzer or a
+field type means bumping POSTS_INDEX_VERSION and running
+`manage.py apply_search_index`, which builds the new index, copies the
+documents across and moves the alias in one step. The copy carries the old
+`_source` only: fields a new version derives from the post (such as the
+v3 suggest inputs) are filled in by running
+`manage.py backfill_search_fields --all` and letting the sync job resend
+every post.
+
+Kept free of Django imports so the sync cron job can use it.
+"""
+import logging
+from typing import Any, Dict, List
+
+logger = logging.getLogger(__name__)
+
+POSTS_ALIAS = 'posts'
+POSTS_TEMPLATE = 'posts'
+POSTS_INDEX_VERSION = 3
+
+POSTS_SETTINGS: Dict[str, Any] = {
+    'number_of_shards': 1,
+    'analysis': {
+        'tokenizer': {
+            # Trigrams serve infix matches ("ello" in "hello") that used to
+            # need a leading wildcard
+            'post_ngram': {
+                'type': 'ngram',
+                'min_gram': 3,
+                'max_gram': 3,
+                'token_chars': ['letter', 'digit'],
+            },
+            # Word prefixes, for results while the last word is still being typed
+            'post_edge_ngram': {
+                'type': 'edge_ngram',
+                'min_gram': 2,
+                'max_gram': 20,
+                'token_chars': ['letter', 'digit'],
+            },
+        },
+        'analyzer': {
+            'post_text': {
+                'type': 'custom',
+                'tokenizer': 'standard',
+                'filter': ['lowercase', 'asciifolding'],
+            },
+            'post_ngram': {
+                'type': 'custom',
+                'tokenizer': 'post_ngram',
+                'filter': ['lowercase', 'asciifolding'],
+            },
+            'post_edge_ngram': {
+                'type': 'custom',
+                'tokenizer': 'post_edge_ngram',
+                'filter': ['lowercase', 'asciifolding'],
+            },
+        },
+    },
+}
+
+POSTS_MAPPINGS: Dict[str, Any] = {
+    # Post content is free-form JSON; only the fields below are indexed, the
+    # rest is kept in _source without growing the mapping
+    'dynamic': False,
+    '_meta': {'version': POSTS_INDEX_VERSION},
+    'properties': {
+        'user_id': {'type': 'long'},
+        'username': {'type': 'keyword'},
+        'is_comment': {'type': 'boolean'},
+        'deleted': {'type': 'boolean'},
+        'parent_id': {'type': 'keyword'},
+        'root_id': {'type': 'keyword'},
+        'like_count': {'type': 'integer'},
+        'comment_count': {'type': 'integer'},
+        'created_at': {'type': 'date'},
+        'content': {
+            'properties': {
+                'text': {
+                    'type': 'text',
+                    'analyzer': 'post_text',
+                    # Offsets in the postings let the highlighter skip
+                    # re-analyzing each hit's text
+                    'index_options': 'offsets',
+                    'fields': {
+                        'ngram': {
+                            'type': 'text',
+                            'analyzer': 'post_ngram',
+                        },
+                        'prefix': {
+                            'type': 'text',
+                            'analyzer': 'post_edge_ngram',
+                            'search_analyzer': 'post_text',
+                        },
+                    },
+                },
+                'medias': {'type': 'keyword', 'index': False},
+            }
+        },
+        # Typeahead inputs (see search.documents.suggest_inputs); completion
+        # fields are served from an in-memory FST, without scoring the index
+        'suggest': {
+            'properties': {
+                'phrase': {'type': 'completion', 'analyzer': 'post_text'},
+                'hashtag': {'type': 'completion', 'analyzer': 'post_text'},
+                'user': {'type': 'completion', 'analyzer': 'post_text'},
+            }
+        },
+    },
+}
+
+
+def versioned_index(version: int = POSTS_INDEX_VERSION) -> str:
+    return f"{POSTS_ALIAS}_v{version}"
+
+
+def alias_targets(es) -> List[str]:
+    """Indices currently behind the posts alias"""
+    if not es.indices.exists_alias(name=POSTS_ALIAS):
+        return []
+    return sorted(es.indices.get_alias(name=POSTS_ALIAS).keys())
+
+
+def has_legacy_index(es) -> bool:
+    """True if `posts` is a concrete, dynamically mapped index rather than the alias"""
+    return not es.indices.exists_alias(name=POSTS_ALIAS) and bool(es.indices.exists(index=POSTS_ALIAS))
+
+
+def put_template(es):
+    """Install the template so a versioned index created implicitly still gets the mapping"""
+    es.indices.put_index_template(
+        name=POSTS_TEMPLATE,
+        index_patterns=[f"{POSTS_ALIAS}_v*"],
+        template={'settings': POSTS_SETTINGS, 'mappings': POSTS_MAPPINGS},
+        priority=100,
+        version=POSTS_INDEX_VERSION,
+    )
+
+
+def create_index(es, version: int = POSTS_INDEX_VERSION) -> bool:
+    """Create the versioned index; False if it already exists"""
+    index = versioned_index(version)
+    if es.indices.exists(index=index):
+        return False
+    es.indices.create(index=index, settings=POSTS_SETTINGS, mappings=POSTS_MAPPINGS)
+    return True
+
+
+def ensure_posts_index(es) -> Dict[str, Any]:
+    """
+    Cheap, idempotent setup for a cluster without the alias: install the
+    template, create the current index and point the alias at it. A legacy
+    concrete `posts` index is left alone (the alias cannot take its name);
+    apply_search_index migrates it.
+    """
+    put_template(es)
+    created = create_index(es)
+    targets = alias_targets(es)
+    legacy = has_legacy_index(es)
+    if not targets and not legacy:
+        es.indices.put_alias(index=versioned_index(), name=POSTS_ALIAS, is_write_index=True)
+        targets = [versioned_index()]
+    elif legacy:
+        logger.warning(
+            f"'{POSTS_ALIAS}' is a dynamically mapped index; run `manage.py apply_search_index` to migrate it"
+        )
+    return {'created': created, 'alias': targets, 'legacy': legacy}
+
+
+def migrate_posts_index(es, reindex: bool = True, delete_old: bool = False) -> Dict[str, Any]:
+    """
+    Move the alias onto the current versioned index, copying documents from
+    whatever it pointed at before (older versions or a legacy concrete index).
+    """
+    new_index = versioned_index()
+    put_template(es)
+    created = create_index(es)
+
+    legacy = has_legacy_index(es)
+    sources = [POSTS_ALIAS] if legacy else [index for index in alias_targets(es) if index != new_index]
+
+    copied = 0
+    if reindex and sources:
+        # Large copies outlive the default request timeout
+        result = es.options(request_timeout=3600).reindex(
+            source={'index': sources},
+            dest={'index': new_index},
+            wait_for_completion=True,
+            refresh=True,
+        )
+        copied = result.get('total', 0)
+
+    actions = [{'add': {'index': new_index, 'alias': POSTS_ALIAS, 'is_write_index': True}}]
+    if legacy:
+        # The concrete index has to go in the same call for the alias to take its name
+        actions.insert(0, {'remove_index': {'index': POSTS_ALIAS}})
+    else:
+        actions[:0] = [{'remove': {'index': index, 'alias': POSTS_ALIAS}} for index in sources]
+    es.indices.update_aliases(actions=actions)
+
+    deleted = []
+    if delete_old and not legacy:
+        for index in sources:
+            es.indices.delete(index=index)
+            deleted.append(index)
+
+    return {'index': new_index, 'created': created, 'sources': sources, 'copied': copied, 'deleted': deleted}
@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from connection_manager import connection_manager
+from search.index import (
+    POSTS_ALIAS, POSTS_INDEX_VERSION, alias_targets, has_legacy_index, migrate_posts_index, versioned_index
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Install the posts index template and move the `posts` alias onto the "
+        "current versioned index, reindexing from the previous one"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help="Only print what the alias points at and what would change",
+        )
+        parser.add_argument(
+            '--no-reindex',
+            action='store_true',
+            help="Switch the alias without copying documents (the sync job backfills an empty index)",
+        )
+        parser.add_argument(
+            '--delete-old',
+            action='store_true',
+            help="Delete the previous versioned indices once the alias has moved",
+        )
+
+    def handle(self, *args, **options):
+        es = connection_manager.elasticsearch()
+        target = versioned_index()
+
+        if options['dry_run']:
+            if has_legacy_index(es):
+                current = f"dynamically mapped index '{POSTS_ALIAS}'"
+            else:
+                current = ', '.join(alias_targets(es)) or 'nothing'
+            self.stdout.write(f"{POSTS_ALIAS}: alias points at {current}")
+            self.stdout.write(f"{POSTS_ALIAS}: current mapping version {POSTS_INDEX_VERSION} ({target})")
+            return
+
+        result = migrate_posts_index(
+            es, reindex=not options['no_reindex'], delete_old=options['delete_old']
+        )
+        if result['created']:
+            self.stdout.write(f"{POSTS_ALIAS}: created {target}")
+        if result['sources']:
+            self.stdout.write(
+                f"{POSTS_ALIAS}: copied {result['copied']} documents from {', '.join(result['sources'])}"
+            )
+        for index in result['deleted']:
+            self.stdout.write(f"{POSTS_ALIAS}: deleted {index}")
+        self.stdout.write(f"{POSTS_ALIAS}: alias points at {target}")
+        if result['copied']:
+            self.stdout.write(
+                "Copied documents keep their old fields; run `manage.py backfill_search_fields --all` "
+                "so the sync job fills in fields added by this version"
+            )
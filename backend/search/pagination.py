@@ -0,0 +1,173 @@
+"""
+Cursor pagination for post search: search_after over a point in time
+(PIT), so deep pages cost the same as the first one, are not limited by
+max_result_window, and do not shift while the sync job writes to the
+index.
+
+The first page is a plain search, so a search nobody pages through holds
+no PIT. The PIT is opened when the second page is requested, which starts
+at the offset the first page ended at and continues with search_after.
+
+The cursor is opaque to clients and carries the PIT id, the sort values of
+the last hit served and how many results were served so far (used for the
+offset above and to keep going on the Mongo text index while
+Elasticsearch is unavailable).
+"""
+import base64
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from search.breaker import SEARCH_SETTINGS
+from search.cache import normalize_query
+from search.index import POSTS_ALIAS
+
+logger = logging.getLogger(__name__)
+
+# Every page request renews the PIT for this long; an abandoned cursor's
+# PIT is released by Elasticsearch once it lapses
+PIT_KEEP_ALIVE = SEARCH_SETTINGS.get('pit_keep_alive', '2m')
+
+
+def first_state() -> Dict[str, Any]:
+    return {'pit': None, 'after': None, 'n': 0}
+
+
+def encode_search_cursor(query: str, state: Dict[str, Any]) -> str:
+    payload = json.dumps(dict(state, q=normalize_query(query)), separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_search_cursor(cursor: str, query: str) -> Dict[str, Any]:
+    """Inverse of encode_search_cursor; raises ValueError for a malformed cursor or another query's cursor"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        state = {'pit': payload['pit'], 'after': payload['after'], 'n': int(payload['n'])}
+        same_query = payload['q'] == normalize_query(query)
+    except Exception as e:
+        raise ValueError("Invalid cursor") from e
+    if not same_query or state['n'] < 0 or not (state['after'] is None or isinstance(state['after'], list)):
+        raise ValueError("Invalid cursor")
+    return state
+
+
+def page_search_request(body: Dict[str, Any], state: Dict[str, Any], page_size: int,
+                        pit_id: Optional[str]) -> Dict[str, Any]:
+    """
+    Search arguments for one cursor page, from a from/size search body.
+    Without a PIT (the first page) the alias is searched directly. One
+    extra hit is fetched to tell whether another page follows.
+    """
+    body = dict(body, size=page_size + 1)
+    body.pop('from', None)
+    if pit_id is None:
+        return {'index': POSTS_ALIAS, 'body': body}
+    body['pit'] = {'id': pit_id, 'keep_alive': PIT_KEEP_ALIVE}
+    # _shard_doc breaks ties between equal scores and timestamps
+    body['sort'] = list(body['sort']) + [{'_shard_doc': 'asc'}]
+    if state['after'] is not None:
+        body['search_after'] = state['after']
+    elif state['n']:
+        # The first page of a PIT, after a plain or Mongo-served page: offset once, then search_after
+        body['from'] = state['n']
+    return {'body': body}
+
+
+def page_search_response(result: Dict[str, Any], state: Dict[str, Any], page_size: int,
+                         pit_id: Optional[str]) -> Tuple[List[Dict], int, Optional[Dict[str, Any]], Optional[str]]:
+    """
+    The hits to serve, the total, the state of the page after them (None
+    on the last page) and the PIT to close, if this was the last page.
+    """
+    pit_id = result.get('pit_id', pit_id)
+    hits = result['hits']['hits']
+    page = hits[:page_size]
+    total = result['hits']['total']['value']
+    if len(hits) <= page_size:
+        return page, total, None, pit_id
+    after = page[-1]['sort'] if pit_id is not None else None
+    return page, total, {'pit': pit_id, 'after': after, 'n': state['n'] + len(page)}, None
+
+
+def needs_pit(state: Dict[str, Any]) -> bool:
+    """Whether a page is past the first one and has no PIT to continue yet"""
+    return state['pit'] is None and state['n'] > 0
+
+
+def is_missing_pit(e: Exception) -> bool:
+    """Whether a search failed because its PIT expired or was closed"""
+    from elasticsearch.exceptions import NotFoundError
+
+    return isinstance(e, NotFoundError)
+
+
+def search_pit_page(es, body: Dict[str, Any], state: Dict[str, Any],
+                    page_size: int) -> Tuple[List[Dict], int, Optional[Dict[str, Any]]]:
+    """
+    One cursor page. The second page opens the PIT; an expired PIT is
+    reopened once (later pages then reflect the current index). The PIT is
+    closed after the last page.
+    """
+    pit_id = state['pit']
+    if needs_pit(state):
+        pit_id = es.open_point_in_time(index=POSTS_ALIAS, keep_alive=PIT_KEEP_ALIVE)['id']
+    try:
+        result = es.search(**page_search_request(body, state, page_size, pit_id))
+    except Exception as e:
+        if state['pit'] is None or not is_missing_pit(e):
+            raise
+        logger.info("Search PIT expired, reopening")
+        pit_id = es.open_point_in_time(index=POSTS_ALIAS, keep_alive=PIT_KEEP_ALIVE)['id']
+        result = es.search(**page_search_request(body, state, page_size, pit_id))
+
+    hits, total, next_state, finished_pit = page_search_response(result, state, page_size, pit_id)
+    if finished_pit is not None:
+        close_pit(es, finished_pit)
+    return hits, total, next_state
+
+
+async def asearch_pit_page(es, body: Dict[str, Any], state: Dict[str, Any],
+                           page_size: int) -> Tuple[List[Dict], int, Optional[Dict[str, Any]]]:
+    """search_pit_page with the async client"""
+    pit_id = state['pit']
+    if needs_pit(state):
+        pit_id = (await es.open_point_in_time(index=POSTS_ALIAS, keep_alive=PIT_KEEP_ALIVE))['id']
+    try:
+        result = await es.search(**page_search_request(body, state, page_size, pit_id))
+    except Exception as e:
+        if state['pit'] is None or not is_missing_pit(e):
+            raise
+        logger.info("Search PIT expired, reopening")
+        pit_id = (await es.open_point_in_time(index=POSTS_ALIAS, keep_alive=PIT_KEEP_ALIVE))['id']
+        result = await es.search(**page_search_request(body, state, page_size, pit_id))
+
+    hits, total, next_state, finished_pit = page_search_response(result, state, page_size, pit_id)
+    if finished_pit is not None:
+        await aclose_pit(es, finished_pit)
+    return hits, total, next_state
+
+
+def close_pit(es, pit_id: str):
+    """Release a PIT early; failures only mean it lives until its keep-alive lapses"""
+    try:
+        es.close_point_in_time(id=pit_id)
+    except Exception as e:
+        logger.warning(f"Could not close search PIT: {e}")
+
+
+async def aclose_pit(es, pit_id: str):
+    """close_pit with the async client"""
+    try:
+        await es.close_point_in_time(id=pit_id)
+    except Exception as e:
+        logger.warning(f"Could not close search PIT: {e}")
+
+
+def mongo_page_state(docs: List[Dict], state: Dict[str, Any],
+                     page_size: int) -> Tuple[List[Dict], Optional[Dict[str, Any]]]:
+    """Offset continuation for cursor pages served from the Mongo text index"""
+    page = docs[:page_size]
+    if len(docs) <= page_size:
+        return page, None
+    return page, {'pit': None, 'after': None, 'n': state['n'] + len(page)}
@@ -0,0 +1,186 @@
+import threading
+import time
+from django.test import SimpleTestCase
+from search.breaker import CircuitBreaker
+from search.cache import SingleFlight
+from search.documents import suggest_inputs
+from search.index import POSTS_ALIAS
+from search.pagination import (
+    decode_search_cursor, encode_search_cursor, first_state, page_search_request, page_search_response
+)
+
+
+class CircuitBreakerTests(SimpleTestCase):
+    def test_opens_after_consecutive_failures(self):
+        breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=60)
+        breaker.record_failure()
+        self.assertTrue(breaker.allow_request())
+        breaker.record_failure()
+
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow_request())
+
+    def test_success_resets_the_failure_count(self):
+        breaker = CircuitBreaker('test', failure_threshold=2, reset_timeout=60)
+        breaker.record_failure()
+        breaker.record_success()
+        breaker.record_failure()
+
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_trial_call_after_the_timeout(self):
+        breaker = CircuitBreaker('test', failure_threshold=1, reset_timeout=0)
+        breaker.record_failure()
+
+        self.assertTrue(breaker.allow_request())
+        self.assertEqual(breaker.state, CircuitBreaker.HALF_OPEN)
+        breaker.record_success()
+        self.assertEqual(breaker.state, CircuitBreaker.CLOSED)
+
+    def test_failed_trial_reopens(self):
+        breaker = CircuitBreaker('test', failure_threshold=5, reset_timeout=0)
+        for _ in range(5):
+            breaker.record_failure()
+        breaker.allow_request()
+        breaker.reset_timeout = 60
+        breaker.record_failure()
+
+        self.assertEqual(breaker.state, CircuitBreaker.OPEN)
+        self.assertFalse(breaker.allow_request())
+
+
+class SingleFlightTests(SimpleTestCase):
+    def test_concurrent_callers_share_one_call(self):
+        flight = SingleFlight()
+        started, release = threading.Event(), threading.Event()
+        calls, results = [], []
+
+        def slow():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'result'
+
+        leader = threading.Thread(target=lambda: results.append(flight.do('key', slow)))
+        leader.start()
+        started.wait(5)
+        follower = threading.Thread(target=lambda: results.append(flight.do('key', slow)))
+        follower.start()
+        # Let the follower reach the wait before the leader finishes
+        time.sleep(0.1)
+        release.set()
+        leader.join(5)
+        follower.join(5)
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, ['result', 'result'])
+
+    def test_error_is_raised_and_the_key_released(self):
+        flight = SingleFlight()
+
+        def fail():
+            raise RuntimeError('down')
+
+        with self.assertRaises(RuntimeError):
+            flight.do('key', fail)
+        self.assertEqual(flight.do('key', lambda: 'retried'), 'retried')
+
+
+class SearchCursorTests(SimpleTestCase):
+    def test_round_trip(self):
+        state = {'pit': 'pit-id', 'after': [1.5, 1714560000000, 12], 'n': 20}
+
+        self.assertEqual(decode_search_cursor(encode_search_cursor('hello world', state), 'hello world'), state)
+
+    def test_same_query_after_normalization(self):
+        cursor = encode_search_cursor('Hello  World', first_state())
+
+        self.assertEqual(decode_search_cursor(cursor, 'hello world'), first_state())
+
+    def test_cursor_of_another_query(self):
+        cursor = encode_search_cursor('hello', first_state())
+
+        with self.assertRaises(ValueError):
+            decode_search_cursor(cursor, 'goodbye')
+
+    def test_malformed_cursors(self):
+        cursors = [
+            'not-a-cursor',
+            encode_search_cursor('hello', {'pit': None, 'after': None, 'n': -1}),
+            encode_search_cursor('hello', {'pit': None, 'after': 'abc', 'n': 10}),
+            encode_search_cursor('hello', {'pit': None, 'n': 10}),
+        ]
+        for cursor in cursors:
+            with self.assertRaises(ValueError):
+                decode_search_cursor(cursor, 'hello')
+
+
+class PageSearchTests(SimpleTestCase):
+    body = {'from': 0, 'size': 10, 'query': {'match_all': {}}, 'sort': [{'_score': {'order': 'desc'}}]}
+
+    @staticmethod
+    def result(count, pit_id=None):
+        result = {'hits': {'total': {'value': 100}, 'hits': [{'_id': str(i), 'sort': [i]} for i in range(count)]}}
+        if pit_id:
+            result['pit_id'] = pit_id
+        return result
+
+    def test_first_page_searches_the_alias_without_a_pit(self):
+        request = page_search_request(self.body, first_state(), 10, None)
+
+        self.assertEqual(request['index'], POSTS_ALIAS)
+        self.assertNotIn('pit', request['body'])
+        self.assertEqual(request['body']['size'], 11)
+
+    def test_first_pit_page_starts_at_the_offset(self):
+        request = page_search_request(self.body, {'pit': None, 'after': None, 'n': 10}, 10, 'pit-id')
+
+        self.assertNotIn('index', request)
+        self.assertEqual(request['body']['pit']['id'], 'pit-id')
+        self.assertEqual(request['body']['from'], 10)
+        self.assertEqual(request['body']['sort'][-1], {'_shard_doc': 'asc'})
+
+    def test_later_pages_continue_after_the_last_hit(self):
+        request = page_search_request(self.body, {'pit': 'pit-id', 'after': [9], 'n': 20}, 10, 'pit-id')
+
+        self.assertEqual(request['body']['search_after'], [9])
+        self.assertNotIn('from', request['body'])
+
+    def test_first_page_state(self):
+        hits, total, next_state, finished_pit = page_search_response(self.result(11), first_state(), 10, None)
+
+        self.assertEqual((len(hits), total), (10, 100))
+        self.assertEqual(next_state, {'pit': None, 'after': None, 'n': 10})
+        self.assertIsNone(finished_pit)
+
+    def test_last_pit_page_closes_the_pit(self):
+        state = {'pit': 'pit-id', 'after': [9], 'n': 20}
+        hits, _, next_state, finished_pit = page_search_response(self.result(4, 'pit-id-2'), state, 10, 'pit-id')
+
+        self.assertEqual(len(hits), 4)
+        self.assertIsNone(next_state)
+        self.assertEqual(finished_pit, 'pit-id-2')
+
+
+class SuggestInputsTests(SimpleTestCase):
+    def test_phrases_hashtags_and_user(self):
+        inputs = suggest_inputs({
+            'content': {'text': 'Hello #World again'}, 'like_count': 4, 'username': 'alice'
+        })
+
+        self.assertEqual(inputs['phrase'], {'input': ['Hello #World again', 'again'], 'weight': 5})
+        self.assertEqual(inputs['hashtag'], {'input': ['#world'], 'weight': 5})
+        self.assertEqual(inputs['user'], ['alice'])
+
+    def test_phrases_are_cut_and_start_in_the_first_words(self):
+        text = ' '.join(f'word{i}' for i in range(30))
+        phrases = suggest_inputs({'content': {'text': text}})['phrase']['input']
+
+        self.assertEqual(len(phrases), 10)
+        self.assertTrue(all(len(phrase) <= 50 for phrase in phrases))
+
+    def test_deleted_or_empty_posts_contribute_nothing(self):
+        empty = {'phrase': [], 'hashtag': [], 'user': []}
+
+        self.assertEqual(suggest_inputs({'content': {'text': 'Hello'}, 'deleted': True}), empty)
+        self.assertEqual(suggest_inputs({'content': {}}), empty)
@@ -0,0 +1,34 @@
+"""
+Connection settings read from the environment, shared by the Django
+settings and the scripts that run without Django (cron/es_sync.py).
+Kept free of Django imports.
+"""
+import os
+
+MONGODB_SETTINGS = {
+    'host': os.getenv('MONGO_HOST', 'localhost'),
+    'port': int(os.getenv('MONGO_PORT', 27017)),
+    'db': os.getenv('MONGO_DB', 'devthoughts_db'),
+    'username': os.getenv('MONGO_INITDB_ROOT_USERNAME'),
+    'password': os.getenv('MONGO_INITDB_ROOT_PASSWORD')
+}
+
+# Pool sizes and timeouts of the clients owned by connection_manager
+# (object storage pools are configured in STORAGE_SETTINGS)
+CONNECTION_SETTINGS = {
+    'mongo': {
+        'max_pool_size': int(os.getenv('MONGO_MAX_POOL_SIZE', 100)),
+        'min_pool_size': int(os.getenv('MONGO_MIN_POOL_SIZE', 0)),
+        'max_idle_time_ms': int(os.getenv('MONGO_MAX_IDLE_TIME_MS', 300000)),
+        'connect_timeout_ms': int(os.getenv('MONGO_CONNECT_TIMEOUT_MS', 5000)),
+        'server_selection_timeout_ms': int(os.getenv('MONGO_SERVER_SELECTION_TIMEOUT_MS', 5000)),
+        'wait_queue_timeout_ms': int(os.getenv('MONGO_WAIT_QUEUE_TIMEOUT_MS', 2000)),
+    },
+    'elasticsearch': {
+        'hosts': [f"http://{os.getenv('ELASTIC_URL', 'elasticsearch')}:{os.getenv('ELASTIC_PORT', '9200')}"],
+        'connections_per_node': int(os.getenv('ELASTIC_CONNECTIONS_PER_NODE', 10)),
+        'request_timeout': float(os.getenv('ELASTIC_REQUEST_TIMEOUT', 10)),
+        'max_retries': int(os.getenv('ELASTIC_MAX_RETRIES', 3)),
+        'retry_on_timeout': True,
+    },
+}
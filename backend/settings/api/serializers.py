@@ -2,6 +2,7 @@ from django.contrib.auth.models import User
 from settings.models import UserPreferences
 from rest_framework import serializers
 from accounts.models import Profile
+from accounts.directory import user_directory
 
 class UserSerializer(serializers.ModelSerializer):
     username = serializers.CharField(max_length=150, validators=[])
@@ -36,9 +37,12 @@ class SettingsSerializer(serializers.ModelSerializer):
     def update(self, instance, validated_data):
         user_data = validated_data.pop('user', {})
         user = instance.user
+        old_username = user.username
         user_serializer = UserSerializer(user, data=user_data, partial=True, context=self.context)
         if user_serializer.is_valid(raise_exception=True):
             user_serializer.save()
+            if user.username != old_username:
+                user_directory.invalidate(user.id)
 
         sex_data = validated_data.pop('sex', None)
         if sex_data is not None:
@@ -0,0 +1,308 @@
+import abc
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
+from typing import Iterable, NamedTuple, Optional
+from urllib.parse import urlsplit
+
+logger = logging.getLogger(__name__)
+
+try:
+    from django.conf import settings
+    STORAGE_SETTINGS = getattr(settings, 'STORAGE_SETTINGS', {})
+except Exception:
+    STORAGE_SETTINGS = {}
+
+CHUNK_SIZE = 64 * 1024
+
+
+class StoredObject(NamedTuple):
+    etag: str
+    size: int
+    content_type: str
+    last_modified: datetime
+
+
+class StorageBackend(abc.ABC):
+    """
+    Interface shared by the drivers. Bodies returned by `open_stream`
+    follow the urllib3 response protocol: `stream(amt)`, `close()` and
+    `release_conn()`.
+    """
+
+    @abc.abstractmethod
+    def ensure_bucket(self, bucket_name: str):
+        raise NotImplementedError
+
+    def ensure_buckets(self, bucket_names: Iterable[str]):
+        for bucket_name in bucket_names:
+            self.ensure_bucket(bucket_name)
+
+    @abc.abstractmethod
+    def put_stream(self, bucket_name, object_name, data, length, content_type='application/octet-stream') -> bool:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def stat(self, bucket_name, object_name) -> Optional[StoredObject]:
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def open_stream(self, bucket_name, object_name, offset=0, length=0):
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    def delete_object(self, bucket_name, object_name) -> bool:
+        raise NotImplementedError
+
+    def presigned_url(self, bucket_name, object_name, expires: timedelta) -> Optional[str]:
+        """Direct download URL, or None when the backend cannot sign one"""
+        return None
+
+
+class MinioStorage(StorageBackend):
+    """
+    One Minio client per process over a tuned urllib3 pool, so requests
+    reuse keep-alive connections instead of building a client each time.
+    Buckets are created at startup; a write that still finds its bucket
+    missing creates it and retries once.
+    """
+
+    def __init__(self, options: dict):
+        import urllib3
+        from minio import Minio
+
+        http_client = urllib3.PoolManager(
+            maxsize=options.get('pool_maxsize', 32),
+            block=options.get('pool_block', False),
+            timeout=urllib3.Timeout(
+                connect=options.get('connect_timeout', 3.0),
+                read=options.get('read_timeout', 30.0),
+            ),
+            retries=urllib3.Retry(
+                total=options.get('retries', 3),
+                backoff_factor=0.2,
+                status_forcelist=[500, 502, 503, 504],
+            ),
+        )
+        self.http_client = http_client
+        self.client = Minio(
+            f"{os.getenv('MINIO_URL')}:{os.getenv('MINIO_PORT')}",
+            access_key=os.getenv("MINIO_ROOT_USER"),
+            secret_key=os.getenv("MINIO_ROOT_PASSWORD"),
+            secure=False,
+            # A fixed region keeps presigned URL generation offline
+            region=os.getenv("MINIO_REGION", "us-east-1"),
+            http_client=http_client,
+        )
+        # Presigned URLs are fetched by browsers, and the signature covers
+        # the host, so they are signed for the public endpoint rather than
+        # the internal MINIO_URL. Signing is offline: this client never
+        # opens a connection.
+        self.signing_client = self.client
+        public_endpoint = options.get('public_endpoint')
+        if public_endpoint:
+            parsed = urlsplit(public_endpoint if '://' in public_endpoint else f"http://{public_endpoint}")
+            self.signing_client = Minio(
+                parsed.netloc,
+                access_key=os.getenv("MINIO_ROOT_USER"),
+                secret_key=os.getenv("MINIO_ROOT_PASSWORD"),
+                secure=parsed.scheme == 'https',
+                region=os.getenv("MINIO_REGION", "us-east-1"),
+                http_client=http_client,
+            )
+
+    def ensure_bucket(self, bucket_name):
+        if not self.client.bucket_exists(bucket_name):
+            self.client.make_bucket(bucket_name)
+
+    def put_stream(self, bucket_name, object_name, data, length, content_type='application/octet-stream'):
+        from minio.error import S3Error
+
+        start = data.tell() if hasattr(data, 'tell') else None
+        for attempt in range(2):
+            try:
+                self.client.put_object(bucket_name, object_name, data, length, content_type=content_type)
+                return True
+            except S3Error as e:
+                if e.code == 'NoSuchBucket' and attempt == 0 and start is not None:
+                    self.ensure_bucket(bucket_name)
+                    data.seek(start)
+                    continue
+                logger.error(f"Error storing {bucket_name}/{object_name}: {e}")
+                return False
+        return False
+
+    def stat(self, bucket_name, object_name):
+        from minio.error import S3Error
+
+        try:
+            stat = self.client.stat_object(bucket_name, object_name)
+        except S3Error as e:
+            if e.code not in ("NoSuchKey", "NoSuchBucket"):
+                logger.error(f"Error reading {bucket_name}/{object_name} metadata: {e}")
+            return None
+        return StoredObject(stat.etag, stat.size, stat.content_type, stat.last_modified)
+
+    def open_stream(self, bucket_name, object_name, offset=0, length=0):
+        return self.client.get_object(bucket_name, object_name, offset=offset, length=length)
+
+    def delete_object(self, bucket_name, object_name):
+        from minio.error import S3Error
+
+        try:
+            self.client.remove_object(bucket_name, object_name)
+            return True
+        except S3Error as e:
+            if e.code == "NoSuchBucket":
+                return True
+            logger.error(f"Error deleting {bucket_name}/{object_name}: {e}")
+            return False
+
+    def presigned_url(self, bucket_name, object_name, expires):
+        return self.signing_client.presigned_get_object(bucket_name, object_name, expires=expires)
+
+
+class _FileBody:
+    """A byte range of a local file exposed like a urllib3 response"""
+
+    def __init__(self, path: str, offset: int = 0, length: int = 0):
+        self._file = open(path, 'rb')
+        self._file.seek(offset)
+        self._remaining = length or (os.fstat(self._file.fileno()).st_size - offset)
+
+    def stream(self, amt=CHUNK_SIZE):
+        while self._remaining > 0:
+            chunk = self._file.read(min(amt, self._remaining))
+            if not chunk:
+                break
+            self._remaining -= len(chunk)
+            yield chunk
+
+    def read(self, amt=None):
+        chunk = self._file.read(self._remaining if amt is None else min(amt, self._remaining))
+        self._remaining -= len(chunk)
+        return chunk
+
+    def close(self):
+        self._file.close()
+
+    def release_conn(self):
+        pass
+
+
+class LocalStorage(StorageBackend):
+    """
+    Stores each object as a plain file under `<root>/<bucket>/` with its
+    content type and ETag in a `.meta/` sidecar. Writes land in a temp file
+    and are published with an atomic rename.
+    """
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def _bucket_path(self, bucket_name):
+        return os.path.join(self.root, bucket_name)
+
+    def _path(self, bucket_name, object_name):
+        if os.path.isabs(object_name) or '..' in object_name.split('/'):
+            raise ValueError(f"Invalid object name: {object_name}")
+        return os.path.join(self._bucket_path(bucket_name), object_name)
+
+    def _meta_path(self, bucket_name, object_name):
+        return os.path.join(self._bucket_path(bucket_name), '.meta', f"{object_name}.json")
+
+    def ensure_bucket(self, bucket_name):
+        os.makedirs(os.path.join(self._bucket_path(bucket_name), '.meta'), exist_ok=True)
+
+    def put_stream(self, bucket_name, object_name, data, length, content_type='application/octet-stream'):
+        try:
+            path = self._path(bucket_name, object_name)
+            meta_path = self._meta_path(bucket_name, object_name)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+
+            digest = hashlib.md5()
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as f:
+                    remaining = length
+                    while remaining > 0:
+                        chunk = data.read(min(CHUNK_SIZE, remaining))
+                        if not chunk:
+                            break
+                        digest.update(chunk)
+                        f.write(chunk)
+                        remaining -= len(chunk)
+                os.replace(tmp_path, path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+
+            with open(f"{meta_path}.tmp", 'w') as f:
+                json.dump({'etag': digest.hexdigest(), 'content_type': content_type}, f)
+            os.replace(f"{meta_path}.tmp", meta_path)
+            return True
+        except (OSError, ValueError) as e:
+            logger.error(f"Error storing {bucket_name}/{object_name}: {e}")
+            return False
+
+    def stat(self, bucket_name, object_name):
+        try:
+            path = self._path(bucket_name, object_name)
+            stat = os.stat(path)
+            with open(self._meta_path(bucket_name, object_name)) as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return StoredObject(
+            meta['etag'],
+            stat.st_size,
+            meta.get('content_type', 'application/octet-stream'),
+            datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc),
+        )
+
+    def open_stream(self, bucket_name, object_name, offset=0, length=0):
+        return _FileBody(self._path(bucket_name, object_name), offset, length)
+
+    def delete_object(self, bucket_name, object_name):
+        try:
+            for path in (self._meta_path(bucket_name, object_name), self._path(bucket_name, object_name)):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            return True
+        except (OSError, ValueError) as e:
+            logger.error(f"Error deleting {bucket_name}/{object_name}: {e}")
+            return False
+
+
+def build_storage(options: dict) -> StorageBackend:
+    backend = options.get('backend', 'minio')
+    if backend == 'local':
+        return LocalStorage(options.get('local_root', 'storage'))
+    if backend == 'minio':
+        return MinioStorage(options)
+    raise ValueError(f"Unknown storage backend: {backend}")
+
+
+_storage = None
+_storage_pid = None
+_storage_lock = threading.Lock()
+
+
+def get_storage() -> StorageBackend:
+    # Pooled sockets must not be shared with a forked worker, so each
+    # process builds its own driver on first use
+    global _storage, _storage_pid
+    if _storage is not None and _storage_pid == os.getpid():
+        return _storage
+    with _storage_lock:
+        if _storage is None or _storage_pid != os.getpid():
+            _storage = build_storage(STORAGE_SETTINGS)
+            _storage_pid = os.getpid()
+        return _storage
@@ -6,6 +6,17 @@ while ! nc -z pgdb 5432; do
 done
 echo "Database started"
 
+if [ "$APP_MODE" = "production" ]; then
+  # Migrations are generated at development time and shipped with the
+  # image; applying them is opt-in so replicas do not race on start
+  if [ "$RUN_MIGRATIONS" = "true" ]; then
+    echo "Running migrations..."
+    python manage.py migrate --noinput
+  fi
+  echo "Starting production server..."
+  exec gunicorn -c gunicorn.conf.py
+fi
+
 echo "Running migrations..."
 python manage.py makemigrations
 python manage.py migrate
@@ -282,7 +282,7 @@ export default function Post({ post, onLike, onUnlike, onComment, onShare }) {
               <ChatIcon fontSize="small" />
             </IconButton>
             <Typography variant="body2" sx={{ mr: 2 }}>
-              {post.comments?.length || 0}
+              {post.comment_count ?? post.comments?.length ?? 0}
             </Typography>
             <IconButton 
               size="small" 
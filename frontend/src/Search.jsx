@@ -1,4 +1,4 @@
-import React, { useState } from "react";
+import React, { useEffect, useState } from "react";
 import {
   Box,
   TextField,
@@ -7,6 +7,9 @@ import {
   CircularProgress,
   Pagination,
   PaginationItem,
+  List,
+  ListItemButton,
+  ListItemText,
 } from "@mui/material";
 import { Search as SearchIcon } from "@mui/icons-material";
 import { getToken } from './auth';
@@ -19,15 +22,49 @@ export default function Search() {
   const [currentPage, setCurrentPage] = useState(1);
   const [totalPages, setTotalPages] = useState(1);
   const [hasSearched, setHasSearched] = useState(false);
+  const [suggestions, setSuggestions] = useState([]);
+  const [searchedQuery, setSearchedQuery] = useState("");
 
-  const handleSearch = async (page = 1) => {
-    if (!query.trim()) return;
+  // Typeahead: ask the suggest endpoint once typing pauses
+  useEffect(() => {
+    const prefix = query.trim();
+    if (!prefix || prefix === searchedQuery) {
+      setSuggestions([]);
+      return;
+    }
+    const controller = new AbortController();
+    const timer = setTimeout(async () => {
+      try {
+        const response = await fetch(`http://localhost:8000/api/search/suggest/?q=${encodeURIComponent(prefix)}`, {
+          headers: { 'Authorization': `Token ${getToken()}` },
+          signal: controller.signal,
+        });
+        if (!response.ok) return;
+        const data = await response.json();
+        setSuggestions([
+          ...(data.users || []).map((text) => ({ text: `@${text}`, value: text })),
+          ...(data.hashtags || []).map((text) => ({ text, value: text })),
+          ...(data.phrases || []).map((text) => ({ text, value: text })),
+        ]);
+      } catch (error) {
+        if (error.name !== 'AbortError') console.error('Suggest error:', error);
+      }
+    }, 150);
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [query, searchedQuery]);
+
+  const handleSearch = async (page = 1, searchQuery = query) => {
+    if (!searchQuery.trim()) return;
+    setSearchedQuery(searchQuery.trim());
     
     try {
       setLoading(true);
       const token = getToken();
       
-      const response = await fetch(`http://localhost:8000/api/search/?q=${encodeURIComponent(query)}&page=${page}`, {
+      const response = await fetch(`http://localhost:8000/api/search/?q=${encodeURIComponent(searchQuery)}&page=${page}`, {
         method: 'GET',
         headers: {
           'Authorization': `Token ${token}`,
@@ -62,6 +99,12 @@ export default function Search() {
     }
   };
 
+  const handleSuggestionClick = (value) => {
+    setQuery(value);
+    setCurrentPage(1);
+    handleSearch(1, value);
+  };
+
   const handlePageChange = (event, page) => {
     setCurrentPage(page);
     handleSearch(page);
@@ -115,6 +158,15 @@ export default function Search() {
         }}
         sx={{ mt: 2 }}
       />
+      {suggestions.length > 0 && (
+        <List sx={{ bgcolor: '#202327', borderRadius: 2, mt: 1 }}>
+          {suggestions.map((suggestion) => (
+            <ListItemButton key={suggestion.text} onClick={() => handleSuggestionClick(suggestion.value)}>
+              <ListItemText primary={suggestion.text} />
+            </ListItemButton>
+          ))}
+        </List>
+      )}
       
       {loading ? (
         <Box sx={{ display: 'flex', justifyContent: 'center', mt: 4 }}>